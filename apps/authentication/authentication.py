@@ -0,0 +1,215 @@
+"""
+Stateless JWT Authentication
+
+Access tokens issued by `TokenSerializer.get_tokens_for_user` carry the
+user's `role`, `is_superuser` and `is_active` as claims. `ClaimsJWTAuthentication`
+turns them into a `ClaimsUser` instead of loading the user row on every
+request; views that need the full row call `request.user.get_user()`.
+
+Deactivation and role changes are picked up through a small in-process
+cache of each user's state, refreshed from the database at most every
+`JWT_USER_STATE_TTL` seconds (0 trusts the claims until the token expires).
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from apps.core.metrics import cache_requests, jwt_auth_failures
+from apps.core.replicas import bind_user
+
+
+# Claims copied from the user into every token pair
+USER_STATE_CLAIMS = ('role', 'is_superuser', 'is_active')
+
+# Entries kept before the state cache is emptied
+USER_STATE_CACHE_SIZE = 10000
+
+_user_states = {}
+_user_states_lock = threading.Lock()
+
+USER_STATE_HIT = (('cache', 'user_state'), ('result', 'hit'))
+USER_STATE_MISS = (('cache', 'user_state'), ('result', 'miss'))
+
+
+def add_user_claims(token, user):
+    """Store the `USER_STATE_CLAIMS` of `user` on `token`"""
+    for claim in USER_STATE_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+def get_user_state(user_id):
+    """
+    Return `{'role', 'is_superuser', 'is_active'}` of `user_id` from the
+    in-process cache, or None if the user no longer exists
+    """
+    entry = _user_states.get(user_id)
+    if entry is not None and entry[0] > time.monotonic():
+        cache_requests.inc(USER_STATE_HIT)
+        return entry[1]
+    cache_requests.inc(USER_STATE_MISS)
+    state = get_user_model().objects.filter(pk=user_id).values(*USER_STATE_CLAIMS).first()
+    return remember_user_state(user_id, state)
+
+
+async def aget_user_state(user_id):
+    """Async version of `get_user_state`"""
+    entry = _user_states.get(user_id)
+    if entry is not None and entry[0] > time.monotonic():
+        cache_requests.inc(USER_STATE_HIT)
+        return entry[1]
+    cache_requests.inc(USER_STATE_MISS)
+    state = await get_user_model().objects.filter(pk=user_id).values(*USER_STATE_CLAIMS).afirst()
+    return remember_user_state(user_id, state)
+
+
+def remember_user_state(user_id, state):
+    with _user_states_lock:
+        if len(_user_states) >= USER_STATE_CACHE_SIZE:
+            _user_states.clear()
+        _user_states[user_id] = (time.monotonic() + settings.JWT_USER_STATE_TTL, state)
+    return state
+
+
+def forget_user_state(user_id):
+    """Drop the cached state of `user_id` so the next request reloads it"""
+    with _user_states_lock:
+        _user_states.pop(user_id, None)
+
+
+class ClaimsUser(TokenUser):
+    """
+    User built from token claims, with the `User` properties the API uses
+    """
+
+    def __init__(self, token, state=None):
+        super().__init__(token)
+        self.state = state
+
+    def claim(self, name, default):
+        if self.state is not None:
+            return self.state[name]
+        return self.token.get(name, default)
+
+    @cached_property
+    def role(self):
+        return self.claim('role', 'USER')
+
+    @cached_property
+    def is_superuser(self):
+        return self.claim('is_superuser', False)
+
+    @cached_property
+    def is_active(self):
+        return self.claim('is_active', True)
+
+    @property
+    def is_admin(self):
+        """Same rule as `User.is_admin`"""
+        return self.role == 'ADMIN' or self.is_superuser
+
+    @property
+    def is_regular_user(self):
+        return self.role == 'USER'
+
+    def get_user(self):
+        """Load (once) and return the full `User` row"""
+        # `TokenUser.__getattr__` answers None for any unknown attribute.
+        if '_user' not in self.__dict__:
+            self._user = get_user_model().objects.get(pk=self.id)
+        return self._user
+
+    def __eq__(self, other):
+        if isinstance(other, get_user_model()):
+            return self.id == other.pk
+        return super().__eq__(other)
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication returning a `ClaimsUser` without a per-request query
+    """
+
+    def authenticate(self, request):
+        try:
+            return super().authenticate(request)
+        except AuthenticationFailed as exc:
+            count_auth_failure('access', exc)
+            raise
+
+    def get_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        state = get_user_state(user_id) if self.needs_state(validated_token) else None
+        return self.build_user(validated_token, state)
+
+    async def aauthenticate(self, request):
+        """
+        Async version of `authenticate` for plain Django async views
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        try:
+            validated_token = self.get_validated_token(raw_token)
+            user_id = self.get_user_id(validated_token)
+            state = await aget_user_state(user_id) if self.needs_state(validated_token) else None
+            return self.build_user(validated_token, state), validated_token
+        except AuthenticationFailed as exc:
+            count_auth_failure('access', exc)
+            raise
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+    def needs_state(self, validated_token):
+        """Tokens issued before the claims existed always need the lookup"""
+        return settings.JWT_USER_STATE_TTL > 0 or any(
+            claim not in validated_token for claim in USER_STATE_CLAIMS
+        )
+
+    def build_user(self, validated_token, state):
+        if self.needs_state(validated_token) and state is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        user = ClaimsUser(validated_token, state)
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        # Users read their own writes, see `apps.core.replicas`.
+        bind_user(user.id)
+        return user
+
+
+def count_auth_failure(token_type, exc):
+    """Count a rejected token of `token_type` by the code of `exc`"""
+    detail = exc.detail
+    if isinstance(detail, dict):
+        reason = detail.get('code', exc.default_code)
+    else:
+        reason = getattr(detail, 'code', exc.default_code)
+    jwt_auth_failures.inc((('token', token_type), ('reason', str(reason))))
+
+
+def get_full_user(request):
+    """Return the `User` row of `request.user`, loading it if needed"""
+    user = request.user
+    if isinstance(user, ClaimsUser):
+        return user.get_user()
+    return user
@@ -0,0 +1,206 @@
+"""
+Revoked Refresh Token Filter
+
+simplejwt checks the blacklist table on every refresh token it verifies
+(token refresh, logout). `revoked_tokens` answers most checks from memory
+instead: a bloom filter holding the JTI of every blacklisted, unexpired
+token says "certainly not revoked" without a query, and only its rare
+positives (or a token that really is revoked) reach the database. Tokens
+confirmed revoked are kept in a small LRU.
+
+The filter is built in a background thread (checks query the database
+until it is ready) and rebuilt every `JWT_BLACKLIST_REBUILD_INTERVAL`
+seconds to drop expired tokens. In between, rows blacklisted by other
+processes are added at most `JWT_BLACKLIST_SYNC_INTERVAL` seconds after
+they are written, with one primary-key range query.
+
+That lag is why token refresh does not trust the filter alone: it claims
+the presented token by inserting its blacklist row, and a token another
+process already blacklisted fails the insert (`RotatingRefreshToken`).
+"""
+
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+
+logger = logging.getLogger(__name__)
+
+# Smallest number of tokens a filter is sized for
+MIN_CAPACITY = 100000
+
+# Blacklist ids re-read below the last one seen, for rows committed out of
+# id order by concurrent transactions
+SYNC_OVERLAP = 1000
+
+# Confirmed revoked JTIs kept in memory
+CONFIRMED_CACHE_SIZE = 10000
+
+# Seconds before a failed build is retried
+REBUILD_RETRY_DELAY = 60
+
+
+class BloomFilter:
+    """
+    Set membership with false positives (at `error_rate` when holding
+    `capacity` items) and no false negatives
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, item):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + index * second) % self.size for index in range(self.hash_count)]
+
+    def add(self, item):
+        added = False
+        for position in self.positions(item):
+            mask = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                added = True
+        # Items added again (e.g. re-read by a sync) are not counted twice.
+        self.count += added
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self.positions(item))
+
+    def __len__(self):
+        return self.count
+
+
+class RevokedTokenFilter:
+    """
+    Process-wide view of the token blacklist (see the module docstring)
+    """
+
+    def __init__(self):
+        self.bloom = None
+        self.last_id = 0
+        self.built_at = None
+        self.synced_at = 0.0
+        self.building = False
+        self.retry_at = 0.0
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        self.confirmed = OrderedDict()
+
+    def is_revoked(self, jti):
+        """Whether the token `jti` is blacklisted"""
+        if jti in self.confirmed:
+            return True
+        bloom = self.get_bloom()
+        if bloom is not None and jti not in bloom:
+            return False
+        revoked = BlacklistedToken.objects.filter(token__jti=jti).exists()
+        if revoked:
+            self.confirm(jti)
+        return revoked
+
+    def add(self, jti):
+        """Record a token this process just blacklisted"""
+        if self.bloom is not None:
+            self.bloom.add(jti)
+        self.confirm(jti)
+
+    def confirm(self, jti):
+        with self.lock:
+            self.confirmed[jti] = True
+            self.confirmed.move_to_end(jti)
+            if len(self.confirmed) > CONFIRMED_CACHE_SIZE:
+                self.confirmed.popitem(last=False)
+
+    def get_bloom(self):
+        """
+        Return the current filter, or None while it is first built. Starts
+        a rebuild or syncs new rows when due.
+        """
+        now = time.monotonic()
+        bloom = self.bloom
+        if bloom is None or now - self.built_at >= settings.JWT_BLACKLIST_REBUILD_INTERVAL or len(bloom) > bloom.capacity:
+            self.start_rebuild()
+        if bloom is not None and now - self.synced_at >= settings.JWT_BLACKLIST_SYNC_INTERVAL:
+            self.sync(now)
+        return bloom
+
+    def sync(self, now):
+        """Add rows blacklisted since the last sync, by any process"""
+        if not self.sync_lock.acquire(blocking=False):
+            # Another thread is syncing; the current filter will do.
+            return
+        try:
+            if now - self.synced_at < settings.JWT_BLACKLIST_SYNC_INTERVAL:
+                return
+            rows = BlacklistedToken.objects.filter(
+                id__gt=self.last_id - SYNC_OVERLAP,
+                token__expires_at__gt=aware_utcnow(),
+            ).values_list('id', 'token__jti')
+            for row_id, jti in rows:
+                self.bloom.add(jti)
+                self.last_id = max(self.last_id, row_id)
+            self.synced_at = now
+        finally:
+            self.sync_lock.release()
+
+    def start_rebuild(self):
+        with self.lock:
+            if self.building or time.monotonic() < self.retry_at:
+                return
+            self.building = True
+        threading.Thread(target=self.rebuild_in_thread, name='token-blacklist-filter', daemon=True).start()
+
+    def rebuild_in_thread(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception('Building the token blacklist filter failed')
+            self.retry_at = time.monotonic() + REBUILD_RETRY_DELAY
+        finally:
+            connection.close()
+
+    def rebuild(self):
+        """
+        Build a filter of all blacklisted, unexpired tokens and swap it in
+        """
+        with self.lock:
+            self.building = True
+        try:
+            rows = BlacklistedToken.objects.filter(token__expires_at__gt=aware_utcnow())
+            bloom = BloomFilter(
+                max(MIN_CAPACITY, 2 * rows.count()),
+                settings.JWT_BLACKLIST_FILTER_ERROR_RATE,
+            )
+            last_id = 0
+            for row_id, jti in rows.values_list('id', 'token__jti').iterator(chunk_size=10000):
+                bloom.add(jti)
+                last_id = max(last_id, row_id)
+            with self.sync_lock, self.lock:
+                # Tokens blacklisted meanwhile are either in the rows read
+                # or past `last_id`; sync on the next check.
+                self.bloom, self.last_id = bloom, last_id
+                self.built_at = time.monotonic()
+                self.synced_at = 0.0
+        finally:
+            with self.lock:
+                self.building = False
+        return bloom
+
+
+revoked_tokens = RevokedTokenFilter()
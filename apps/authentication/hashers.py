@@ -0,0 +1,127 @@
+"""
+Password Hashing
+
+Hashers whose cost comes from settings (`PASSWORD_SCRYPT_*`,
+`PASSWORD_ARGON2_*`), and a cap on how many password hashes and checks
+run at once in a process (see `User.set_password` and
+`User.check_password`). Each hash runs on the thread of its request, at
+most `PASSWORD_HASH_WORKERS` at a time; hashlib and argon2-cffi release
+the GIL, so those run in parallel while other requests keep their share
+of the CPU during a burst of logins. The others wait for a slot, holding
+their request's thread. Past `PASSWORD_HASH_MAX_PENDING` hashes waiting
+or running, logins are refused with 503 instead of piling up.
+"""
+
+import threading
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    """Scrypt with the cost from `PASSWORD_SCRYPT_*`"""
+
+    # Upper bound only: OpenSSL's default (32 MiB) rejects work factors above
+    # 2 ** 14, and hashes stored with an earlier, higher cost must verify.
+    maxmem = 2 ** 30
+
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_SCRYPT_WORK_FACTOR
+
+    @property
+    def block_size(self):
+        return settings.PASSWORD_SCRYPT_BLOCK_SIZE
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_SCRYPT_PARALLELISM
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Argon2 with the cost from `PASSWORD_ARGON2_*`"""
+
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_ARGON2_PARALLELISM
+
+
+class PasswordHashersBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _('Too many password checks in progress, try again shortly.')
+    default_code = 'password_hashers_busy'
+
+
+_slots = None
+_slots_lock = threading.Lock()
+
+
+def get_hash_slots():
+    """
+    Return the process-wide `(running, pending)` semaphores: hashes running
+    at once, and hashes admitted (waiting or running)
+    """
+    global _slots
+    with _slots_lock:
+        if _slots is None:
+            _slots = (
+                threading.BoundedSemaphore(settings.PASSWORD_HASH_WORKERS),
+                threading.BoundedSemaphore(settings.PASSWORD_HASH_MAX_PENDING),
+            )
+        return _slots
+
+
+def reset_hash_slots():
+    """Drop the semaphores so the next hash builds them from the current settings"""
+    global _slots
+    with _slots_lock:
+        _slots = None
+
+
+def run_hasher(func, *args):
+    """
+    Return `func(*args)` once a hashing slot is free, raising
+    `PasswordHashersBusy` when `PASSWORD_HASH_MAX_PENDING` hashes are
+    already admitted
+    """
+    if settings.PASSWORD_HASH_WORKERS <= 0:
+        return func(*args)
+    running, pending = get_hash_slots()
+    if not pending.acquire(blocking=False):
+        raise PasswordHashersBusy()
+    try:
+        with running:
+            return func(*args)
+    finally:
+        pending.release()
+
+
+def hash_password(raw_password):
+    """`make_password` within the hashing cap"""
+    if raw_password is None:
+        return hashers.make_password(None)
+    return run_hasher(hashers.make_password, raw_password)
+
+
+def verify_password(raw_password, encoded):
+    """
+    Check `raw_password` against `encoded` within the hashing cap
+
+    Returns `(is_correct, must_update)`, `must_update` telling whether the
+    hash was made by another hasher or with another cost than the
+    preferred one.
+    """
+    outdated = []
+    is_correct = run_hasher(hashers.check_password, raw_password, encoded, outdated.append)
+    return is_correct, bool(outdated)
@@ -0,0 +1,121 @@
+"""
+Login throughput benchmark of the password hashers
+"""
+
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import identify_hasher
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+
+from apps.tasks.harness import FIXTURE_PASSWORD, test_database, unthrottled
+
+
+User = get_user_model()
+
+
+def preferring(name):
+    """`PASSWORD_HASHERS` with hasher `name` first"""
+    classes = settings.PASSWORD_HASHER_CLASSES
+    return [classes[name], *(path for other, path in classes.items() if other != name)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Fire concurrent logins at /api/auth/login/ with each password hasher '
+        'and report throughput and latency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hasher',
+            action='append',
+            choices=sorted(settings.PASSWORD_HASHER_CLASSES),
+            help='Hasher to measure, may be repeated (default: all)',
+        )
+        parser.add_argument('--requests', type=int, default=200, help='Logins per hasher (default: 200)')
+        parser.add_argument('--concurrency', type=int, default=20, help='Logins in flight (default: 20)')
+        parser.add_argument('--users', type=int, default=20, help='Users logging in (default: 20)')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.PASSWORD_HASH_WORKERS,
+            help='Hashes running at once, 0 for no limit (default: PASSWORD_HASH_WORKERS)',
+        )
+
+    def handle(self, *args, **options):
+        names = options['hasher'] or sorted(settings.PASSWORD_HASHER_CLASSES)
+        self.stdout.write(
+            f"{options['requests']} logins per hasher, concurrency {options['concurrency']}, "
+            f"at most {options['workers']} hashes at once"
+        )
+        # Every login must reach the hashers: no throttling, and the cap
+        # never turns one away.
+        with test_database(), unthrottled(), override_settings(
+            PASSWORD_HASH_WORKERS=options['workers'],
+            PASSWORD_HASH_MAX_PENDING=max(options['concurrency'], 1),
+        ):
+            for name in names:
+                try:
+                    with override_settings(PASSWORD_HASHERS=preferring(name)):
+                        self.bench_hasher(name, options)
+                except ValueError as exc:
+                    # argon2 without argon2-cffi
+                    self.stdout.write(self.style.WARNING(f'{name:<28} skipped: {exc}'))
+
+    def bench_hasher(self, name, options):
+        users = self.create_users(name, options['users'])
+        self.report(name, self.run_logins(users, options))
+
+        if name != 'pbkdf2':
+            # First logins of users whose hash predates the switch to `name`
+            with override_settings(PASSWORD_HASHERS=preferring('pbkdf2')):
+                legacy = self.create_users(f'{name}-legacy', options['users'])
+            upgrade = self.run_logins(legacy, {**options, 'requests': len(legacy)})
+            upgraded = sum(
+                identify_hasher(password).algorithm == name
+                for password in User.objects.filter(pk__in=[user.pk for user in legacy])
+                .values_list('password', flat=True)
+            )
+            if upgraded != len(legacy):
+                raise CommandError(f'Only {upgraded} of {len(legacy)} pbkdf2 hashes were upgraded to {name}.')
+            self.report(f'{name} (upgrade from pbkdf2)', upgrade)
+
+    def create_users(self, prefix, count):
+        return [
+            User.objects.create_user(
+                email=f'bench-{prefix}-{index}@example.com',
+                username=f'bench-{prefix}-{index}',
+                password=FIXTURE_PASSWORD,
+            )
+            for index in range(count)
+        ]
+
+    def run_logins(self, users, options):
+        def login(index):
+            body = json.dumps({'email': users[index % len(users)].email, 'password': FIXTURE_PASSWORD})
+            start = time.perf_counter()
+            response = Client().post('/api/auth/login/', body, content_type='application/json')
+            if response.status_code != 200:
+                raise CommandError(f'Login returned {response.status_code}: {response.content[:200]}')
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            latencies = list(pool.map(login, range(options['requests'])))
+        return time.perf_counter() - start, latencies
+
+    def report(self, name, result):
+        elapsed, latencies = result
+        latencies = sorted(latencies)
+        p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+        self.stdout.write(
+            f'{name:<28} {len(latencies) / elapsed:8.1f} logins/s   '
+            f'p50 {statistics.median(latencies) * 1000:7.1f} ms   p95 {p95 * 1000:7.1f} ms'
+        )
@@ -0,0 +1,135 @@
+"""
+Token refresh benchmark against a large token blacklist
+"""
+
+import json
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from apps.authentication.blacklist import revoked_tokens
+from apps.authentication.tokens import RefreshToken
+from apps.tasks.harness import FIXTURE_PASSWORD, test_database, unthrottled
+
+
+User = get_user_model()
+
+# (label, JWT_BLACKLIST_FILTER)
+MODES = [('database', False), ('filter', True)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the token blacklist, then measure blacklist checks and token refreshes '
+        'with a query per check and with the revoked-token filter'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--blacklisted',
+            type=int,
+            default=1000000,
+            help='Blacklisted tokens to create (default: 1000000)',
+        )
+        parser.add_argument('--checks', type=int, default=20000, help='Blacklist checks per mode (default: 20000)')
+        parser.add_argument('--requests', type=int, default=500, help='Refreshes per mode (default: 500)')
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Refreshes in flight; refreshes write the blacklist, which an SQLite test database '
+                 'only takes one at a time (default: 1)',
+        )
+
+    def handle(self, *args, **options):
+        with test_database(), unthrottled():
+            user = User.objects.create_user(
+                email='bench-refresh@example.com',
+                username='bench-refresh',
+                password=FIXTURE_PASSWORD,
+            )
+
+            start = time.perf_counter()
+            self.fill_blacklist(options['blacklisted'])
+            self.stdout.write(f"Blacklisted {options['blacklisted']} tokens in {time.perf_counter() - start:.1f} s")
+
+            start = time.perf_counter()
+            bloom = revoked_tokens.rebuild()
+            probes = [uuid.uuid4().hex for _ in range(100000)]
+            false_positives = sum(probe in bloom for probe in probes) / len(probes)
+            self.stdout.write(
+                f'Filter built in {time.perf_counter() - start:.1f} s: {len(bloom)} tokens, '
+                f'{len(bloom.bits) / 2 ** 20:.1f} MiB, {bloom.hash_count} hashes, '
+                f'{false_positives:.3%} false positives'
+            )
+
+            for label, use_filter in MODES:
+                with override_settings(JWT_BLACKLIST_FILTER=use_filter):
+                    self.bench_checks(label, user, options)
+            for label, use_filter in MODES:
+                with override_settings(JWT_BLACKLIST_FILTER=use_filter):
+                    self.bench_refreshes(label, user, options)
+
+    def fill_blacklist(self, count, chunk_size=50000):
+        expires_at = timezone.now() + timedelta(days=7)
+        for offset in range(0, count, chunk_size):
+            with transaction.atomic():
+                outstanding = OutstandingToken.objects.bulk_create([
+                    OutstandingToken(jti=uuid.uuid4().hex, token='', expires_at=expires_at)
+                    for _ in range(min(chunk_size, count - offset))
+                ])
+                BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in outstanding])
+
+    def bench_checks(self, label, user, options):
+        """Verify valid refresh tokens, blacklist check included"""
+        tokens = [str(RefreshToken.for_user(user)) for _ in range(100)]
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            start = time.perf_counter()
+            for index in range(options['checks']):
+                RefreshToken(tokens[index % len(tokens)])
+            elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'{"checks " + label:<18} {options["checks"] / elapsed:9.1f} checks/s   '
+            f'{len(queries) / options["checks"]:.3f} queries/check'
+        )
+
+    def bench_refreshes(self, label, user, options):
+        """POST /api/auth/token/refresh/, which also blacklists the old token"""
+        tokens = [str(RefreshToken.for_user(user)) for _ in range(options['requests'])]
+
+        def refresh(token):
+            start = time.perf_counter()
+            response = Client().post(
+                '/api/auth/token/refresh/',
+                json.dumps({'refresh': token}),
+                content_type='application/json',
+            )
+            if response.status_code != 200:
+                raise CommandError(f'Refresh returned {response.status_code}: {response.content[:200]}')
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            latencies = sorted(pool.map(refresh, tokens))
+        elapsed = time.perf_counter() - start
+        p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+        self.stdout.write(
+            f'{"refresh " + label:<18} {len(latencies) / elapsed:9.1f} req/s      '
+            f'p50 {statistics.median(latencies) * 1000:7.1f} ms   p95 {p95 * 1000:7.1f} ms'
+        )
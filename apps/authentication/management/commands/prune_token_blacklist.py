@@ -0,0 +1,31 @@
+"""
+Delete expired outstanding and blacklisted tokens in batches
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete expired tokens from the token blacklist tables, a batch per '
+        'transaction (run periodically, e.g. from cron)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows per transaction (default: 10000)')
+
+    def handle(self, *args, **options):
+        expired = OutstandingToken.objects.filter(expires_at__lte=aware_utcnow()).order_by('id')
+        deleted = 0
+        while True:
+            ids = list(expired.values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            with transaction.atomic():
+                # Only ids are loaded; blacklist rows go with one DELETE.
+                _, counts = OutstandingToken.objects.filter(id__in=ids).only('id').delete()
+            deleted += counts.get(OutstandingToken._meta.label, 0)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired tokens.'))
@@ -6,6 +6,8 @@ from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.utils import timezone
 
+from .hashers import hash_password, verify_password
+
 
 class UserManager(BaseUserManager):
     """Custom manager for User model"""
@@ -98,6 +100,24 @@ class User(AbstractBaseUser, PermissionsMixin):
         """Return the short name of the user"""
         return self.first_name or self.username
     
+    def set_password(self, raw_password):
+        """Hash the password with the preferred hasher, within the hashing cap"""
+        self.password = hash_password(raw_password)
+        self._password = raw_password
+    
+    def check_password(self, raw_password):
+        """
+        Check the password within the hashing cap, upgrading a hash made by
+        another hasher or with another cost to the preferred one
+        """
+        is_correct, must_update = verify_password(raw_password, self.password)
+        if is_correct and must_update:
+            self.set_password(raw_password)
+            # Hash upgrades are not password changes.
+            self._password = None
+            self.save(update_fields=['password'])
+        return is_correct
+    
     @property
     def is_admin(self):
         """Check if user is admin"""
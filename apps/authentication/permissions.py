@@ -28,12 +28,13 @@ class IsOwnerOrAdmin(permissions.BasePermission):
         if request.user.is_admin or request.user.is_superuser:
             return True
         
-        # Check if the object has a 'user' attribute
-        if hasattr(obj, 'user'):
-            return obj.user == request.user
+        # Check if the object has a 'user' attribute; compare ids so the
+        # owner row is never loaded
+        if hasattr(obj, 'user_id'):
+            return obj.user_id == request.user.id
         
         # Check if the object is the user itself
-        return obj == request.user
+        return obj.pk == request.user.id
 
 
 class IsAuthenticatedOrCreateOnly(permissions.BasePermission):
@@ -6,8 +6,12 @@ from rest_framework import serializers
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from rest_framework.validators import UniqueValidator
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as BaseTokenRefreshSerializer
+from apps.core.metrics import jwt_auth_failures
+from .authentication import add_user_claims
 from .models import User
+from .tokens import RefreshToken, RotatingRefreshToken
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -178,14 +182,14 @@ class ChangePasswordSerializer(serializers.Serializer):
     
     def validate_old_password(self, value):
         """Validate old password"""
-        user = self.context['request'].user
+        user = self.context['user']
         if not user.check_password(value):
             raise serializers.ValidationError("Old password is incorrect.")
         return value
     
     def save(self, **kwargs):
         """Change password"""
-        user = self.context['request'].user
+        user = self.context['user']
         user.set_password(self.validated_data['new_password'])
         user.save()
         return user
@@ -200,11 +204,30 @@ class TokenSerializer(serializers.Serializer):
     
     @staticmethod
     def get_tokens_for_user(user):
-        """Generate tokens for user"""
-        refresh = RefreshToken.for_user(user)
+        """
+        Generate tokens for user
+        
+        The user's role and status travel as claims so requests can be
+        authenticated without loading the user (see `authentication`).
+        """
+        refresh = add_user_claims(RefreshToken.for_user(user), user)
         
         return {
             'access': str(refresh.access_token),
             'refresh': str(refresh),
             'user': UserSerializer(user).data
-        }
\ No newline at end of file
+        }
+
+
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    """Token refresh checking the blacklist against the database"""
+    
+    token_class = RotatingRefreshToken
+    
+    def validate(self, attrs):
+        try:
+            return super().validate(attrs)
+        except TokenError:
+            # Invalid, expired or blacklisted; the view answers 401.
+            jwt_auth_failures.inc((('token', 'refresh'), ('reason', 'token_not_valid')))
+            raise
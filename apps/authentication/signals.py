@@ -0,0 +1,25 @@
+"""
+Authentication Signals
+"""
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import forget_user_state
+from .hashers import reset_hash_slots
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_written(sender, instance, **kwargs):
+    """Make this process reload the user's state on their next request"""
+    forget_user_state(instance.pk)
+
+
+@receiver(setting_changed)
+def hash_slot_settings_changed(setting, **kwargs):
+    """Rebuild the hashing semaphores when their settings are overridden"""
+    if setting in ('PASSWORD_HASH_WORKERS', 'PASSWORD_HASH_MAX_PENDING'):
+        reset_hash_slots()
@@ -1,3 +1,361 @@
-from django.test import TestCase
+"""
+Authentication Tests
+"""
 
-# Create your tests here.
+import threading
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.test import RequestFactory, override_settings
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.core.throttling import _local_store
+
+from . import hashers
+from .authentication import ClaimsJWTAuthentication, ClaimsUser, _user_states, add_user_claims
+from .blacklist import BloomFilter, RevokedTokenFilter
+from .serializers import TokenSerializer
+from .tokens import RefreshToken, RotatingRefreshToken
+
+
+User = get_user_model()
+
+
+class AuthenticationTestCase(APITestCase):
+    """
+    Test case with empty caches, user states and throttle buckets, hashing
+    passwords at a trivial cost
+    """
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        _user_states.clear()
+        _local_store.arrivals.clear()
+        cheap_hashing = override_settings(PASSWORD_SCRYPT_WORK_FACTOR=2 ** 4)
+        cheap_hashing.enable()
+        self.addCleanup(cheap_hashing.disable)
+
+    def create_user(self, name='alice', password=None, **extra_fields):
+        return User.objects.create_user(
+            email=f'{name}@example.com', username=name, password=password, **extra_fields
+        )
+
+
+class ClaimsAuthenticationTests(AuthenticationTestCase):
+    """`ClaimsJWTAuthentication`: users built from token claims"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+
+    def authenticate(self, token):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        user, _ = ClaimsJWTAuthentication().authenticate(request)
+        return user
+
+    def claims_token(self, user=None):
+        user = user or self.user
+        return add_user_claims(AccessToken.for_user(user), user)
+
+    @override_settings(JWT_USER_STATE_TTL=0)
+    def test_claims_are_trusted_without_a_query(self):
+        with self.assertNumQueries(0):
+            user = self.authenticate(self.claims_token())
+        self.assertIsInstance(user, ClaimsUser)
+        self.assertEqual(user, self.user)
+        self.assertFalse(user.is_admin)
+
+    def test_user_state_is_loaded_once_per_ttl(self):
+        with self.assertNumQueries(1):
+            self.authenticate(self.claims_token())
+        with self.assertNumQueries(0):
+            self.authenticate(self.claims_token())
+
+    def test_role_changes_apply_to_issued_tokens(self):
+        token = self.claims_token()
+        self.authenticate(token)
+        self.user.role = 'ADMIN'
+        self.user.save()
+        self.assertTrue(self.authenticate(token).is_admin)
+
+    def test_deactivated_users_are_rejected(self):
+        token = self.claims_token()
+        self.authenticate(token)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    @override_settings(JWT_USER_STATE_TTL=0)
+    def test_tokens_without_claims_load_the_user(self):
+        token = AccessToken.for_user(self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate(token), self.user)
+        self.user.delete()
+        _user_states.clear()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_full_user_is_loaded_on_demand(self):
+        user = self.authenticate(self.claims_token())
+        with self.assertNumQueries(1):
+            self.assertEqual(user.get_user().email, self.user.email)
+            self.assertEqual(user.get_user().email, self.user.email)
+
+    def test_login_tokens_carry_the_claims(self):
+        self.user.set_password('correct horse battery')
+        self.user.save()
+        response = self.client.post('/api/auth/login/', {
+            'email': self.user.email, 'password': 'correct horse battery',
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        token = AccessToken(response.data['data']['access'])
+        self.assertEqual((token['role'], token['is_superuser'], token['is_active']), ('USER', False, True))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        profile = self.client.get('/api/auth/profile/')
+        self.assertEqual(profile.data['email'], self.user.email)
+
+
+class PasswordHashingTests(AuthenticationTestCase):
+    """Configurable hasher costs, hash upgrades and the cap on concurrent hashes"""
+
+    password = 'correct horse battery'
+
+    def login(self, password=None):
+        return self.client.post('/api/auth/login/', {
+            'email': 'alice@example.com', 'password': password or self.password,
+        }, format='json')
+
+    def test_hashes_use_the_configured_cost(self):
+        user = self.create_user(password=self.password)
+        algorithm, work_factor, *_ = user.password.split('$')
+        self.assertEqual((algorithm, work_factor), ('scrypt', str(2 ** 4)))
+        self.assertTrue(user.check_password(self.password))
+        self.assertFalse(user.check_password('wrong'))
+
+    def test_login_upgrades_hashes_of_other_hashers_and_costs(self):
+        for encoded in (
+            make_password(self.password, hasher='pbkdf2_sha256'),
+            hashers.ScryptPasswordHasher().encode(self.password, 'salt' * 4, n=2 ** 5),
+        ):
+            with self.subTest(encoded=encoded.split('$')[:2]):
+                User.objects.filter(email='alice@example.com').delete()
+                user = self.create_user()
+                User.objects.filter(pk=user.pk).update(password=encoded)
+
+                self.assertEqual(self.login().status_code, 200)
+                user.refresh_from_db()
+                self.assertTrue(user.password.startswith(f'scrypt${2 ** 4}$'))
+                self.assertTrue(user.check_password(self.password))
+
+    def test_wrong_password_keeps_the_hash(self):
+        user = self.create_user()
+        User.objects.filter(pk=user.pk).update(password=make_password(self.password, hasher='pbkdf2_sha256'))
+        self.assertEqual(self.login('wrong password').status_code, 400)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+
+    @override_settings(PASSWORD_HASH_WORKERS=1)
+    def test_hashes_run_on_the_request_thread_one_slot_at_a_time(self):
+        running, _ = hashers.get_hash_slots()
+
+        def make_password(password):
+            # The only slot is taken by this hash.
+            return threading.current_thread().name, running.acquire(blocking=False)
+
+        with mock.patch.object(hashers.hashers, 'make_password', make_password):
+            self.assertEqual(hashers.hash_password(self.password), (threading.current_thread().name, False))
+        self.assertTrue(running.acquire(blocking=False))
+        running.release()
+
+    @override_settings(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_MAX_PENDING=1)
+    def test_logins_beyond_the_queue_are_refused(self):
+        self.create_user(password=self.password)
+        _, pending = hashers.get_hash_slots()
+        pending.acquire()
+        try:
+            response = self.login()
+        finally:
+            pending.release()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.login().status_code, 200)
+
+    @override_settings(PASSWORD_HASH_WORKERS=0)
+    def test_hashing_inline_without_workers(self):
+        with mock.patch.object(hashers, 'get_hash_slots') as get_hash_slots:
+            user = self.create_user(password=self.password)
+            self.assertTrue(user.check_password(self.password))
+        get_hash_slots.assert_not_called()
+
+
+def throttle_rates(**rates):
+    """Override the given `DEFAULT_THROTTLE_RATES` scopes"""
+    rest_framework = settings.REST_FRAMEWORK
+    return override_settings(REST_FRAMEWORK={
+        **rest_framework,
+        'DEFAULT_THROTTLE_RATES': {**rest_framework['DEFAULT_THROTTLE_RATES'], **rates},
+    })
+
+
+class AuthenticationThrottleTests(AuthenticationTestCase):
+    """Login, registration and refresh throttles"""
+
+    def login(self, email='alice@example.com', ip='10.0.0.1'):
+        return self.client.post('/api/auth/login/', {
+            'email': email, 'password': 'wrong password',
+        }, format='json', REMOTE_ADDR=ip)
+
+    @throttle_rates(login='2/min', login_account=None)
+    def test_logins_per_ip(self):
+        self.assertEqual([self.login().status_code for _ in range(3)], [400, 400, 429])
+        response = self.login()
+        self.assertEqual(int(response['Retry-After']), 30)
+        self.assertEqual(self.login(ip='10.0.0.2').status_code, 400)
+
+    @throttle_rates(login=None, login_account='2/min')
+    def test_logins_per_account_from_any_ip(self):
+        statuses = [self.login(ip=f'10.0.0.{index}').status_code for index in range(3)]
+        self.assertEqual(statuses, [400, 400, 429])
+        self.assertEqual(self.login(email='ALICE@example.com ', ip='10.0.0.9').status_code, 429)
+        self.assertEqual(self.login(email='bob@example.com').status_code, 400)
+
+    @throttle_rates(register='1/hour')
+    def test_registrations_per_ip(self):
+        def register(name):
+            return self.client.post('/api/auth/register/', {
+                'email': f'{name}@example.com', 'username': name,
+                'password': 'correct horse battery', 'password2': 'correct horse battery',
+            }, format='json')
+
+        self.assertEqual(register('alice').status_code, 201)
+        self.assertEqual(register('bob').status_code, 429)
+
+    @throttle_rates(login=None, login_account=None)
+    def test_disabled_scopes_do_not_throttle(self):
+        self.assertEqual({self.login().status_code for _ in range(30)}, {400})
+
+
+class BloomFilterTests(AuthenticationTestCase):
+    """`BloomFilter`: no false negatives, false positives near the target"""
+
+    def test_membership(self):
+        bloom = BloomFilter(1000, 0.01)
+        members = [f'member-{index}' for index in range(1000)]
+        for item in members:
+            bloom.add(item)
+
+        self.assertTrue(all(item in bloom for item in members))
+        false_positives = sum(f'other-{index}' in bloom for index in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_repeated_items_are_counted_once(self):
+        bloom = BloomFilter(100, 0.01)
+        bloom.add('jti')
+        bloom.add('jti')
+        self.assertEqual(len(bloom), 1)
+
+
+@override_settings(JWT_BLACKLIST_SYNC_INTERVAL=0)
+class RevokedTokenFilterTests(AuthenticationTestCase):
+    """Blacklist checks answered from memory, synced with the table"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user(password='correct horse battery')
+        self.revoked = RevokedTokenFilter()
+        # Build in the test's transaction instead of a background thread.
+        self.revoked.start_rebuild = mock.Mock()
+        patcher = mock.patch('apps.authentication.tokens.revoked_tokens', self.revoked)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def blacklist_elsewhere(self, token):
+        """Blacklist `token` the way another process would"""
+        outstanding = OutstandingToken.objects.get(jti=token['jti'])
+        BlacklistedToken.objects.create(token=outstanding)
+
+    def refresh(self, token):
+        return self.client.post('/api/auth/token/refresh/', {'refresh': str(token)}, format='json')
+
+    def test_checks_query_until_the_filter_is_built(self):
+        token = RefreshToken.for_user(self.user)
+        with self.assertNumQueries(1):
+            self.assertFalse(self.revoked.is_revoked(token['jti']))
+        self.revoked.start_rebuild.assert_called_once_with()
+
+    def test_tokens_outside_the_filter_need_no_query(self):
+        token = RefreshToken.for_user(self.user)
+        self.revoked.rebuild()
+        with mock.patch.object(self.revoked, 'sync'), self.assertNumQueries(0):
+            self.assertFalse(self.revoked.is_revoked(token['jti']))
+
+    def test_revoked_tokens_are_found(self):
+        revoked = RefreshToken.for_user(self.user)
+        self.blacklist_elsewhere(revoked)
+        self.revoked.rebuild()
+        self.assertTrue(self.revoked.is_revoked(revoked['jti']))
+        # Confirmed revocations are remembered.
+        with self.assertNumQueries(0):
+            self.assertTrue(self.revoked.is_revoked(revoked['jti']))
+
+    def test_tokens_blacklisted_by_other_processes_are_synced(self):
+        self.revoked.rebuild()
+        token = RefreshToken.for_user(self.user)
+        self.assertFalse(self.revoked.is_revoked(token['jti']))
+        self.blacklist_elsewhere(token)
+        self.assertTrue(self.revoked.is_revoked(token['jti']))
+
+    def test_logout_and_rotation_revoke_refresh_tokens(self):
+        self.revoked.rebuild()
+        tokens = TokenSerializer.get_tokens_for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+
+        rotated = self.refresh(tokens['refresh'])
+        self.assertEqual(rotated.status_code, 200)
+        self.assertEqual(self.refresh(tokens['refresh']).status_code, 401)
+
+        logout = self.client.post('/api/auth/logout/', {'refresh': rotated.data['refresh']}, format='json')
+        self.assertEqual(logout.status_code, 200)
+        self.assertEqual(self.refresh(rotated.data['refresh']).status_code, 401)
+
+    def test_refresh_checks_the_database_before_the_filter_syncs(self):
+        self.revoked.rebuild()
+        token = RefreshToken.for_user(self.user)
+        self.blacklist_elsewhere(token)
+        with mock.patch.object(self.revoked, 'sync'):
+            self.assertFalse(self.revoked.is_revoked(token['jti']))
+            self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_only_one_refresh_can_rotate_a_token(self):
+        self.revoked.rebuild()
+        token = RefreshToken.for_user(self.user)
+        # Both requests pass the blacklist check before either rotates.
+        first = RotatingRefreshToken(str(token))
+        second = RotatingRefreshToken(str(token))
+        first.blacklist()
+        with self.assertRaises(TokenError):
+            second.blacklist()
+
+    @override_settings(SIMPLE_JWT={**settings.SIMPLE_JWT, 'ROTATE_REFRESH_TOKENS': False})
+    def test_refresh_without_rotation_checks_the_database(self):
+        self.revoked.rebuild()
+        token = RefreshToken.for_user(self.user)
+        self.blacklist_elsewhere(token)
+        with mock.patch.object(self.revoked, 'sync'):
+            self.assertEqual(self.refresh(token).status_code, 401)
+
+    @override_settings(JWT_BLACKLIST_FILTER=False)
+    def test_filter_can_be_disabled(self):
+        token = RefreshToken.for_user(self.user)
+        self.blacklist_elsewhere(token)
+        self.assertEqual(self.refresh(token).status_code, 401)
+        self.revoked.start_rebuild.assert_not_called()
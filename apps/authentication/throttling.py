@@ -0,0 +1,44 @@
+"""
+Authentication Throttles
+
+Rates are the `login`, `login_account`, `register` and `token_refresh`
+scopes of `DEFAULT_THROTTLE_RATES`.
+"""
+
+import hashlib
+
+from apps.core.throttling import IPTokenBucketThrottle, TokenBucketThrottle
+
+
+class LoginThrottle(IPTokenBucketThrottle):
+    """Login attempts per client IP"""
+
+    scope = 'login'
+
+
+class LoginAccountThrottle(TokenBucketThrottle):
+    """
+    Login attempts per account, so guessing one password from many IPs is
+    throttled as well
+    """
+
+    scope = 'login_account'
+
+    def get_cache_key(self, request, view):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if not isinstance(email, str) or not email.strip():
+            return None
+        ident = hashlib.sha1(email.strip().lower().encode()).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class RegisterThrottle(IPTokenBucketThrottle):
+    """Registrations per client IP"""
+
+    scope = 'register'
+
+
+class TokenRefreshThrottle(IPTokenBucketThrottle):
+    """Token refreshes per client IP"""
+
+    scope = 'token_refresh'
@@ -0,0 +1,52 @@
+"""
+JWT Tokens
+"""
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from .blacklist import revoked_tokens
+
+
+class RefreshToken(tokens.RefreshToken):
+    """
+    Refresh token checking the blacklist through `revoked_tokens`
+    """
+
+    def check_blacklist(self):
+        if not settings.JWT_BLACKLIST_FILTER:
+            return super().check_blacklist()
+        if revoked_tokens.is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        blacklisted = super().blacklist()
+        revoked_tokens.add(self.payload[api_settings.JTI_CLAIM])
+        return blacklisted
+
+
+class RotatingRefreshToken(RefreshToken):
+    """
+    Refresh token presented to token refresh, where the database decides
+
+    The filter can lag a blacklisting done by another process, so the
+    rotation claims the token by inserting its blacklist row: only the
+    request that creates the row gets new tokens. Without rotation the
+    blacklist table is queried directly.
+    """
+
+    def check_blacklist(self):
+        super().check_blacklist()
+        rotating = api_settings.ROTATE_REFRESH_TOKENS and api_settings.BLACKLIST_AFTER_ROTATION
+        if settings.JWT_BLACKLIST_FILTER and not rotating:
+            tokens.RefreshToken.check_blacklist(self)
+
+    def blacklist(self):
+        blacklisted, created = super().blacklist()
+        if not created:
+            # Rotated or revoked by another request first
+            raise TokenError(_('Token is blacklisted'))
+        return blacklisted, created
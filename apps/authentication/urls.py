@@ -13,6 +13,7 @@ from .views import (
     ChangePasswordView,
     UserListView,
 )
+from .throttling import TokenRefreshThrottle
 
 app_name = 'authentication'
 
@@ -21,7 +22,7 @@ urlpatterns = [
     path('register/', UserRegistrationView.as_view(), name='register'),
     path('login/', UserLoginView.as_view(), name='login'),
     path('logout/', UserLogoutView.as_view(), name='logout'),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/refresh/', TokenRefreshView.as_view(throttle_classes=[TokenRefreshThrottle]), name='token_refresh'),
     
     # User Profile
     path('profile/', UserProfileView.as_view(), name='profile'),
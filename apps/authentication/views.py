@@ -5,7 +5,6 @@ Authentication Views
 from rest_framework import status, generics, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django.contrib.auth import get_user_model
 from drf_yasg.utils import swagger_auto_schema
@@ -18,7 +17,10 @@ from .serializers import (
     ChangePasswordSerializer,
     TokenSerializer,
 )
+from .authentication import get_full_user
 from .permissions import IsOwnerOrAdmin
+from .throttling import LoginAccountThrottle, LoginThrottle, RegisterThrottle
+from .tokens import RefreshToken
 
 User = get_user_model()
 
@@ -32,6 +34,7 @@ class UserRegistrationView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserRegistrationSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [RegisterThrottle]
     
     @swagger_auto_schema(
         operation_description="Register a new user",
@@ -67,6 +70,7 @@ class UserLoginView(APIView):
     Authenticates user and returns JWT tokens.
     """
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [LoginThrottle, LoginAccountThrottle]
     serializer_class = UserLoginSerializer
     
     @swagger_auto_schema(
@@ -155,7 +159,7 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_object(self):
-        return self.request.user
+        return get_full_user(self.request)
     
     @swagger_auto_schema(
         operation_description="Get current user profile",
@@ -207,7 +211,7 @@ class ChangePasswordView(APIView):
     def post(self, request):
         serializer = ChangePasswordSerializer(
             data=request.data,
-            context={'request': request}
+            context={'request': request, 'user': get_full_user(request)}
         )
         serializer.is_valid(raise_exception=True)
         serializer.save()
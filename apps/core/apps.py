@@ -0,0 +1,17 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.core'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from .instrumentation import install_query_recorder
+        from .metrics import count_connection_opened
+        from .sqlite import configure_connection
+
+        connection_created.connect(configure_connection)
+        connection_created.connect(install_query_recorder)
+        connection_created.connect(count_connection_opened)
@@ -0,0 +1,315 @@
+"""
+Request Instrumentation
+
+`request_metrics_middleware` measures every request:
+- the number of SQL queries and the time spent running them, through an
+  `execute_wrapper` installed on each database connection;
+- identical SELECTs run more than once;
+- the time spent in `timed('serialize')` blocks.
+
+The figures are:
+- logged on this module's logger as fields of the record (`extra`) and as
+  `key=value` pairs in the message. Requests that repeat a query are
+  logged at WARNING, others at INFO.
+- sent back in a `Server-Timing` header when
+  `REQUEST_METRICS_SERVER_TIMING` is on.
+- aggregated into per-route histograms, in process memory, served to
+  admins at `/api/admin/request-metrics/`.
+- recorded per URL name in the Prometheus registry when `METRICS` is on
+  (see `metrics`).
+
+Metrics live in a context variable, so the database calls async views
+make through `sync_to_async` are counted too. Streaming response bodies
+are produced after the middleware returns and are not measured.
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+from django.utils.decorators import sync_and_async_middleware
+
+from . import metrics as prometheus
+
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets; a last bucket holds the rest.
+DURATION_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+current_metrics = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Database and serializer cost of one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.timings = defaultdict(float)
+        self.selects = Counter()
+
+    @property
+    def duplicate_queries(self):
+        """Executions of a SELECT already run with the same parameters on the same database"""
+        return sum(count - 1 for count in self.selects.values())
+
+    def most_duplicated(self):
+        """Return `(sql, executions)` of the most repeated SELECT"""
+        (_, sql, _), count = self.selects.most_common(1)[0]
+        return sql, count
+
+    def server_timing(self, elapsed):
+        """Return the `Server-Timing` header value"""
+        metrics = [f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"']
+        metrics += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.timings.items()]
+        metrics.append(f'total;dur={elapsed * 1000:.1f}')
+        return ', '.join(metrics)
+
+
+def record_query(execute, sql, params, many, context):
+    """`execute_wrapper` adding each query to the current request's metrics"""
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += time.perf_counter() - start
+        metrics.queries += 1
+        if not many and sql.lstrip()[:6].upper() == 'SELECT':
+            metrics.selects[context['connection'].alias, sql, repr(params)] += 1
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """`connection_created` receiver wrapping the connection's queries"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def timed(name):
+    """Add the time spent in the block to the current request's `name` timing"""
+    metrics = current_metrics.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.timings[name] += time.perf_counter() - start
+
+
+class Histogram:
+    """Counts of observed values per bucket, plus their sum"""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the `q` quantile, None when it
+        is past the last bound
+        """
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return None
+
+    def as_dict(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        buckets['+Inf'] = self.count
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 3),
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': buckets,
+        }
+
+
+class ViewMetrics:
+    """Aggregated metrics of one route"""
+
+    def __init__(self):
+        self.requests = 0
+        self.server_errors = 0
+        self.duplicate_query_requests = 0
+        self.duration_ms = Histogram(DURATION_BUCKETS_MS)
+        self.db_ms = Histogram(DURATION_BUCKETS_MS)
+        self.serialize_ms = Histogram(DURATION_BUCKETS_MS)
+        self.queries = Histogram(QUERY_BUCKETS)
+
+    def observe(self, status_code, elapsed, metrics):
+        self.requests += 1
+        self.server_errors += status_code >= 500
+        self.duplicate_query_requests += metrics.duplicate_queries > 0
+        self.duration_ms.observe(elapsed * 1000)
+        self.db_ms.observe(metrics.db_time * 1000)
+        self.serialize_ms.observe(metrics.timings.get('serialize', 0.0) * 1000)
+        self.queries.observe(metrics.queries)
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'server_errors': self.server_errors,
+            'duplicate_query_requests': self.duplicate_query_requests,
+            'duration_ms': self.duration_ms.as_dict(),
+            'db_ms': self.db_ms.as_dict(),
+            'serialize_ms': self.serialize_ms.as_dict(),
+            'queries': self.queries.as_dict(),
+        }
+
+
+class MetricsRegistry:
+    """Per-route `ViewMetrics` of this process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+            self.since = timezone.now()
+
+    def observe(self, view, status_code, elapsed, metrics):
+        with self.lock:
+            if view not in self.views:
+                self.views[view] = ViewMetrics()
+            self.views[view].observe(status_code, elapsed, metrics)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'since': self.since,
+                'views': {view: self.views[view].as_dict() for view in sorted(self.views)},
+            }
+
+
+registry = MetricsRegistry()
+
+
+def view_key(request):
+    """Name a request by method and URL pattern, e.g. `GET api/tasks/<int:id>/`"""
+    match = getattr(request, 'resolver_match', None)
+    return f"{request.method} {match.route if match else '<unresolved>'}"
+
+
+def url_name(request):
+    """Name a request by its URL name, e.g. `tasks:task_detail`"""
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else '<unresolved>'
+
+
+def track_in_flight(delta):
+    """Count a request starting (1) or ending (-1) in the Prometheus registry"""
+    if settings.METRICS:
+        if delta > 0:
+            prometheus.registry.start_flusher()
+        prometheus.http_requests_in_flight.inc(amount=delta)
+
+
+def observe_request(request, response, elapsed, metrics):
+    """Record a finished request in the Prometheus registry"""
+    view = (('view', url_name(request)),)
+    prometheus.http_requests.inc(view + (('method', request.method), ('status', response.status_code)))
+    prometheus.http_request_duration.observe(elapsed, view + (('method', request.method),))
+    prometheus.http_request_db_duration.observe(metrics.db_time, view)
+    prometheus.http_request_db_queries.inc(view, metrics.queries)
+
+
+def finish_request(request, response, metrics):
+    """Record, log and report the metrics of a finished request"""
+    elapsed = time.perf_counter() - metrics.started
+    view = view_key(request)
+    registry.observe(view, response.status_code, elapsed, metrics)
+    if settings.METRICS:
+        observe_request(request, response, elapsed, metrics)
+
+    if settings.REQUEST_METRICS_SERVER_TIMING:
+        response['Server-Timing'] = metrics.server_timing(elapsed)
+
+    duplicates = metrics.duplicate_queries
+    level = logging.WARNING if duplicates else logging.INFO
+    if logger.isEnabledFor(level):
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'view': view,
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 1),
+            'db_ms': round(metrics.db_time * 1000, 1),
+            'queries': metrics.queries,
+            'duplicate_queries': duplicates,
+            'serialize_ms': round(metrics.timings.get('serialize', 0.0) * 1000, 1),
+        }
+        message = ' '.join(f'{key}={value}' for key, value in fields.items())
+        if duplicates:
+            sql, count = metrics.most_duplicated()
+            fields['duplicated_sql'] = sql
+            message += f' duplicated_sql="{sql[:200]}" ({count}x)'
+        logger.log(level, message, extra=fields)
+    return response
+
+
+@sync_and_async_middleware
+def request_metrics_middleware(get_response):
+    """
+    Measure each request (see the module docstring); unused when
+    `REQUEST_METRICS` is off
+    """
+    if not settings.REQUEST_METRICS:
+        raise MiddlewareNotUsed
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            metrics = RequestMetrics()
+            token = current_metrics.set(metrics)
+            track_in_flight(1)
+            try:
+                response = await get_response(request)
+            finally:
+                current_metrics.reset(token)
+                track_in_flight(-1)
+            return finish_request(request, response, metrics)
+    else:
+        def middleware(request):
+            metrics = RequestMetrics()
+            token = current_metrics.set(metrics)
+            track_in_flight(1)
+            try:
+                response = get_response(request)
+            finally:
+                current_metrics.reset(token)
+                track_in_flight(-1)
+            return finish_request(request, response, metrics)
+    return middleware
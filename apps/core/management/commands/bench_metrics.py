@@ -0,0 +1,127 @@
+"""
+Benchmark the cost of the Prometheus metrics registry
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from apps.core.metrics import DURATION_BUCKETS, MetricsRegistry
+from apps.tasks.harness import authenticated_client, create_fixture, test_database, unthrottled
+
+
+LABELS = (('view', 'tasks:task_list_create'), ('method', 'GET'), ('status', 200))
+
+
+class LockedRegistry:
+    """Baseline: one dict shared by all threads behind a lock"""
+
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, key):
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + 1
+
+    def observe(self, key, value):
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = [0] * (len(DURATION_BUCKETS) + 2)
+            series[bisect_left(DURATION_BUCKETS, value)] += 1
+            series[-1] += value
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure metric recording (per-thread shards vs a locked dict), rendering '
+        '/metrics, and the task list throughput with request metrics on and off'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operations', type=int, default=200000, help='Recordings per thread (default: 200000)')
+        parser.add_argument('--threads', type=int, default=8, help='Threads recording at once (default: 8)')
+        parser.add_argument('--requests', type=int, default=1000, help='Task list requests per mode (default: 1000)')
+
+    def handle(self, *args, **options):
+        self.bench_recording(options['operations'], options['threads'])
+        self.bench_requests(options['requests'])
+
+    def bench_recording(self, operations, thread_count):
+        shards = MetricsRegistry()
+        counter = shards.counter('bench_total', 'Benchmark counter', ['view', 'method', 'status'])
+        histogram = shards.histogram('bench_seconds', 'Benchmark histogram', ['view', 'method', 'status'])
+        locked = LockedRegistry()
+        key = ('bench_total', LABELS)
+        histogram_key = ('bench_seconds', LABELS)
+
+        def shard_work():
+            for index in range(operations):
+                counter.inc(LABELS)
+                histogram.observe(index % 1000 / 10000, LABELS)
+
+        def locked_work():
+            for index in range(operations):
+                locked.inc(key)
+                locked.observe(histogram_key, index % 1000 / 10000)
+
+        thread_counts = sorted({1, thread_count})
+        for threads in thread_counts:
+            for label, work in [('locked dict', locked_work), ('thread shards', shard_work)]:
+                elapsed = self.run_threads(work, threads)
+                recordings = 2 * operations * threads
+                self.stdout.write(
+                    f'{label:<14} {threads:>2} threads  {recordings / elapsed:12.0f} recordings/s   '
+                    f'{elapsed / recordings * 1e9:6.0f} ns each'
+                )
+
+        # Nothing is lost without the lock.
+        totals = shards.collect()
+        assert totals[key] == operations * sum(thread_counts), totals[key]
+
+        for series in range(2000):
+            counter.inc((('view', f'view{series % 50}'), ('method', 'GET'), ('status', 200 + series // 50)))
+            histogram.observe(0.01, (('view', f'view{series % 50}'), ('method', 'GET'), ('status', 200 + series // 50)))
+        start = time.perf_counter()
+        text = shards.render()
+        self.stdout.write(
+            f'render         {len(text.splitlines())} lines in {(time.perf_counter() - start) * 1000:.1f} ms'
+        )
+
+    def run_threads(self, work, count):
+        threads = [threading.Thread(target=work) for _ in range(count)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+    def bench_requests(self, requests):
+        """GET /api/tasks/ in process, with the response cache off"""
+        with test_database(), unthrottled(), override_settings(TASK_RESPONSE_CACHE_TIMEOUT=0):
+            (user,), _ = create_fixture(users=1, tasks_per_user=50, admins=0)
+            client = authenticated_client(user)
+            results = {}
+            # Alternate the modes so drift affects both alike.
+            for _ in range(3):
+                for label, enabled in [('metrics off', False), ('metrics on', True)]:
+                    with override_settings(METRICS=enabled):
+                        for _ in range(20):
+                            client.get('/api/tasks/?page_size=50')
+                        start = time.perf_counter()
+                        for _ in range(requests):
+                            client.get('/api/tasks/?page_size=50')
+                        results.setdefault(label, []).append(time.perf_counter() - start)
+
+        for label, runs in results.items():
+            elapsed = min(runs)
+            self.stdout.write(
+                f'{label:<14} {requests / elapsed:9.1f} req/s   {elapsed / requests * 1e6:8.0f} us/request'
+            )
+        overhead = min(results['metrics on']) / min(results['metrics off']) - 1
+        self.stdout.write(f'request overhead {overhead:+.1%}')
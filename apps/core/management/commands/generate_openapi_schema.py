@@ -0,0 +1,30 @@
+"""
+Write the OpenAPI schema of the current code version to disk
+"""
+
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from apps.core.openapi import generate_schema, get_code_version, schema_path, write_schema
+
+
+class Command(BaseCommand):
+    help = 'Generate the OpenAPI schema artifact served at /api/schema/ (run on deploy)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate even if the artifact of this code version exists',
+        )
+        parser.add_argument('--output', '-o', help='Write to this file instead of OPENAPI_SCHEMA_DIR')
+
+    def handle(self, *args, **options):
+        path = schema_path()
+        if options['output'] is None and path.exists() and not options['force']:
+            self.stdout.write(f'Schema for code version {get_code_version()} is up to date: {path}')
+            return
+
+        path = write_schema(generate_schema(), Path(options['output']) if options['output'] else path)
+        self.stdout.write(self.style.SUCCESS(f'Wrote schema for code version {get_code_version()} to {path}'))
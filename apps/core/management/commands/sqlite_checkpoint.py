@@ -0,0 +1,35 @@
+"""
+Checkpoint the SQLite write-ahead log
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from apps.core.sqlite import CHECKPOINT_MODES, checkpoint
+
+
+class Command(BaseCommand):
+    help = 'Copy the SQLite WAL into the database file and, in TRUNCATE mode, empty it (e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode',
+            choices=CHECKPOINT_MODES,
+            default='TRUNCATE',
+            help='PASSIVE never waits; TRUNCATE waits for readers and empties the WAL (default: TRUNCATE)',
+        )
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias (default: default)')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError(f'{options["database"]} is {connection.vendor}, not SQLite.')
+
+        busy, frames, checkpointed = checkpoint(options['mode'], options['database'])
+        if frames == -1:
+            raise CommandError(f'{options["database"]} is not in WAL mode.')
+        if busy:
+            raise CommandError(
+                f'Checkpoint blocked by other connections: {checkpointed} of {frames} frames copied.'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Checkpointed {checkpointed} of {frames} WAL frames.'))
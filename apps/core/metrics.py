@@ -0,0 +1,363 @@
+"""
+Prometheus Metrics
+
+A small metrics registry rendered in the Prometheus text format at
+`/metrics`.
+
+Recording takes no lock. Every thread adds to its own shard, a plain dict
+only that thread writes, and a scrape sums the shards. Histograms have
+fixed buckets, so an observation is a bisect and two additions. Shards
+of finished threads are folded into one, so a thread per request does
+not grow the registry.
+
+Each process has its own registry. Under gunicorn, set
+`METRICS_MULTIPROCESS_DIR` to a directory shared by the workers and
+emptied when the server starts:
+- every worker writes its totals there every `METRICS_FLUSH_INTERVAL`
+  seconds and on exit;
+- the worker answering a scrape adds the other workers' files to its own
+  live values.
+Counters and histograms of exited workers keep counting. Gauges only
+count live workers.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Request and database durations, in seconds
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Metric:
+    """A named family of series, one per tuple of label values"""
+
+    type = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def zero(self):
+        return 0
+
+    def merge(self, total, value):
+        return total + value
+
+    def samples(self, labels, value):
+        """Yield `(suffix, labels, value)` exposition samples of one series"""
+        yield '', labels, value
+
+
+class Counter(Metric):
+    """Monotonic count"""
+
+    type = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        values = self.registry.thread_values()
+        key = (self.name, labels)
+        values[key] = values.get(key, 0) + amount
+
+
+class Gauge(Counter):
+    """Value going up and down, e.g. requests in flight"""
+
+    type = 'gauge'
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+
+class Histogram(Metric):
+    """
+    Observations counted into cumulative `le` buckets
+
+    A series is stored as the per-bucket counts (the last bucket being
+    `+Inf`) followed by the sum of the observations.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        values = self.registry.thread_values()
+        key = (self.name, labels)
+        series = values.get(key)
+        if series is None:
+            series = values[key] = self.zero()
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def zero(self):
+        return [0] * (len(self.buckets) + 2)
+
+    def merge(self, total, value):
+        return [a + b for a, b in zip(total, value)]
+
+    def samples(self, labels, value):
+        cumulative = 0
+        for bound, count in zip(self.buckets, value):
+            cumulative += count
+            yield '_bucket', labels + (('le', format_value(bound)),), cumulative
+        count = cumulative + value[-2]
+        yield '_bucket', labels + (('le', '+Inf'),), count
+        yield '_sum', labels, value[-1]
+        yield '_count', labels, count
+
+
+class MetricsRegistry:
+    """
+    Metric families and the per-thread shards holding their values
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.reset()
+
+    def reset(self):
+        """Drop every recorded value, e.g. in a forked worker"""
+        with self.lock:
+            self.pid = os.getpid()
+            # (thread, values) of live threads; finished ones go to `retired`
+            self.shards = []
+            self.retired = {}
+            self.local = threading.local()
+            self.flusher = None
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        return self.register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f'Metric {metric.name} is already registered.')
+        self.metrics[metric.name] = metric
+        return metric
+
+    def thread_values(self):
+        """Return the shard of the current thread"""
+        try:
+            return self.local.values
+        except AttributeError:
+            return self.add_shard()
+
+    def add_shard(self):
+        if os.getpid() != self.pid:
+            # Forked: the parent's values are the parent's to report.
+            self.reset()
+        values = self.local.values = {}
+        with self.lock:
+            self.retire_finished_threads()
+            self.shards.append((threading.current_thread(), values))
+        return values
+
+    def retire_finished_threads(self):
+        """Fold the shards of finished threads into `retired`; call locked"""
+        live = []
+        for thread, values in self.shards:
+            if thread.is_alive():
+                live.append((thread, values))
+            else:
+                self.merge_into(self.retired, values)
+        self.shards = live
+
+    def merge_into(self, totals, values):
+        for key, value in values.items():
+            metric = self.metrics.get(key[0])
+            if metric is None:
+                continue
+            if key in totals:
+                totals[key] = metric.merge(totals[key], value)
+            else:
+                totals[key] = metric.merge(metric.zero(), value)
+
+    def collect(self):
+        """Return `{(name, labels): value}` summed over this process's threads"""
+        with self.lock:
+            self.retire_finished_threads()
+            totals = {}
+            self.merge_into(totals, self.retired)
+            for _, values in self.shards:
+                # Copying a dict is atomic; its owner may be writing to it.
+                self.merge_into(totals, values.copy())
+        return totals
+
+    def collect_all(self):
+        """`collect()` plus the last values written by other processes"""
+        totals = self.collect()
+        directory = settings.METRICS_MULTIPROCESS_DIR
+        if not directory:
+            return totals
+        for path in Path(directory).glob('metrics-*.json'):
+            try:
+                dump = json.loads(path.read_text())
+            except (OSError, ValueError):
+                # Removed or being replaced meanwhile
+                continue
+            if dump['pid'] == os.getpid():
+                continue
+            alive = pid_alive(dump['pid'])
+            values = {}
+            for name, labels, value in dump['values']:
+                metric = self.metrics.get(name)
+                if metric is not None and (alive or metric.type != 'gauge'):
+                    values[name, tuple(tuple(pair) for pair in labels)] = value
+            self.merge_into(totals, values)
+        return totals
+
+    def flush(self):
+        """Write this process's totals to `METRICS_MULTIPROCESS_DIR`"""
+        if not settings.METRICS_MULTIPROCESS_DIR:
+            return
+        directory = Path(settings.METRICS_MULTIPROCESS_DIR)
+        values = [[name, labels, value] for (name, labels), value in self.collect().items()]
+        path = directory / f'metrics-{os.getpid()}.json'
+        temporary = path.with_suffix('.tmp')
+        temporary.write_text(json.dumps({'pid': os.getpid(), 'values': values}))
+        os.replace(temporary, path)
+
+    def start_flusher(self):
+        """
+        Flush every `METRICS_FLUSH_INTERVAL` seconds from a daemon thread
+        of this process, once per process
+        """
+        if os.getpid() != self.pid:
+            # Forked, e.g. a worker of a preloading server
+            self.reset()
+        if not settings.METRICS_MULTIPROCESS_DIR:
+            return
+        if self.flusher is not None and self.flusher[0] == os.getpid():
+            return
+        with self.lock:
+            if self.flusher is not None and self.flusher[0] == os.getpid():
+                return
+            thread = threading.Thread(target=self.flush_periodically, name='metrics-flush', daemon=True)
+            self.flusher = (os.getpid(), thread)
+        Path(settings.METRICS_MULTIPROCESS_DIR).mkdir(parents=True, exist_ok=True)
+        atexit.register(self.flush)
+        thread.start()
+
+    def flush_periodically(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            self.flush()
+
+    def render(self):
+        """Return every series in the Prometheus text exposition format"""
+        series = {}
+        for (name, labels), value in self.collect_all().items():
+            series.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            for labels, value in sorted(series.get(name, ()), key=lambda item: item[0]):
+                for suffix, sample_labels, sample_value in metric.samples(labels, value):
+                    lines.append(f'{name}{suffix}{format_labels(sample_labels)} {format_value(sample_value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{name}="{escape_label(value)}"' for name, value in labels)
+    return f'{{{pairs}}}'
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+registry = MetricsRegistry()
+
+
+# Series are keyed by label pairs, e.g. (('view', 'tasks:task_detail'),).
+http_requests = registry.counter(
+    'http_requests_total',
+    'HTTP requests by URL name, method and status code',
+    ['view', 'method', 'status'],
+)
+http_request_duration = registry.histogram(
+    'http_request_duration_seconds',
+    'HTTP request duration by URL name and method',
+    ['view', 'method'],
+)
+http_request_db_duration = registry.histogram(
+    'http_request_db_duration_seconds',
+    'Time spent in SQL queries per HTTP request, by URL name',
+    ['view'],
+)
+http_request_db_queries = registry.counter(
+    'http_request_db_queries_total',
+    'SQL queries run by HTTP requests, by URL name',
+    ['view'],
+)
+http_requests_in_flight = registry.gauge(
+    'http_requests_in_flight',
+    'HTTP requests being served; each holds a database connection while it queries',
+)
+db_connections_opened = registry.counter(
+    'db_connections_opened_total',
+    'Database connections opened, by alias; a steady rate means connections are not reused',
+    ['alias'],
+)
+cache_requests = registry.counter(
+    'cache_requests_total',
+    'Cache lookups by cache and result (hit or miss)',
+    ['cache', 'result'],
+)
+jwt_auth_failures = registry.counter(
+    'jwt_auth_failures_total',
+    'Rejected JWTs by token type and reason',
+    ['token', 'reason'],
+)
+
+
+def count_connection_opened(sender, connection, **kwargs):
+    """`connection_created` receiver counting opened connections"""
+    db_connections_opened.inc((('alias', connection.alias),))
+
+
+def count_cache_lookup(cache_name, value):
+    """Count a lookup of `cache_name` that returned `value` (None is a miss)"""
+    cache_requests.inc((('cache', cache_name), ('result', 'miss' if value is None else 'hit')))
+    return value
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReplicaHeartbeat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('beat_at', models.DateTimeField(help_text='When the primary last stamped the row')),
+            ],
+            options={
+                'verbose_name': 'Replica heartbeat',
+                'verbose_name_plural': 'Replica heartbeats',
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+"""
+Core Models
+"""
+
+from django.db import models
+
+
+class ReplicaHeartbeat(models.Model):
+    """
+    Single row the primary stamps every `DATABASE_REPLICA_HEARTBEAT_INTERVAL`
+    seconds (see apps.core.replicas); a replica's copy of it shows how far
+    behind that replica is
+    """
+
+    beat_at = models.DateTimeField(
+        help_text="When the primary last stamped the row"
+    )
+
+    class Meta:
+        verbose_name = 'Replica heartbeat'
+        verbose_name_plural = 'Replica heartbeats'
+
+    def __str__(self):
+        return f"Heartbeat at {self.beat_at}"
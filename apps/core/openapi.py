@@ -0,0 +1,163 @@
+"""
+Precomputed OpenAPI Schema
+
+drf_yasg introspects every view and serializer to build the schema. It is
+done once per code version instead of per request: `manage.py
+generate_openapi_schema` (or the first request after a deploy) writes the
+schema to `OPENAPI_SCHEMA_DIR`, and the server keeps the bytes in memory.
+The Swagger UI and ReDoc pages are rendered once as well and load the
+schema from `SPEC_URL`.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson
+from drf_yasg.generators import OpenAPISchemaGenerator
+from drf_yasg.renderers import ReDocRenderer, SwaggerUIRenderer
+from rest_framework.request import Request
+
+
+API_INFO = openapi.Info(
+    title="Task Manager API",
+    default_version='v1',
+    description="""
+    A RESTful API for managing tasks with user authentication.
+
+    ## Features
+    - User registration and authentication (JWT)
+    - CRUD operations for tasks
+    - Task filtering and pagination
+    - Role-based permissions
+
+    ## Authentication
+    This API uses JWT (JSON Web Tokens) for authentication.
+
+    To authenticate:
+    1. Register a new user at `/api/auth/register/`
+    2. Login at `/api/auth/login/` to get access and refresh tokens
+    3. Include the access token in the Authorization header: `Bearer <token>`
+
+    ## Rate Limiting
+    - Login, registration and token refresh: per client IP, and logins per account
+    - Task writes: per user
+    - Throttled requests get `429 Too Many Requests` with a `Retry-After` header
+    """,
+    terms_of_service="https://www.example.com/terms/",
+    contact=openapi.Contact(email="contact@taskmanager.com"),
+    license=openapi.License(name="MIT License"),
+)
+
+# Directories whose source makes up the code version
+SOURCE_DIRS = ('apps', 'config')
+
+
+@dataclass(frozen=True)
+class Artifact:
+    """Rendered document served with a strong ETag"""
+
+    body: bytes
+    content_type: str
+
+    @property
+    def etag(self):
+        return '"%s"' % hashlib.sha1(self.body).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def get_code_version():
+    """
+    Return `API_CODE_VERSION` or, if unset, a digest of the Python sources
+    under `SOURCE_DIRS`
+    """
+    if settings.API_CODE_VERSION:
+        return settings.API_CODE_VERSION
+    digest = hashlib.sha1()
+    base_dir = Path(settings.BASE_DIR)
+    for name in SOURCE_DIRS:
+        for path in sorted((base_dir / name).rglob('*.py')):
+            digest.update(str(path.relative_to(base_dir)).encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def schema_path(version=None):
+    return Path(settings.OPENAPI_SCHEMA_DIR) / f'openapi-{version or get_code_version()}.json'
+
+
+def generate_schema():
+    """Introspect the API and return the schema as JSON bytes"""
+    # Views pick serializers by request method, so generate for a request.
+    # The host is left out so the document is valid wherever it is served.
+    request = Request(RequestFactory().get('/api/schema/'))
+    request.user = AnonymousUser()
+    generator = OpenAPISchemaGenerator(info=API_INFO, url='http://localhost/')
+    schema = generator.get_schema(request=request, public=True)
+    schema.pop('host', None)
+    schema.pop('schemes', None)
+    return OpenAPICodecJson(validators=[]).encode(schema)
+
+
+def write_schema(body, path=None):
+    """Atomically write `body` to `path`, the current version's by default"""
+    path = path or schema_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.openapi-')
+    with os.fdopen(fd, 'wb') as tmp:
+        tmp.write(body)
+    os.replace(tmp_path, path)
+    return path
+
+
+_lock = threading.Lock()
+_artifacts = {}
+
+
+def get_schema_artifact():
+    """
+    Return the schema of the current code version, read from its file or
+    generated (and written, when the directory is writable) on first use
+    """
+    with _lock:
+        if 'schema' not in _artifacts:
+            path = schema_path()
+            try:
+                body = path.read_bytes()
+            except FileNotFoundError:
+                body = generate_schema()
+                try:
+                    write_schema(body, path)
+                except OSError:
+                    pass
+            _artifacts['schema'] = Artifact(body, 'application/json')
+        return _artifacts['schema']
+
+
+def get_ui_artifact(name):
+    """Return the rendered `swagger` or `redoc` page"""
+    with _lock:
+        if name not in _artifacts:
+            renderer = {'swagger': SwaggerUIRenderer, 'redoc': ReDocRenderer}[name]()
+            # Only the title and version of the schema are used by the pages.
+            context = {}
+            renderer.set_context(context, openapi.Swagger(info=API_INFO, _prefix='/', _version=API_INFO._default_version))
+            body = render_to_string(renderer.template, context).encode()
+            _artifacts[name] = Artifact(body, 'text/html; charset=utf-8')
+        return _artifacts[name]
+
+
+def warm_schema():
+    """Load everything served by the schema views, e.g. at process start"""
+    get_schema_artifact()
+    get_ui_artifact('swagger')
+    get_ui_artifact('redoc')
@@ -0,0 +1,348 @@
+"""
+Read Replicas
+
+`ReplicaRouter` sends the reads of safe requests (GET, HEAD, OPTIONS) to
+one of `DATABASE_REPLICA_ALIASES`; everything else uses `default`:
+- writes, and every query of an unsafe request;
+- reads of users who changed something in the last
+  `DATABASE_REPLICA_PIN_SECONDS`, so they read their own writes. Pins
+  live in the `DATABASE_REPLICA_PIN_CACHE` cache, shared by processes;
+- reads inside a transaction, and those of a request that asked for the
+  primary with `read_from_primary()`;
+- queries outside requests (management commands, background threads).
+
+A request reads from one replica throughout. Each process checks a
+replica's lag at most every `DATABASE_REPLICA_CHECK_INTERVAL` seconds
+while reading from it, and skips it while it lags more than
+`DATABASE_REPLICA_MAX_LAG` seconds or fails. A safe request whose
+replica raised a database error is marked failed and served again from
+the primary. `read_replica()` tells whether the current request has read
+from a replica, e.g. to keep its possibly stale responses out of caches
+keyed by data versions.
+
+PostgreSQL standbys report their lag. For other backends (e.g. SQLite
+copies shipped by Litestream or LiteFS) each process serving requests
+stamps the one-row `ReplicaHeartbeat` table on the primary every
+`DATABASE_REPLICA_HEARTBEAT_INTERVAL` seconds, and a replica's lag is
+how far its copy of that row trails the primary's.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils import timezone
+
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_KEY = 'replica-pin:{}'
+HEARTBEAT_ID = 1
+
+current_route = ContextVar('replica_route', default=None)
+
+replica_fallbacks = metrics.registry.counter(
+    'db_replica_fallbacks_total',
+    'Replica reads sent to the primary instead, by replica and reason (lag or error)',
+    ['alias', 'reason'],
+)
+
+
+class Route:
+    """Where the reads of one request go"""
+
+    def __init__(self, safe):
+        self.safe = safe
+        self.user_id = None
+        self.pinned = None
+        self.replica = None
+        self.failed = False
+        # Whether any read went to a replica
+        self.replica_read = False
+
+    def read_alias(self):
+        """Return the replica this request reads from, None for the primary"""
+        if not self.safe or self.failed:
+            return None
+        if self.pinned is None and self.user_id is not None:
+            self.pinned = is_pinned(self.user_id)
+        if self.pinned:
+            return None
+        if self.replica is None:
+            # '' when no replica is usable
+            self.replica = health.pick()
+        if self.replica:
+            self.replica_read = True
+        return self.replica or None
+
+
+def bind_user(user_id):
+    """Tell the current request who it serves, for read-your-writes"""
+    route = current_route.get()
+    if route is not None and route.user_id != user_id:
+        route.user_id = user_id
+        route.pinned = None
+
+
+def read_from_primary():
+    """Send the remaining reads of the current request to the primary"""
+    route = current_route.get()
+    if route is not None:
+        route.pinned = True
+
+
+def read_replica():
+    """Whether the current request has read from a replica so far"""
+    route = current_route.get()
+    return route is not None and route.replica_read
+
+
+def pin_cache():
+    return caches[settings.DATABASE_REPLICA_PIN_CACHE]
+
+
+def pin_users(user_ids):
+    """Send the reads of `user_ids` to the primary for the pin window"""
+    if settings.DATABASE_REPLICA_ALIASES and user_ids:
+        pin_cache().set_many(
+            {PIN_KEY.format(user_id): 1 for user_id in user_ids},
+            timeout=settings.DATABASE_REPLICA_PIN_SECONDS,
+        )
+
+
+def is_pinned(user_id):
+    return pin_cache().get(PIN_KEY.format(user_id)) is not None
+
+
+class ReplicaHealth:
+    """Last known lag of each replica, re-checked every check interval"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # alias -> (checked at, usable)
+        self.status = {}
+        self.checking = set()
+
+    def pick(self):
+        """Return a usable replica alias, or '' when none is"""
+        aliases = [alias for alias in settings.DATABASE_REPLICA_ALIASES if self.usable(alias)]
+        return random.choice(aliases) if aliases else ''
+
+    def usable(self, alias):
+        checked_at, usable = self.status.get(alias, (None, True))
+        if checked_at is not None and time.monotonic() - checked_at < settings.DATABASE_REPLICA_CHECK_INTERVAL:
+            return usable
+        # One thread checks while the others go by the last result.
+        with self.lock:
+            if alias in self.checking:
+                return usable
+            self.checking.add(alias)
+        try:
+            usable = self.check(alias)
+        finally:
+            with self.lock:
+                self.checking.discard(alias)
+        return usable
+
+    def check(self, alias):
+        try:
+            lag = replica_lag(alias)
+        except DatabaseError:
+            logger.warning('Replica %s is unavailable', alias, exc_info=True)
+            self.mark_failed(alias)
+            return False
+        usable = lag <= settings.DATABASE_REPLICA_MAX_LAG
+        if not usable:
+            logger.warning('Replica %s lags %.1f s behind the primary', alias, lag)
+            count_fallback(alias, 'lag')
+        self.status[alias] = (time.monotonic(), usable)
+        return usable
+
+    def mark_failed(self, alias):
+        """Skip `alias` until its next check"""
+        self.status[alias] = (time.monotonic(), False)
+        count_fallback(alias, 'error')
+
+    def reset(self):
+        self.status = {}
+
+
+health = ReplicaHealth()
+
+
+def count_fallback(alias, reason):
+    if settings.METRICS:
+        replica_fallbacks.inc((('alias', alias), ('reason', reason)))
+
+
+def replica_lag(alias):
+    """
+    Seconds `alias` trails the primary
+
+    PostgreSQL standbys report it; for other backends it is how far the
+    replica's heartbeat is behind the primary's, give or take one
+    heartbeat interval. Both are single-row reads.
+    """
+    replica = connections[alias]
+    if replica.vendor == 'postgresql':
+        with replica.cursor() as cursor:
+            cursor.execute(
+                'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+            )
+            return float(cursor.fetchone()[0] or 0)
+
+    primary, copy = heartbeat_at(DEFAULT_DB_ALIAS), heartbeat_at(alias)
+    if primary is None or copy is None:
+        # No heartbeat yet on either side: nothing to compare.
+        return 0.0 if primary == copy else float('inf')
+    return max(0.0, (primary - copy).total_seconds())
+
+
+def heartbeat_at(alias):
+    """Return when the heartbeat row of database `alias` was stamped, if ever"""
+    from .models import ReplicaHeartbeat
+
+    return (
+        ReplicaHeartbeat.objects.using(alias)
+        .filter(pk=HEARTBEAT_ID)
+        .values_list('beat_at', flat=True)
+        .first()
+    )
+
+
+def beat():
+    """Stamp the primary's heartbeat row with the current time"""
+    from .models import ReplicaHeartbeat
+
+    # One upsert, so processes racing to create the row do not collide.
+    ReplicaHeartbeat.objects.using(DEFAULT_DB_ALIAS).bulk_create(
+        [ReplicaHeartbeat(pk=HEARTBEAT_ID, beat_at=timezone.now())],
+        update_conflicts=True,
+        unique_fields=['id'],
+        update_fields=['beat_at'],
+    )
+
+
+class Heartbeat:
+    """Background thread stamping the primary's heartbeat, once per process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # pid of the process whose thread beats
+        self.started = None
+
+    def start(self):
+        if not settings.DATABASE_REPLICA_HEARTBEAT_INTERVAL:
+            return
+        # A forked worker does not inherit its parent's thread.
+        if self.started == os.getpid():
+            return
+        with self.lock:
+            if self.started == os.getpid():
+                return
+            self.started = os.getpid()
+        thread = threading.Thread(target=self.run, name='replica-heartbeat', daemon=True)
+        thread.start()
+
+    def run(self):
+        # The thread keeps its own connection for good.
+        while True:
+            try:
+                beat()
+            except DatabaseError:
+                logger.exception('Replica heartbeat failed')
+            time.sleep(settings.DATABASE_REPLICA_HEARTBEAT_INTERVAL)
+
+
+heartbeat = Heartbeat()
+
+
+class ReplicaRouter:
+    """Database router sending the reads of safe requests to replicas"""
+
+    def db_for_read(self, model, **hints):
+        route = current_route.get()
+        if route is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return route.read_alias() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the primary's data.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.DATABASE_REPLICA_ALIASES
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Scope each request's `Route`; pin users after their writes, and serve
+    a safe request again from the primary when its replica failed
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICA_ALIASES:
+            raise MiddlewareNotUsed
+        heartbeat.start()
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        route = Route(request.method in SAFE_METHODS)
+        token = current_route.set(route)
+        try:
+            response = self.get_response(request)
+            if route.failed:
+                route.replica_read = False
+                response = self.get_response(request)
+        finally:
+            current_route.reset(token)
+        self.finish(request, route, response)
+        return response
+
+    async def __acall__(self, request):
+        route = Route(request.method in SAFE_METHODS)
+        token = current_route.set(route)
+        try:
+            response = await self.get_response(request)
+            if route.failed:
+                route.replica_read = False
+                response = await self.get_response(request)
+        finally:
+            current_route.reset(token)
+        self.finish(request, route, response)
+        return response
+
+    def process_exception(self, request, exception):
+        route = current_route.get()
+        if route is not None and route.replica and not route.failed and isinstance(exception, DatabaseError):
+            logger.warning('Replica %s failed; serving %s from the primary', route.replica, request.path)
+            health.mark_failed(route.replica)
+            route.failed = True
+        return None
+
+    def finish(self, request, route, response):
+        if not route.safe and route.user_id is not None and response.status_code < 400:
+            pin_users([route.user_id])
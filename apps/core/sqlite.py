@@ -0,0 +1,98 @@
+"""
+SQLite Production Profile
+
+`configure_connection` runs the `SQLITE_PRAGMAS` on every new SQLite
+connection: WAL journal, `synchronous`, page cache and memory-mapped I/O
+sizes, busy timeout. They run on the raw connection, so they are not
+counted as queries of the request that opened it.
+
+In WAL mode, commits append to the `-wal` file and checkpoints copy it
+back into the database. SQLite checkpoints on commit once the WAL passes
+1000 pages, but the writer pays for it and it cannot finish while a
+reader still needs the old pages. Each process therefore also checkpoints
+from a background thread every `SQLITE_CHECKPOINT_INTERVAL` seconds, and
+`manage.py sqlite_checkpoint` truncates the WAL on demand (e.g. from cron
+during quiet hours).
+"""
+
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+
+
+def configure_connection(sender, connection, **kwargs):
+    """`connection_created` receiver applying `SQLITE_PRAGMAS`"""
+    if connection.vendor != 'sqlite':
+        return
+    raw = connection.connection
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        if value is not None:
+            raw.execute(f'PRAGMA {name} = {value}')
+    # In-memory databases (e.g. tests) stay in `memory` journal mode.
+    if raw.execute('PRAGMA journal_mode').fetchone()[0] == 'wal':
+        checkpointer.start(connection.alias)
+
+
+def checkpoint(mode='PASSIVE', using=DEFAULT_DB_ALIAS):
+    """
+    Checkpoint the WAL of database `using` and return `(busy, wal_frames,
+    checkpointed_frames)`
+
+    PASSIVE copies what it can without waiting. TRUNCATE waits (up to the
+    busy timeout) for readers and writers, then empties the WAL file.
+    """
+    if mode not in CHECKPOINT_MODES:
+        raise ValueError(f'Unknown checkpoint mode {mode}.')
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'PRAGMA wal_checkpoint({mode})')
+        return tuple(cursor.fetchone())
+
+
+class Checkpointer:
+    """Background thread checkpointing each WAL database, once per process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # alias -> pid of the process whose thread checkpoints it
+        self.started = {}
+
+    def start(self, alias):
+        if not settings.SQLITE_CHECKPOINT_INTERVAL:
+            return
+        # A forked worker does not inherit its parent's thread.
+        if self.started.get(alias) == os.getpid():
+            return
+        with self.lock:
+            if self.started.get(alias) == os.getpid():
+                return
+            self.started[alias] = os.getpid()
+        thread = threading.Thread(target=self.run, args=(alias,), name=f'sqlite-checkpoint-{alias}', daemon=True)
+        thread.start()
+
+    def run(self, alias):
+        # The thread keeps its own connection for good.
+        while True:
+            time.sleep(settings.SQLITE_CHECKPOINT_INTERVAL)
+            start = time.perf_counter()
+            try:
+                busy, frames, checkpointed = checkpoint('PASSIVE', alias)
+            except DatabaseError:
+                logger.exception('WAL checkpoint of %s failed', alias)
+                continue
+            logger.info(
+                'WAL checkpoint of %s: %s of %s frames in %.1f ms%s',
+                alias, checkpointed, frames, (time.perf_counter() - start) * 1000,
+                ' (busy)' if busy else '',
+            )
+
+
+checkpointer = Checkpointer()
@@ -0,0 +1,475 @@
+"""
+Core Tests
+"""
+
+import json
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.db import DatabaseError, OperationalError, connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.authentication.authentication import _user_states, add_user_claims
+
+from . import openapi, replicas, sqlite
+from .instrumentation import Histogram, RequestMetrics, current_metrics, finish_request, registry, timed
+from .models import ReplicaHeartbeat
+from .throttling import CacheBucketStore, LocalBucketStore
+
+
+User = get_user_model()
+
+
+class APIRequestTestCase(APITestCase):
+    """Test case with empty caches and user states, and token-authenticated clients"""
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        _user_states.clear()
+
+    def authenticate(self, user, client=None):
+        client = client or self.client
+        token = add_user_claims(AccessToken.for_user(user), user)
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return client
+
+    def create_user(self, name='alice', **extra_fields):
+        return User.objects.create_user(email=f'{name}@example.com', username=name, **extra_fields)
+
+
+class OpenAPISchemaTests(SimpleTestCase):
+    """The schema and docs pages are generated once per code version"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        overridden = override_settings(OPENAPI_SCHEMA_DIR=self.directory, API_CODE_VERSION='test')
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        self.forget_artifacts()
+        self.addCleanup(self.forget_artifacts)
+
+    def forget_artifacts(self):
+        """Start over as a freshly started process would"""
+        openapi._artifacts.clear()
+        openapi.get_code_version.cache_clear()
+        for cache in caches.all():
+            cache.clear()
+
+    def test_schema_is_generated_once_and_written(self):
+        response = self.client.get('/api/schema/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('/tasks/', json.loads(response.content)['paths'])
+        self.assertEqual((self.directory / 'openapi-test.json').read_bytes(), response.content)
+        with mock.patch.object(openapi, 'generate_schema') as generate_schema:
+            self.assertEqual(self.client.get('/api/schema/').content, response.content)
+        generate_schema.assert_not_called()
+
+    def test_new_processes_read_the_written_schema(self):
+        (self.directory / 'openapi-test.json').write_bytes(b'{"swagger": "2.0"}')
+        with mock.patch.object(openapi, 'generate_schema') as generate_schema:
+            response = self.client.get('/api/schema/')
+        generate_schema.assert_not_called()
+        self.assertEqual(response.content, b'{"swagger": "2.0"}')
+
+    def test_conditional_requests(self):
+        for url in ('/api/schema/', '/api/docs/', '/api/redoc/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('public', response['Cache-Control'])
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_docs_pages_load_the_precomputed_schema(self):
+        self.assertContains(self.client.get('/api/docs/'), '/api/schema/')
+
+    def test_command_writes_each_code_version_once(self):
+        output = StringIO()
+        call_command('generate_openapi_schema', stdout=output)
+        self.assertTrue((self.directory / 'openapi-test.json').exists())
+
+        with mock.patch('apps.core.management.commands.generate_openapi_schema.generate_schema') as generate_schema:
+            call_command('generate_openapi_schema', stdout=output)
+        generate_schema.assert_not_called()
+        self.assertIn('up to date', output.getvalue())
+
+
+class BucketStoreTests(SimpleTestCase):
+    """Both token bucket stores implement the same GCRA"""
+
+    # A bucket of 3 tokens refilled every 10 seconds
+    interval = 10
+    capacity = 3
+
+    def stores(self):
+        yield LocalBucketStore()
+        # Local memory caches of the same name share their entries.
+        cache = LocMemCache('throttle-tests', {})
+        cache.clear()
+        yield CacheBucketStore(cache)
+
+    def test_burst_then_average_rate(self):
+        for store in self.stores():
+            with self.subTest(store=type(store).__name__):
+                now = 1000.0
+                waits = [store.consume('key', self.interval, self.capacity, now) for _ in range(4)]
+                self.assertEqual(waits[:3], [0, 0, 0])
+                self.assertAlmostEqual(waits[3], self.interval)
+
+                # Refused requests take no token: one is back after one interval.
+                self.assertEqual(store.consume('key', self.interval, self.capacity, now + self.interval), 0)
+                self.assertGreater(store.consume('key', self.interval, self.capacity, now + self.interval), 0)
+
+    def test_idle_buckets_refill_to_capacity_only(self):
+        for store in self.stores():
+            with self.subTest(store=type(store).__name__):
+                store.consume('key', self.interval, self.capacity, 1000.0)
+                later = 1000.0 + 100 * self.interval
+                waits = [store.consume('key', self.interval, self.capacity, later) for _ in range(4)]
+                self.assertEqual(waits[:3], [0, 0, 0])
+                self.assertGreater(waits[3], 0)
+
+    def test_buckets_are_independent(self):
+        for store in self.stores():
+            with self.subTest(store=type(store).__name__):
+                for _ in range(self.capacity):
+                    store.consume('one', self.interval, self.capacity, 1000.0)
+                self.assertGreater(store.consume('one', self.interval, self.capacity, 1000.0), 0)
+                self.assertEqual(store.consume('two', self.interval, self.capacity, 1000.0), 0)
+
+    def test_local_store_prunes_full_buckets(self):
+        store = LocalBucketStore()
+        store.max_size = 2
+        store.consume('old', self.interval, self.capacity, 1000.0)
+        store.consume('busy', self.interval, self.capacity, 1050.0)
+        store.consume('new', self.interval, self.capacity, 1055.0)
+        self.assertEqual(set(store.arrivals), {'busy', 'new'})
+
+
+class RequestInstrumentationTests(APIRequestTestCase):
+    """`request_metrics_middleware` and the request metrics endpoint"""
+
+    url = '/api/admin/request-metrics/'
+
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+        self.addCleanup(registry.reset)
+        self.authenticate(self.create_user(is_superuser=True, role='ADMIN'))
+
+    @override_settings(REQUEST_METRICS_SERVER_TIMING=True)
+    def test_server_timing_header(self):
+        response = self.client.get('/api/tasks/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", .*total;dur=[\d.]+$')
+        self.assertIn('serialize;dur=', response['Server-Timing'])
+
+    def test_requests_are_aggregated_per_route(self):
+        for _ in range(2):
+            self.client.get('/api/tasks/')
+        self.client.get('/api/tasks/999/')
+
+        views = self.client.get(self.url).data['data']['views']
+        listed = views['GET api/tasks/']
+        self.assertEqual(listed['requests'], 2)
+        self.assertEqual(listed['queries']['count'], 2)
+        self.assertGreater(listed['queries']['sum'], 0)
+        self.assertEqual(views['GET api/tasks/<int:id>/']['requests'], 1)
+
+    def test_reset(self):
+        self.client.get('/api/tasks/')
+        self.assertEqual(self.client.delete(self.url).status_code, 200)
+        self.assertNotIn('GET api/tasks/', self.client.get(self.url).data['data']['views'])
+
+    def test_admins_only(self):
+        self.authenticate(self.create_user('bob'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_repeated_queries_are_logged_as_warnings(self):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            for _ in range(2):
+                list(User.objects.filter(pk=1))
+            with timed('serialize'):
+                pass
+        finally:
+            current_metrics.reset(token)
+
+        self.assertEqual((metrics.queries, metrics.duplicate_queries), (2, 1))
+        self.assertIn('serialize', metrics.timings)
+        request = RequestFactory().get('/api/tasks/')
+        with self.assertLogs('apps.core.instrumentation', 'WARNING') as logs:
+            finish_request(request, HttpResponse(), metrics)
+        self.assertIn('duplicate_queries=1', logs.output[0])
+        self.assertEqual(logs.records[0].queries, 2)
+
+
+class HistogramTests(SimpleTestCase):
+    """`Histogram` quantiles are bucket upper bounds"""
+
+    def test_quantiles(self):
+        histogram = Histogram((1, 10, 100))
+        for value in (0.5, 5, 5, 50, 500):
+            histogram.observe(value)
+
+        data = histogram.as_dict()
+        self.assertEqual((data['count'], data['sum']), (5, 560.5))
+        self.assertEqual((data['p50'], data['p95']), (10, None))
+        self.assertEqual(data['buckets'], {'1': 1, '10': 3, '100': 4, '+Inf': 5})
+
+
+class PrometheusMetricsTests(APIRequestTestCase):
+    """`/metrics` is served to scrapers holding the token and to admins"""
+
+    def get_metrics(self, **headers):
+        return self.client.get('/metrics', **headers)
+
+    def test_anonymous_requests_are_refused(self):
+        response = self.get_metrics()
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('Bearer', response['WWW-Authenticate'])
+
+    def test_admins_only(self):
+        self.authenticate(self.create_user())
+        self.assertEqual(self.get_metrics().status_code, 403)
+        self.authenticate(self.create_user('admin', role='ADMIN'))
+        self.assertEqual(self.get_metrics().status_code, 200)
+
+    @override_settings(METRICS_AUTH_TOKEN='scraper-secret')
+    def test_scraper_token(self):
+        self.assertEqual(self.get_metrics(HTTP_AUTHORIZATION='Bearer scraper-secret').status_code, 200)
+        self.assertEqual(self.get_metrics(HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+
+    @override_settings(METRICS_PUBLIC=True)
+    def test_public_metrics(self):
+        self.authenticate(self.create_user())
+        self.client.get('/api/tasks/')
+        self.client.credentials()
+
+        response = self.get_metrics()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('http_requests_total{view="tasks:task_list_create",method="GET",status="200"}', response.content.decode())
+
+    @override_settings(METRICS=False, METRICS_PUBLIC=True)
+    def test_disabled(self):
+        self.assertEqual(self.get_metrics().status_code, 404)
+
+
+@override_settings(SQLITE_CHECKPOINT_INTERVAL=0)
+class SQLiteProfileTests(SimpleTestCase):
+    """`SQLITE_PRAGMAS` and WAL checkpoints on file databases"""
+
+    def connect(self):
+        """Open a connection to a new database file"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        database = DatabaseWrapper(
+            {**connection.settings_dict, 'NAME': str(Path(directory.name) / 'db.sqlite3')},
+            alias='sqlite-profile-test',
+        )
+        database.ensure_connection()
+        self.addCleanup(database.close)
+        return database
+
+    def pragma(self, database, name):
+        return database.connection.execute(f'PRAGMA {name}').fetchone()[0]
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        database = self.connect()
+        self.assertEqual(self.pragma(database, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(database, 'synchronous'), 1)
+        self.assertEqual(self.pragma(database, 'busy_timeout'), 5000)
+        self.assertEqual(self.pragma(database, 'temp_store'), 2)
+
+    @override_settings(SQLITE_PRAGMAS={'journal_mode': None, 'busy_timeout': 1234})
+    def test_unset_pragmas_keep_the_sqlite_default(self):
+        database = self.connect()
+        self.assertEqual(self.pragma(database, 'journal_mode'), 'delete')
+        self.assertEqual(self.pragma(database, 'busy_timeout'), 1234)
+
+    def test_checkpoint(self):
+        database = self.connect()
+        with database.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (value INTEGER)')
+            cursor.execute('INSERT INTO item VALUES (1)')
+        with mock.patch.object(sqlite, 'connections', {'sqlite-profile-test': database}):
+            busy, frames, checkpointed = sqlite.checkpoint('TRUNCATE', using='sqlite-profile-test')
+        self.assertEqual((busy, frames, checkpointed), (0, 0, 0))
+        with self.assertRaises(ValueError):
+            sqlite.checkpoint('EVERYTHING')
+
+    @override_settings(SQLITE_CHECKPOINT_INTERVAL=60)
+    def test_one_checkpoint_thread_per_process_and_database(self):
+        checkpointer = sqlite.Checkpointer()
+        with mock.patch('threading.Thread') as thread:
+            for _ in range(2):
+                checkpointer.start('default')
+            checkpointer.start('other')
+        self.assertEqual([call.kwargs['args'] for call in thread.call_args_list], [('default',), ('other',)])
+
+
+class ReplicaLagTests(TestCase):
+    """Replica lag measured by the heartbeat row"""
+
+    def test_beat_stamps_a_single_row(self):
+        replicas.beat()
+        first = ReplicaHeartbeat.objects.get()
+        replicas.beat()
+        second = ReplicaHeartbeat.objects.get()
+        self.assertEqual(first.pk, second.pk)
+        self.assertGreaterEqual(second.beat_at, first.beat_at)
+
+    def test_lag_reads_one_heartbeat_row_per_database(self):
+        replicas.beat()
+        # 'default' against itself: one single-row read of each side.
+        with self.assertNumQueries(2):
+            self.assertEqual(replicas.replica_lag('default'), 0.0)
+
+    def test_lag_is_how_far_the_replica_heartbeat_trails(self):
+        now = timezone.now()
+        for beats, lag in [
+            ({'default': now, 'replica': now - timedelta(seconds=8)}, 8.0),
+            ({'default': now, 'replica': now}, 0.0),
+            ({'default': now, 'replica': None}, float('inf')),
+            ({'default': None, 'replica': None}, 0.0),
+        ]:
+            with self.subTest(beats=beats):
+                with mock.patch.object(replicas, 'connections', {'replica': connection}), \
+                        mock.patch.object(replicas, 'heartbeat_at', side_effect=beats.get):
+                    self.assertEqual(replicas.replica_lag('replica'), lag)
+
+    @override_settings(DATABASE_REPLICA_HEARTBEAT_INTERVAL=1)
+    def test_one_heartbeat_thread_per_process(self):
+        heartbeat = replicas.Heartbeat()
+        with mock.patch('threading.Thread') as thread:
+            for _ in range(2):
+                heartbeat.start()
+        self.assertEqual(thread.call_count, 1)
+
+    @override_settings(DATABASE_REPLICA_HEARTBEAT_INTERVAL=0)
+    def test_no_heartbeat_thread_when_disabled(self):
+        with mock.patch('threading.Thread') as thread:
+            replicas.Heartbeat().start()
+        thread.assert_not_called()
+
+
+@override_settings(
+    DATABASE_REPLICA_ALIASES=['replica'],
+    DATABASE_REPLICA_HEARTBEAT_INTERVAL=0,
+    DATABASE_REPLICA_CHECK_INTERVAL=60,
+    DATABASE_REPLICA_MAX_LAG=5,
+)
+class ReplicaRouterTests(SimpleTestCase):
+    """Which database the reads of a request go to"""
+
+    def setUp(self):
+        replicas.pin_cache().clear()
+        self.lag = mock.Mock(return_value=0.0)
+        for patcher in (
+            mock.patch.object(replicas, 'health', replicas.ReplicaHealth()),
+            mock.patch.object(replicas, 'replica_lag', self.lag),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.router = replicas.ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def read_alias(self, route):
+        token = replicas.current_route.set(route)
+        try:
+            return self.router.db_for_read(ReplicaHeartbeat)
+        finally:
+            replicas.current_route.reset(token)
+
+    def test_safe_requests_read_from_the_replica(self):
+        self.assertEqual(self.read_alias(replicas.Route(safe=True)), 'replica')
+
+    def test_read_replica_tells_whether_a_replica_was_read(self):
+        route = replicas.Route(safe=True)
+        token = replicas.current_route.set(route)
+        try:
+            self.assertFalse(replicas.read_replica())
+            self.router.db_for_read(ReplicaHeartbeat)
+            self.assertTrue(replicas.read_replica())
+        finally:
+            replicas.current_route.reset(token)
+        self.assertFalse(replicas.read_replica())
+
+    def test_other_reads_use_the_primary(self):
+        self.assertEqual(self.router.db_for_read(ReplicaHeartbeat), 'default')
+        self.assertEqual(self.read_alias(replicas.Route(safe=False)), 'default')
+        self.assertEqual(self.router.db_for_write(ReplicaHeartbeat), 'default')
+
+    def test_users_who_wrote_read_from_the_primary(self):
+        replicas.pin_users([1])
+        pinned, other = replicas.Route(safe=True), replicas.Route(safe=True)
+        pinned.user_id, other.user_id = 1, 2
+        self.assertEqual(self.read_alias(pinned), 'default')
+        self.assertEqual(self.read_alias(other), 'replica')
+
+    def test_read_from_primary(self):
+        route = replicas.Route(safe=True)
+        token = replicas.current_route.set(route)
+        try:
+            replicas.read_from_primary()
+            self.assertEqual(self.router.db_for_read(ReplicaHeartbeat), 'default')
+        finally:
+            replicas.current_route.reset(token)
+
+    def test_lagging_replica_is_skipped_until_its_next_check(self):
+        self.lag.return_value = 60.0
+        self.assertEqual(self.read_alias(replicas.Route(safe=True)), 'default')
+        self.lag.return_value = 0.0
+        self.assertEqual(self.read_alias(replicas.Route(safe=True)), 'default')
+        self.assertEqual(self.lag.call_count, 1)
+
+    def test_unavailable_replica_is_skipped(self):
+        self.lag.side_effect = DatabaseError
+        with self.assertLogs('apps.core.replicas', 'WARNING'):
+            self.assertEqual(self.read_alias(replicas.Route(safe=True)), 'default')
+
+    def test_failed_replica_read_is_served_again_from_the_primary(self):
+        aliases = []
+
+        def get_response(request):
+            aliases.append(self.router.db_for_read(ReplicaHeartbeat))
+            if aliases[-1] == 'replica':
+                middleware.process_exception(request, OperationalError('disk I/O error'))
+                return HttpResponse(status=500)
+            return HttpResponse()
+
+        middleware = replicas.ReplicaRoutingMiddleware(get_response)
+        with self.assertLogs('apps.core.replicas', 'WARNING'):
+            response = middleware(self.factory.get('/api/tasks/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(aliases, ['replica', 'default'])
+        self.assertFalse(replicas.health.usable('replica'))
+
+    def test_successful_writes_pin_their_user(self):
+        def get_response(request):
+            replicas.bind_user(7)
+            return HttpResponse(status=201)
+
+        replicas.ReplicaRoutingMiddleware(get_response)(self.factory.post('/api/tasks/'))
+        self.assertTrue(replicas.is_pinned(7))
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica', 'tasks'))
+        self.assertTrue(self.router.allow_migrate('default', 'tasks'))
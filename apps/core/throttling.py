@@ -0,0 +1,161 @@
+"""
+Token-Bucket Throttling
+
+DRF throttles whose rates (`DEFAULT_THROTTLE_RATES`, `N/period`) describe
+a bucket of `N` tokens refilled at `N` per period: a client may burst up
+to `N` requests, then proceeds at the average rate instead of waiting for
+a fixed window to reset.
+
+Buckets are kept as a "theoretical arrival time" (GCRA), a single number
+per bucket. `THROTTLE_STORE` selects where:
+
+- `local`: this process's memory; exact, but each process has its own
+  buckets.
+- `cache`: the cache `THROTTLE_CACHE_ALIAS` (Redis, Memcached), shared by
+  all processes and updated only through atomic increments.
+"""
+
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class LocalBucketStore:
+    """Buckets in process memory, guarded by a lock"""
+
+    max_size = 100000
+
+    def __init__(self):
+        self.arrivals = {}
+        self.lock = threading.Lock()
+
+    def consume(self, key, interval, capacity, now):
+        """
+        Take a token from bucket `key`, holding `capacity` tokens refilled
+        every `interval` seconds. Returns 0 on success, else the seconds
+        until a token is available.
+        """
+        with self.lock:
+            arrival = max(self.arrivals.get(key, now), now) + interval
+            excess = arrival - now - capacity * interval
+            if excess > 0:
+                return excess
+            if len(self.arrivals) >= self.max_size:
+                self.prune(now)
+            self.arrivals[key] = arrival
+            return 0
+
+    def prune(self, now):
+        """Drop full buckets, which are the same as absent ones"""
+        self.arrivals = {key: arrival for key, arrival in self.arrivals.items() if arrival > now}
+        if len(self.arrivals) >= self.max_size:
+            self.arrivals.clear()
+
+
+class CacheBucketStore:
+    """
+    Buckets in a shared cache, as integer microseconds moved by `incr`
+
+    A request adds one interval to the arrival time and gives it back with
+    `decr` if that overfills the bucket. Only a bucket that has refilled
+    completely is reset with a plain `set`; increments racing that reset
+    are lost, so requests arriving at the same instant on an idle bucket
+    may get a token for free.
+    """
+
+    # Keys outlive their buckets; an expired key is a full bucket.
+    ttl = 24 * 60 * 60
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def consume(self, key, interval, capacity, now):
+        """Same as `LocalBucketStore.consume`"""
+        now = int(now * 1_000_000)
+        step = max(int(interval * 1_000_000), 1)
+        ttl = max(self.ttl, int(capacity * interval) + 1)
+        try:
+            arrival = self.cache.incr(key, step)
+        except ValueError:
+            if self.cache.add(key, now + step, ttl):
+                arrival = now + step
+            else:
+                arrival = self.cache.incr(key, step)
+
+        if arrival - step < now:
+            arrival = now + step
+            self.cache.set(key, arrival, ttl)
+
+        excess = arrival - now - capacity * step
+        if excess > 0:
+            self.cache.decr(key, step)
+            return excess / 1_000_000
+        return 0
+
+
+_local_store = LocalBucketStore()
+
+
+def get_bucket_store():
+    """Return the store selected by `THROTTLE_STORE`"""
+    if settings.THROTTLE_STORE == 'local':
+        return _local_store
+    if settings.THROTTLE_STORE == 'cache':
+        return CacheBucketStore(caches[settings.THROTTLE_CACHE_ALIAS])
+    raise ImproperlyConfigured(f'Unknown THROTTLE_STORE "{settings.THROTTLE_STORE}".')
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    `SimpleRateThrottle` with a token bucket instead of a request history
+    """
+
+    def get_rate(self):
+        # Read at request time, so overridden settings apply.
+        if not getattr(self, 'scope', None):
+            raise ImproperlyConfigured(f"You must set either `.scope` or `.rate` for '{type(self).__name__}' throttle")
+        try:
+            return api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        except KeyError:
+            raise ImproperlyConfigured(f"No default throttle rate set for '{self.scope}' scope")
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.wait_time = get_bucket_store().consume(
+            self.key,
+            self.duration / self.num_requests,
+            self.num_requests,
+            self.timer(),
+        )
+        return self.wait_time <= 0
+
+    def wait(self):
+        return self.wait_time
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """One bucket per client IP"""
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """One bucket per user, or per client IP for anonymous requests"""
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
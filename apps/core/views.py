@@ -0,0 +1,109 @@
+"""
+Core Views
+"""
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_safe
+from rest_framework import exceptions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from apps.authentication.authentication import ClaimsJWTAuthentication
+from apps.authentication.permissions import IsAdminUser
+
+from . import metrics
+from .instrumentation import registry
+from .openapi import get_schema_artifact, get_ui_artifact
+
+
+def artifact_view(get_artifact):
+    """
+    Build a view serving `get_artifact()` with its ETag, answering
+    `If-None-Match` with 304 and letting shared caches keep it for
+    `OPENAPI_CACHE_MAX_AGE` seconds
+    """
+    @require_safe
+    @condition(etag_func=lambda request: get_artifact().etag)
+    def view(request):
+        artifact = get_artifact()
+        response = HttpResponse(artifact.body, content_type=artifact.content_type)
+        patch_cache_control(response, public=True, max_age=settings.OPENAPI_CACHE_MAX_AGE)
+        return response
+    return view
+
+
+openapi_schema = artifact_view(get_schema_artifact)
+swagger_ui = artifact_view(lambda: get_ui_artifact('swagger'))
+redoc_ui = artifact_view(lambda: get_ui_artifact('redoc'))
+
+
+def metrics_access_status(request):
+    """
+    Return None if `request` may read /metrics, else the status refusing it
+
+    Scrapers send `Authorization: Bearer <METRICS_AUTH_TOKEN>`; admins may
+    use their access token instead.
+    """
+    if settings.METRICS_PUBLIC:
+        return None
+    token = settings.METRICS_AUTH_TOKEN
+    if token and constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        return None
+    try:
+        authenticated = ClaimsJWTAuthentication().authenticate(request)
+    except exceptions.AuthenticationFailed:
+        authenticated = None
+    if authenticated is None:
+        return status.HTTP_401_UNAUTHORIZED
+    if not authenticated[0].is_admin:
+        return status.HTTP_403_FORBIDDEN
+    return None
+
+
+@require_safe
+def prometheus_metrics(request):
+    """
+    Prometheus text exposition of `apps.core.metrics`, for scrapers holding
+    `METRICS_AUTH_TOKEN` and admins, or anyone with `METRICS_PUBLIC`
+    """
+    if not settings.METRICS:
+        raise Http404
+    refused = metrics_access_status(request)
+    if refused is not None:
+        response = HttpResponse(status=refused)
+        if refused == status.HTTP_401_UNAUTHORIZED:
+            response['WWW-Authenticate'] = 'Bearer realm="metrics"'
+        return response
+    return HttpResponse(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+
+class RequestMetricsView(APIView):
+    """
+    Request Metrics Endpoint (admins only)
+    
+    GET: Per-route histograms of request duration, database time, query
+    count and serializer time, collected by this process since its start
+    or the last reset
+    DELETE: Reset them
+    """
+    
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        return Response(
+            {
+                'message': 'Request metrics retrieved successfully',
+                'data': registry.snapshot()
+            },
+            status=status.HTTP_200_OK
+        )
+    
+    def delete(self, request):
+        registry.reset()
+        return Response(
+            {'message': 'Request metrics reset'},
+            status=status.HTTP_200_OK
+        )
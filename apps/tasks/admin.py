@@ -3,8 +3,11 @@ Django Admin Configuration for Task Model
 """
 
 from django.contrib import admin
+from django.db import transaction
 from django.utils.html import format_html
-from .models import Task
+from .counters import set_completed
+from .models import Task, TaskCounters, TaskImportJob, TaskTombstone
+from .signals import tasks_changed
 
 
 @admin.register(Task)
@@ -102,9 +105,18 @@ class TaskAdmin(admin.ModelAdmin):
     
     actions = ['mark_as_completed', 'mark_as_pending']
     
+    def set_completed(self, queryset, completed):
+        """Set `completed` on the selected tasks and invalidate their owners"""
+        with transaction.atomic():
+            # The owners of the rows locked here, not of an earlier read
+            user_ids = set(queryset.select_for_update().order_by().values_list('user_id', flat=True))
+            updated = set_completed(queryset, completed)
+        tasks_changed.send(sender=Task, user_ids=user_ids)
+        return updated
+    
     def mark_as_completed(self, request, queryset):
         """Admin action to mark tasks as completed"""
-        updated = queryset.update(completed=True)
+        updated = self.set_completed(queryset, True)
         self.message_user(
             request,
             f'{updated} task(s) marked as completed.'
@@ -113,9 +125,72 @@ class TaskAdmin(admin.ModelAdmin):
     
     def mark_as_pending(self, request, queryset):
         """Admin action to mark tasks as pending"""
-        updated = queryset.update(completed=False)
+        updated = self.set_completed(queryset, False)
         self.message_user(
             request,
             f'{updated} task(s) marked as pending.'
         )
-    mark_as_pending.short_description = 'Mark selected tasks as pending'
\ No newline at end of file
+    mark_as_pending.short_description = 'Mark selected tasks as pending'
+
+
+@admin.register(TaskCounters)
+class TaskCountersAdmin(admin.ModelAdmin):
+    """Read-only view of the denormalized task counters"""
+    
+    list_display = [
+        'user',
+        'total',
+        'completed',
+        'overdue_eligible',
+        'low',
+        'medium',
+        'high',
+        'updated_at',
+    ]
+    search_fields = ['user__email', 'user__username']
+    list_select_related = ['user']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TaskTombstone)
+class TaskTombstoneAdmin(admin.ModelAdmin):
+    """Read-only view of deleted tasks kept for delta sync"""
+    
+    list_display = ['task_id', 'user', 'deleted_at']
+    search_fields = ['user__email', 'user__username']
+    list_select_related = ['user']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TaskImportJob)
+class TaskImportJobAdmin(admin.ModelAdmin):
+    """Progress of task imports"""
+    
+    list_display = [
+        'id',
+        'user',
+        'format',
+        'status',
+        'rows_processed',
+        'tasks_created',
+        'rows_failed',
+        'created_at',
+        'finished_at',
+    ]
+    list_filter = ['status', 'format']
+    search_fields = ['user__email', 'source']
+    list_select_related = ['user']
+    readonly_fields = [field.name for field in TaskImportJob._meta.fields]
+    
+    def has_add_permission(self, request):
+        return False
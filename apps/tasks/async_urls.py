@@ -0,0 +1,20 @@
+"""
+Async Task URL Configuration
+"""
+
+from django.urls import path
+from .async_views import (
+    AsyncTaskListView,
+    AsyncTaskDetailView,
+    AsyncTaskStatusToggleView,
+    AsyncTaskStatsView,
+)
+
+app_name = 'tasks_async'
+
+urlpatterns = [
+    path('', AsyncTaskListView.as_view(), name='task_list'),
+    path('<int:id>/', AsyncTaskDetailView.as_view(), name='task_detail'),
+    path('<int:id>/toggle/', AsyncTaskStatusToggleView.as_view(), name='task_toggle'),
+    path('stats/', AsyncTaskStatsView.as_view(), name='task_stats'),
+]
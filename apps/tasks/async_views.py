@@ -0,0 +1,278 @@
+"""
+Async Task Views
+
+ASGI-native counterparts of the task list, detail, toggle and stats
+endpoints, mounted under `/api/async/tasks/`. They are plain Django async
+views, since DRF views always run synchronously. Reads use the async ORM
+(`acount`, `aget`, async iteration) and the compiled row serializers, so
+under ASGI a request only leaves the event loop for the database calls.
+Responses match the synchronous endpoints, ETags and `304 Not Modified`
+included.
+"""
+
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponseNotModified, JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import exceptions, status
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from apps.authentication.authentication import ClaimsJWTAuthentication
+from apps.core.instrumentation import timed
+from apps.core.metrics import count_cache_lookup
+from apps.core.replicas import read_replica
+
+from .caching import (
+    ALL_USERS,
+    RESPONSE_KEY,
+    aget_task_version,
+    get_task_cache,
+    is_not_modified,
+    set_cache_headers,
+    task_etag,
+)
+from .filters import TaskFilter
+from .models import Task
+from .pagination import TaskKeysetPagination
+from .row_serializers import TaskListRowSerializer, TaskRowSerializer
+from .search import TaskSearchFilter, get_search_backend
+from .serializers import TaskSerializer, TaskStatsSerializer
+from .stats import aget_task_stats
+from .throttling import TaskWriteThrottle
+from .write_queue import arun_write
+
+
+class AsyncTaskView(View):
+    """
+    Base async view: JWT authentication, task scoping and DRF-style errors
+    """
+
+    authentication = ClaimsJWTAuthentication()
+    throttle_classes = []
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Credentials travel in the Authorization header, never in cookies,
+        # so there is no CSRF to check; same as DRF's `APIView.as_view`.
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        handler = getattr(self, request.method.lower(), None)
+        if handler is None:
+            return await self.http_method_not_allowed(request, *args, **kwargs)
+        try:
+            result = await self.authentication.aauthenticate(request)
+            if result is None:
+                raise exceptions.NotAuthenticated()
+            request.user, request.auth = result
+            # DRF request wrapper for the shared filter and pagination classes
+            self.drf_request = Request(request)
+            self.drf_request.user = request.user
+            await self.check_throttles()
+            return await handler(request, *args, **kwargs)
+        except Http404:
+            return self.error_response(exceptions.NotFound())
+        except exceptions.APIException as exc:
+            return self.error_response(exc)
+
+    async def check_throttles(self):
+        """`APIView.check_throttles`; the bucket store may be a network cache"""
+        waits = []
+        for throttle_class in self.throttle_classes:
+            throttle = throttle_class()
+            if not await sync_to_async(throttle.allow_request)(self.drf_request, self):
+                waits.append(throttle.wait())
+        if waits:
+            raise exceptions.Throttled(max(waits))
+
+    def error_response(self, exc):
+        """Render `exc` the way DRF's default exception handler does"""
+        if isinstance(exc.detail, (list, dict)):
+            data = exc.detail
+        else:
+            data = {'detail': exc.detail}
+        response = JsonResponse(data, status=exc.status_code, safe=False)
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            response['WWW-Authenticate'] = self.authentication.authenticate_header(self.request)
+            response.status_code = status.HTTP_401_UNAUTHORIZED
+        if getattr(exc, 'wait', None):
+            response['Retry-After'] = '%d' % exc.wait
+        return response
+
+    def get_queryset(self):
+        """
+        Return tasks for current user only
+        Admins can access all tasks
+        """
+        user = self.request.user
+        if user.is_admin:
+            return Task.objects.all()
+        return Task.objects.filter(user_id=user.id)
+
+    async def conditional_response(self, render):
+        """
+        Async version of `ConditionalTaskResponseMixin.conditional_response`
+        """
+        user = self.request.user
+        scope = ALL_USERS if user.is_admin else user.pk
+        etag = task_etag(scope, self.request, version=await aget_task_version(scope))
+
+        if is_not_modified(self.request, etag):
+            return set_cache_headers(HttpResponseNotModified(), etag)
+
+        cache = get_task_cache()
+        timeout = settings.TASK_RESPONSE_CACHE_TIMEOUT
+        data = count_cache_lookup('task_response', await cache.aget(RESPONSE_KEY.format(etag))) if timeout else None
+        if data is None:
+            data = await render()
+            if read_replica():
+                return set_cache_headers(JsonResponse(data, safe=False), None)
+            if timeout:
+                await cache.aset(RESPONSE_KEY.format(etag), data, timeout)
+        return set_cache_headers(JsonResponse(data, safe=False), etag)
+
+
+class AsyncTaskListView(AsyncTaskView):
+    """
+    Async Task List Endpoint
+
+    GET: Same filters, search, ordering and pagination as `GET /api/tasks/`
+    """
+
+    filter_backends = [DjangoFilterBackend, OrderingFilter, TaskSearchFilter]
+    filterset_class = TaskFilter
+    search_fields = ['title', 'description']
+    ordering_fields = ['created_at', 'updated_at', 'due_date', 'priority']
+    ordering = ['-created_at']
+
+    async def get(self, request):
+        return await self.conditional_response(self.render_list)
+
+    async def render_list(self):
+        request = self.drf_request
+        queryset = self.get_queryset()
+        if request.query_params.get(TaskSearchFilter.search_param):
+            # Backend detection may query the database; it is cached after.
+            await sync_to_async(get_search_backend)(queryset.db)
+        for backend in self.filter_backends:
+            queryset = backend().filter_queryset(request, queryset, self)
+
+        serializer = TaskListRowSerializer()
+        queryset = serializer.setup_queryset(queryset)
+
+        if request.query_params.get('pagination') == 'cursor':
+            # Keyset pages are a single indexed query; run it in a thread.
+            paginator = TaskKeysetPagination()
+            page = await sync_to_async(paginator.paginate_queryset)(queryset, request, view=self)
+            with timed('serialize'):
+                return paginator.get_paginated_response(serializer.many(page)).data
+        return await self.paginate(queryset, serializer)
+
+    async def paginate(self, queryset, serializer):
+        """`PageNumberPagination` with an async count and page fetch"""
+        request = self.drf_request
+        paginator = PageNumberPagination()
+        page_size = paginator.get_page_size(request)
+        count = await queryset.acount()
+        num_pages = max(1, -(-count // page_size))
+
+        page_number = request.query_params.get(paginator.page_query_param) or 1
+        if page_number in paginator.last_page_strings:
+            page_number = num_pages
+        try:
+            page_number = int(page_number)
+        except (TypeError, ValueError):
+            page_number = 0
+        if not 1 <= page_number <= num_pages:
+            raise exceptions.NotFound(paginator.invalid_page_message.format(
+                page_number=page_number, message='That page contains no results'
+            ))
+
+        offset = (page_number - 1) * page_size
+        rows = [row async for row in queryset[offset:offset + page_size]]
+
+        url = request.build_absolute_uri()
+        next_url = previous_url = None
+        if page_number < num_pages:
+            next_url = replace_query_param(url, paginator.page_query_param, page_number + 1)
+        if page_number > 1:
+            previous_url = (
+                remove_query_param(url, paginator.page_query_param) if page_number == 2
+                else replace_query_param(url, paginator.page_query_param, page_number - 1)
+            )
+        with timed('serialize'):
+            results = serializer.many(rows)
+        return OrderedDict([
+            ('count', count),
+            ('next', next_url),
+            ('previous', previous_url),
+            ('results', results),
+        ])
+
+
+class AsyncTaskDetailView(AsyncTaskView):
+    """
+    Async Task Detail Endpoint
+
+    GET: Same as `GET /api/tasks/<id>/`
+    """
+
+    async def get(self, request, id):
+        async def render():
+            serializer = TaskRowSerializer()
+            try:
+                row = await serializer.setup_queryset(self.get_queryset()).aget(id=id)
+            except Task.DoesNotExist:
+                raise Http404
+            with timed('serialize'):
+                return serializer.to_representation(row)
+        return await self.conditional_response(render)
+
+
+class AsyncTaskStatusToggleView(AsyncTaskView):
+    """
+    Async Toggle Task Completion Status
+
+    POST: Same as `POST /api/tasks/<id>/toggle/`
+    """
+
+    throttle_classes = [TaskWriteThrottle]
+
+    async def post(self, request, id):
+        queryset = TaskSerializer.setup_queryset(self.get_queryset())
+        try:
+            task = await queryset.aget(id=id)
+        except Task.DoesNotExist:
+            raise Http404
+
+        def toggle():
+            task.completed = not task.completed
+            task.save()
+        await arun_write(toggle)
+
+        return JsonResponse({
+            'message': f'Task marked as {"completed" if task.completed else "incomplete"}',
+            'data': TaskSerializer(task).data,
+        })
+
+
+class AsyncTaskStatsView(AsyncTaskView):
+    """
+    Async Task Statistics Endpoint
+
+    GET: Same as `GET /api/tasks/stats/`
+    """
+
+    async def get(self, request):
+        stats = await aget_task_stats(request.user)
+        return JsonResponse({
+            'message': 'Task statistics retrieved successfully',
+            'data': TaskStatsSerializer(stats).data,
+        })
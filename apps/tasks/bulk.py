@@ -0,0 +1,146 @@
+"""
+Bulk Task Operations
+
+Validates a whole batch with one serializer instance and writes it with a
+single `bulk_create`, `bulk_update` or filtered delete inside one transaction.
+Each item gets its own result; invalid items never block valid ones.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .counters import apply_counter_deltas, merge_deltas, state_deltas
+from .models import Task, TaskTombstone
+from .signals import bulk_task_write, tasks_changed
+
+
+BULK_BATCH_SIZE = 500
+
+
+def validate_items(serializer_class, items, context=None, partial=False):
+    """
+    Run `serializer_class` validation over every item of `items`
+
+    Returns `(valid, errors)` where `valid` is a list of
+    `(index, validated_data)` and `errors` maps item index to error detail.
+    """
+    child = serializer_class(context=context or {}, partial=partial)
+    valid, errors = [], {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors[index] = {'non_field_errors': ['Expected an object.']}
+            continue
+        try:
+            valid.append((index, child.run_validation(item)))
+        except serializers.ValidationError as exc:
+            errors[index] = exc.detail
+    return valid, errors
+
+
+def error_results(errors):
+    """Return per-item results for validation `errors`"""
+    return [
+        {'index': index, 'status': 'error', 'errors': detail}
+        for index, detail in errors.items()
+    ]
+
+
+def create_tasks(tasks):
+    """
+    Insert unsaved `tasks` with one `bulk_create` and record them in the
+    counters. Must run inside a transaction; returns the affected user ids.
+    """
+    Task.objects.bulk_create(tasks, batch_size=BULK_BATCH_SIZE)
+    deltas = defaultdict(lambda: defaultdict(int))
+    for task in tasks:
+        merge_deltas(deltas, state_deltas(None, task.counter_state()))
+    apply_counter_deltas(deltas)
+    return set(deltas)
+
+
+def bulk_create_tasks(user, valid):
+    """
+    Create a task owned by `user` for every `(index, validated_data)` item
+    """
+    tasks = [Task(user_id=user.pk, **data) for _, data in valid]
+
+    with transaction.atomic(), bulk_task_write():
+        user_ids = create_tasks(tasks)
+
+    if user_ids:
+        tasks_changed.send(sender=Task, user_ids=user_ids)
+    return [
+        {'index': index, 'status': 'created', 'id': task.pk}
+        for (index, _), task in zip(valid, tasks)
+    ]
+
+
+def bulk_update_tasks(queryset, valid):
+    """
+    Apply every `(index, validated_data)` item, which must carry the task
+    `id`, to the matching task in `queryset`
+    """
+    results = []
+    with transaction.atomic(), bulk_task_write():
+        # Locked, so deltas start from the rows as they are now.
+        tasks = queryset.select_for_update().in_bulk([data['id'] for _, data in valid])
+        now = timezone.now()
+        changed, fields = [], {'updated_at'}
+        deltas = defaultdict(lambda: defaultdict(int))
+
+        for index, data in valid:
+            task = tasks.get(data.pop('id'))
+            if task is None:
+                results.append({'index': index, 'status': 'error', 'errors': {'id': ['Task not found.']}})
+                continue
+            old_state = task.counter_state()
+            for field, value in data.items():
+                setattr(task, field, value)
+            task.updated_at = now
+            fields.update(data)
+            merge_deltas(deltas, state_deltas(old_state, task.counter_state()))
+            changed.append(task)
+            results.append({'index': index, 'status': 'updated', 'id': task.pk})
+
+        Task.objects.bulk_update(changed, sorted(fields), batch_size=BULK_BATCH_SIZE)
+        apply_counter_deltas(deltas)
+
+    if changed:
+        tasks_changed.send(sender=Task, user_ids={task.user_id for task in changed})
+    return results
+
+
+def bulk_delete_tasks(queryset, ids):
+    """
+    Delete the tasks of `queryset` whose id is in `ids` with one filtered
+    delete
+    """
+    with transaction.atomic(), bulk_task_write():
+        rows = queryset.filter(id__in=ids).select_for_update().values_list(
+            'id', 'user_id', 'completed', 'priority', 'due_date'
+        )
+        deltas = defaultdict(lambda: defaultdict(int))
+        found, user_ids, owners = set(), set(), {}
+        for pk, user_id, completed, priority, due_date in rows:
+            found.add(pk)
+            user_ids.add(user_id)
+            owners[pk] = user_id
+            merge_deltas(deltas, state_deltas((user_id, completed, priority, due_date is not None), None))
+
+        Task.objects.filter(id__in=found).delete()
+        apply_counter_deltas(deltas)
+        TaskTombstone.objects.bulk_create(
+            [TaskTombstone(task_id=pk, user_id=owners[pk]) for pk in found],
+            batch_size=BULK_BATCH_SIZE,
+        )
+
+    if user_ids:
+        tasks_changed.send(sender=Task, user_ids=user_ids)
+    return [
+        {'index': index, 'status': 'deleted', 'id': pk} if pk in found else
+        {'index': index, 'status': 'error', 'errors': {'id': ['Task not found.']}}
+        for index, pk in enumerate(ids)
+    ]
@@ -0,0 +1,149 @@
+"""
+Task Response Caching
+
+Task read responses are versioned per user. Every task write bumps the
+version of the owner and of the admin-wide scope once the transaction
+commits (see `signals`). A response's ETag hashes the scope's version,
+the request URI, the negotiated media type and the current time bucket,
+so answering `If-None-Match` needs one cache read and no task query.
+The time bucket bounds how long clock-dependent fields (`status`,
+`is_overdue`) can be served stale.
+
+Rendered response data is cached under its ETag as well, so repeated
+unconditional requests skip the database too. A response read from a
+replica may predate the version it was rendered under, so it gets
+neither: it would otherwise be served, and confirmed by 304s, until the
+next write.
+"""
+
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from apps.core.metrics import count_cache_lookup
+from apps.core.replicas import read_replica
+
+
+VERSION_KEY = 'tasks:version:{}'
+RESPONSE_KEY = 'tasks:response:{}'
+ALL_USERS = 'all'
+
+
+def get_task_cache():
+    """Return the cache configured by `TASK_CACHE_ALIAS`"""
+    return caches[settings.TASK_CACHE_ALIAS]
+
+
+def get_task_version(scope):
+    """
+    Return the current version stamp of `scope` (a user id or `ALL_USERS`)
+
+    Stamps are random, so a stamp lost to eviction is replaced by a new one
+    instead of restarting a sequence that old ETags may still carry.
+    """
+    cache = get_task_cache()
+    key = VERSION_KEY.format(scope)
+    version = count_cache_lookup('task_version', cache.get(key))
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+async def aget_task_version(scope):
+    """Async version of `get_task_version`"""
+    cache = get_task_cache()
+    key = VERSION_KEY.format(scope)
+    version = count_cache_lookup('task_version', await cache.aget(key))
+    if version is None:
+        version = uuid.uuid4().hex
+        if not await cache.aadd(key, version, None):
+            version = await cache.aget(key, version)
+    return version
+
+
+def bump_task_versions(user_ids):
+    """Give `user_ids` and the admin-wide scope new version stamps"""
+    scopes = [*user_ids, ALL_USERS]
+    get_task_cache().set_many(
+        {VERSION_KEY.format(scope): uuid.uuid4().hex for scope in scopes},
+        None,
+    )
+
+
+def task_etag(scope, request, version=None):
+    """
+    Return the quoted ETag of `request` for `scope` at `version`, by
+    default its current version
+    """
+    bucket_seconds = settings.TASK_ETAG_BUCKET_SECONDS
+    bucket = int(time.time() // bucket_seconds) if bucket_seconds > 0 else 0
+    parts = [
+        str(scope),
+        version or get_task_version(scope),
+        str(bucket),
+        getattr(request, 'accepted_media_type', '') or '',
+        request.build_absolute_uri(),
+    ]
+    return quote_etag(hashlib.sha1('\n'.join(parts).encode()).hexdigest())
+
+
+def is_not_modified(request, etag):
+    """Whether the request's `If-None-Match` covers `etag`"""
+    if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    return etag in if_none_match or '*' in if_none_match
+
+
+def set_cache_headers(response, etag):
+    """Mark `response` revalidated on every use; tag it when `etag` is given"""
+    if etag is not None:
+        response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Accept', 'Authorization'])
+    return response
+
+
+class ConditionalTaskResponseMixin:
+    """
+    Serve task reads with ETags, `304 Not Modified` and a response cache
+    """
+
+    def get_cache_scope(self):
+        """Admins read every task; everyone else only their own"""
+        user = self.request.user
+        return ALL_USERS if user.is_admin else user.pk
+
+    def conditional_response(self, render):
+        """
+        Answer the current request from its ETag or the response cache,
+        calling `render()` only when neither applies
+        """
+        request = self.request
+        etag = task_etag(self.get_cache_scope(), request)
+
+        if is_not_modified(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            cache = get_task_cache()
+            timeout = settings.TASK_RESPONSE_CACHE_TIMEOUT
+            data = count_cache_lookup('task_response', cache.get(RESPONSE_KEY.format(etag))) if timeout else None
+            if data is not None:
+                response = Response(data)
+            else:
+                response = render()
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                if read_replica():
+                    return set_cache_headers(response, None)
+                if timeout:
+                    cache.set(RESPONSE_KEY.format(etag), response.data, timeout)
+
+        return set_cache_headers(response, etag)
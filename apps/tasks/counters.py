@@ -0,0 +1,171 @@
+"""
+Task Counters Maintenance
+
+Keeps `TaskCounters` in step with the task table. Every write path that
+bypasses `Task.save` (bulk updates, queryset deletes) has to go through the
+helpers below.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Task, TaskCounters
+
+
+# Ids per `UPDATE ... WHERE id IN (...)`, within SQLite's parameter limit
+UPDATE_BATCH_SIZE = 500
+
+
+def state_counts(state):
+    """Return the counter contributions of a single task state"""
+    user_id, completed, priority, has_due_date = state
+    counts = {'total': 1, priority.lower(): 1}
+    if completed:
+        counts['completed'] = 1
+    elif has_due_date:
+        counts['overdue_eligible'] = 1
+    return counts
+
+
+def state_deltas(old_state, new_state):
+    """
+    Return `{user_id: {field: delta}}` for a task moving from `old_state`
+    to `new_state` (either may be None for creates and deletes)
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    if old_state is not None:
+        for field, value in state_counts(old_state).items():
+            deltas[old_state[0]][field] -= value
+    if new_state is not None:
+        for field, value in state_counts(new_state).items():
+            deltas[new_state[0]][field] += value
+    return deltas
+
+
+def merge_deltas(target, deltas):
+    """Add `deltas` into `target`, both keyed by user id"""
+    for user_id, fields in deltas.items():
+        for field, value in fields.items():
+            target[user_id][field] += value
+    return target
+
+
+def apply_counter_deltas(deltas):
+    """
+    Apply `{user_id: {field: delta}}` to `TaskCounters`
+
+    Users without a counters row yet get one rebuilt from the task table,
+    which already reflects the write being recorded.
+    """
+    missing = []
+    for user_id, fields in deltas.items():
+        changes = {field: F(field) + value for field, value in fields.items() if value}
+        if not changes:
+            continue
+        if not TaskCounters.objects.filter(user_id=user_id).update(**changes):
+            missing.append(user_id)
+    if missing:
+        rebuild_counters(missing)
+
+
+def aggregate_counters(queryset):
+    """Return `{user_id: {field: count}}` computed from a task queryset"""
+    # Annotations are prefixed so they cannot shadow the task's own fields.
+    rows = queryset.order_by().values('user_id').annotate(
+        n_total=Count('id'),
+        n_completed=Count('id', filter=Q(completed=True)),
+        n_overdue_eligible=Count('id', filter=Q(completed=False, due_date__isnull=False)),
+        n_low=Count('id', filter=Q(priority='LOW')),
+        n_medium=Count('id', filter=Q(priority='MEDIUM')),
+        n_high=Count('id', filter=Q(priority='HIGH')),
+    )
+    return {
+        row['user_id']: {field: row[f'n_{field}'] for field in TaskCounters.COUNT_FIELDS}
+        for row in rows
+    }
+
+
+def rebuild_counters(user_ids=None):
+    """
+    Recompute counters from the task table for `user_ids` (all users when
+    None) and upsert them. Returns the number of rows written.
+    """
+    queryset = Task.objects.all()
+    if user_ids is not None:
+        queryset = queryset.filter(user_id__in=user_ids)
+    counts = aggregate_counters(queryset)
+
+    if user_ids is not None:
+        # Users whose last task is gone still need zeroed counters.
+        for user_id in user_ids:
+            counts.setdefault(user_id, dict.fromkeys(TaskCounters.COUNT_FIELDS, 0))
+
+    rows = [TaskCounters(user_id=user_id, **fields) for user_id, fields in counts.items()]
+    with transaction.atomic():
+        if user_ids is None:
+            TaskCounters.objects.exclude(user_id__in=counts.keys()).delete()
+        TaskCounters.objects.bulk_create(
+            rows,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=TaskCounters.COUNT_FIELDS + ['updated_at'],
+        )
+    return len(rows)
+
+
+def verify_counters():
+    """
+    Compare stored counters with the task table
+
+    Returns `{user_id: (stored, actual)}` for every user that differs.
+    """
+    actual = aggregate_counters(Task.objects.all())
+    stored = {
+        row.pop('user_id'): row
+        for row in TaskCounters.objects.values('user_id', *TaskCounters.COUNT_FIELDS)
+    }
+    empty = dict.fromkeys(TaskCounters.COUNT_FIELDS, 0)
+    mismatches = {}
+    for user_id in actual.keys() | stored.keys():
+        stored_counts = stored.get(user_id, empty)
+        actual_counts = actual.get(user_id, empty)
+        if stored_counts != actual_counts:
+            mismatches[user_id] = (stored_counts, actual_counts)
+    return mismatches
+
+
+def set_completed(queryset, completed):
+    """
+    Set `completed` on every task in `queryset` and record the change in
+    the counters. Returns the number of tasks that changed.
+
+    The tasks to flip are locked before their deltas are counted, and only
+    they are updated, so a concurrent write of the same tasks cannot have
+    its flip counted twice.
+    """
+    sign = 1 if completed else -1
+    with transaction.atomic():
+        flipping = list(
+            queryset.filter(completed=not completed).select_for_update()
+            .order_by().values_list('id', 'user_id', 'due_date')
+        )
+        deltas = defaultdict(lambda: defaultdict(int))
+        for _, user_id, due_date in flipping:
+            deltas[user_id]['completed'] += sign
+            if due_date is not None:
+                deltas[user_id]['overdue_eligible'] -= sign
+
+        ids = [pk for pk, _, _ in flipping]
+        now = timezone.now()
+        for start in range(0, len(ids), UPDATE_BATCH_SIZE):
+            # Delta sync finds changes by `updated_at`, which `update()` leaves alone.
+            Task.objects.filter(id__in=ids[start:start + UPDATE_BATCH_SIZE]).update(
+                completed=completed,
+                updated_at=now,
+            )
+        apply_counter_deltas(deltas)
+    return len(ids)
@@ -0,0 +1,67 @@
+"""
+Task Export
+
+Streams tasks as NDJSON or CSV. Rows are read with `iterator()` in chunks
+and encoded as they go, so memory use does not depend on the row count.
+"""
+
+import csv
+import json
+
+from django.conf import settings
+
+from .row_serializers import TaskExportRowSerializer
+
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+class _LineBuffer:
+    """File-like object handing back whatever `csv.writer` writes"""
+
+    def write(self, value):
+        return value
+
+
+def csv_value(value):
+    """Render booleans the way the JSON output and list filters spell them"""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return value
+
+
+def iter_export(queryset, export_format, chunk_size=None):
+    """
+    Yield the tasks of `queryset` encoded as `export_format`, one chunk of
+    rows per item
+    """
+    chunk_size = chunk_size or settings.TASK_EXPORT_CHUNK_SIZE
+    serializer = TaskExportRowSerializer()
+    rows = serializer.setup_queryset(queryset.order_by('id')).iterator(chunk_size=chunk_size)
+
+    if export_format == 'ndjson':
+        encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        
+        def encode(item):
+            return encoder.encode(item) + '\n'
+    elif export_format == 'csv':
+        writer = csv.writer(_LineBuffer())
+        columns = serializer.columns
+        yield writer.writerow(columns)
+        
+        def encode(item):
+            return writer.writerow([csv_value(item[column]) for column in columns])
+    else:
+        raise ValueError(f'Unknown export format: {export_format}')
+
+    lines = []
+    for row in rows:
+        lines.append(encode(serializer.to_representation(row)))
+        if len(lines) >= chunk_size:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
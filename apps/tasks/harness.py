@@ -0,0 +1,161 @@
+"""
+Task API Harness
+
+Helpers shared by the benchmark commands that exercise the API in
+process: a throwaway test database, fixture data, a bulk data generator,
+authenticated API clients and a switch turning throttling off.
+"""
+
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+
+from .bulk import create_tasks
+from .models import Task
+from .signals import bulk_task_write
+
+
+FIXTURE_PASSWORD = 'Harness-Passw0rd!'
+
+# Words of generated titles and descriptions, so searches have matches
+WORDS = [
+    'report', 'invoice', 'meeting', 'review', 'deploy', 'budget', 'release', 'client',
+    'design', 'backup', 'migration', 'planning', 'interview', 'roadmap', 'audit', 'training',
+]
+
+User = get_user_model()
+
+
+@contextmanager
+def test_database(keepdb=False, name=None):
+    """
+    Run the block against a freshly migrated test database, destroyed on
+    exit, exactly as the Django test runner would
+
+    `name` overrides the test database name, e.g. a file path to run on
+    disk instead of SQLite's in-memory test database.
+    """
+    test_settings = connection.settings_dict['TEST']
+    old_test_name = test_settings['NAME']
+    if name is not None:
+        test_settings['NAME'] = name
+    setup_test_environment()
+    # Replicas are not mirrored onto the test database; read the primary.
+    replicas_off = override_settings(DATABASE_REPLICA_ALIASES=[])
+    replicas_off.enable()
+    try:
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+    finally:
+        replicas_off.disable()
+        teardown_test_environment()
+        test_settings['NAME'] = old_test_name
+
+
+def unthrottled():
+    """Settings override disabling every throttle scope, for load tests"""
+    rates = {scope: None for scope in api_settings.DEFAULT_THROTTLE_RATES}
+    return override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates})
+
+
+def create_fixture(users=2, tasks_per_user=30, admins=1, seed=0):
+    """
+    Create `users` regular users owning `tasks_per_user` tasks each, plus
+    `admins` admin users. Returns `(users, admins)`.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    regular = [
+        User.objects.create_user(
+            email=f'user{index}@example.com',
+            username=f'user{index}',
+            password=FIXTURE_PASSWORD,
+        )
+        for index in range(users)
+    ]
+    staff = [
+        User.objects.create_superuser(
+            email=f'admin{index}@example.com',
+            username=f'admin{index}',
+            password=FIXTURE_PASSWORD,
+        )
+        for index in range(admins)
+    ]
+
+    for user in regular:
+        for index in range(tasks_per_user):
+            Task.objects.create(
+                user=user,
+                title=f'Task {index} of {user.username}',
+                description=rng.choice(['', 'Follow up with the team', 'Review notes']),
+                completed=rng.random() < 0.4,
+                priority=rng.choice(['LOW', 'MEDIUM', 'MEDIUM', 'HIGH']),
+                due_date=now + timedelta(days=rng.randint(-10, 30)) if rng.random() < 0.7 else None,
+            )
+    return regular, staff
+
+
+def generate_dataset(users=100, tasks_per_user=100, seed=0):
+    """
+    Bulk-insert `users` users (`bench<N>@example.com`, password
+    `FIXTURE_PASSWORD`) owning `tasks_per_user` tasks each, and return the
+    users
+
+    The tasks follow a realistic mix: half are MEDIUM priority and a
+    quarter each LOW and HIGH; 40% are completed; 70% have a due date
+    between 30 days ago and 60 days ahead; creation dates spread over the
+    last 180 days. The same seed yields the same data.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    # One hash for everybody: hashing is deliberately slow.
+    password = make_password(FIXTURE_PASSWORD)
+    created = User.objects.bulk_create([
+        User(email=f'bench{index}@example.com', username=f'bench{index}', password=password)
+        for index in range(users)
+    ])
+
+    for user in User.objects.filter(email__in=[user.email for user in created]):
+        tasks = []
+        for index in range(tasks_per_user):
+            words = rng.sample(WORDS, 3)
+            tasks.append(Task(
+                user=user,
+                title=f'{words[0].capitalize()} {words[1]} #{index}',
+                description=rng.choice(['', f'Follow up on the {words[2]}', f'Notes on the {words[1]} {words[2]}']),
+                completed=rng.random() < 0.4,
+                priority=rng.choices(['LOW', 'MEDIUM', 'HIGH'], weights=[1, 2, 1])[0],
+                due_date=now + timedelta(hours=rng.randint(-30 * 24, 60 * 24)) if rng.random() < 0.7 else None,
+            ))
+        with transaction.atomic(), bulk_task_write():
+            create_tasks(tasks)
+            # `auto_now_add` stamped them all now; `bulk_update` leaves them as set.
+            for task in tasks:
+                task.created_at = task.updated_at = now - timedelta(seconds=rng.randint(0, 180 * 24 * 3600))
+            Task.objects.bulk_update(tasks, ['created_at', 'updated_at'], batch_size=500)
+    return list(User.objects.filter(email__in=[user.email for user in created]).order_by('pk'))
+
+
+def authenticated_client(user, password=FIXTURE_PASSWORD):
+    """Return an `APIClient` logged in as `user` through the login endpoint"""
+    client = APIClient()
+    response = client.post(
+        '/api/auth/login/',
+        {'email': user.email, 'password': password},
+        format='json',
+    )
+    assert response.status_code == 200, response.content
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['data']['access']}")
+    return client
@@ -0,0 +1,199 @@
+"""
+Streaming Task Import
+
+Reads NDJSON or CSV one row at a time and writes valid rows in batched
+`bulk_create` transactions. Rows are validated with `TaskCreateSerializer`,
+so titles and priorities follow the same rules as the API. The job's
+progress is committed with each batch, which makes every job resumable
+from the last committed batch. Files produced by the task export can be
+imported as they are; columns the serializer does not know are ignored.
+"""
+
+import csv
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .bulk import create_tasks, validate_items
+from .models import Task, TaskImportJob
+from .serializers import TaskCreateSerializer
+from .signals import bulk_task_write, tasks_changed
+
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+def infer_format(filename):
+    """Return the import format implied by `filename`, or None"""
+    name = filename.lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return None
+
+
+def iter_rows(stream, import_format):
+    """
+    Yield `(item, error)` for every data row of `stream`
+
+    CSV cells left empty are omitted so the model defaults apply, exactly as
+    for a missing NDJSON key. Blank NDJSON lines are skipped.
+    """
+    if import_format == 'csv':
+        for row in csv.DictReader(stream):
+            yield {key: value for key, value in row.items() if key and value not in ('', None)}, None
+    elif import_format == 'ndjson':
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line), None
+            except ValueError as exc:
+                yield None, f'Invalid JSON: {exc}'
+    else:
+        raise ValueError(f'Unknown import format: {import_format}')
+
+
+class UserResolver:
+    """
+    Map `user_email` values to user ids, querying each email at most once
+    """
+
+    def __init__(self):
+        self.cache = {}
+
+    def prefetch(self, emails):
+        """Look up every not yet cached email of `emails` in one query"""
+        misses = {email for email in emails if email not in self.cache}
+        if not misses:
+            return
+        found = dict(User.objects.filter(email__in=misses).values_list('email', 'id'))
+        for email in misses:
+            self.cache[email] = found.get(email)
+
+    def resolve(self, email):
+        return self.cache.get(email)
+
+
+class TaskImporter:
+    """
+    Run a `TaskImportJob`, reporting progress to `progress(job)` after each
+    committed batch
+    """
+
+    def __init__(self, job, batch_size=None, progress=None):
+        self.job = job
+        self.batch_size = batch_size or settings.TASK_IMPORT_BATCH_SIZE
+        self.progress = progress
+        self.users = UserResolver()
+
+    def run(self):
+        job = self.job
+        job.status = 'RUNNING'
+        job.message = ''
+        job.finished_at = None
+        job.save(update_fields=['status', 'message', 'finished_at', 'updated_at'])
+
+        try:
+            with open(job.source, encoding='utf-8-sig', newline='') as stream:
+                batch = []
+                for row_number, (item, error) in enumerate(iter_rows(stream, job.format), start=1):
+                    # Rows up to `rows_processed` were committed by an earlier run.
+                    if row_number <= job.rows_processed:
+                        continue
+                    batch.append((row_number, item, error))
+                    if len(batch) >= self.batch_size:
+                        self.write_batch(batch)
+                        batch = []
+                if batch:
+                    self.write_batch(batch)
+        except Exception as exc:
+            job.status = 'FAILED'
+            job.message = str(exc)
+            job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'message', 'finished_at', 'updated_at'])
+            raise
+
+        job.status = 'COMPLETED'
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'finished_at', 'updated_at'])
+        return job
+
+    def write_batch(self, batch):
+        """
+        Validate and insert one batch, advancing the job in the same
+        transaction
+        """
+        job = self.job
+        errors = {row_number: {'non_field_errors': [error]} for row_number, _, error in batch if error}
+        rows = [(row_number, item) for row_number, item, error in batch if not error]
+
+        valid, invalid = validate_items(TaskCreateSerializer, [item for _, item in rows])
+        errors.update({rows[index][0]: detail for index, detail in invalid.items()})
+
+        tasks = []
+        if job.assign_by_email:
+            self.users.prefetch(
+                rows[index][1]['user_email'] for index, _ in valid if rows[index][1].get('user_email')
+            )
+        for index, data in valid:
+            row_number, item = rows[index]
+            user_id = job.user_id
+            if job.assign_by_email and item.get('user_email'):
+                user_id = self.users.resolve(item['user_email'])
+                if user_id is None:
+                    errors[row_number] = {'user_email': ['No user with this email.']}
+                    continue
+            tasks.append(Task(user_id=user_id, **data))
+
+        room = TaskImportJob.MAX_STORED_ERRORS - len(job.errors)
+        fields = {
+            'rows_processed': batch[-1][0],
+            'tasks_created': job.tasks_created + len(tasks),
+            'rows_failed': job.rows_failed + len(errors),
+            'errors': job.errors + [
+                {'row': row_number, 'errors': detail}
+                for row_number, detail in sorted(errors.items())[:max(room, 0)]
+            ],
+            'updated_at': timezone.now(),
+        }
+
+        with transaction.atomic(), bulk_task_write():
+            user_ids = create_tasks(tasks) if tasks else set()
+            TaskImportJob.objects.filter(pk=job.pk).update(**fields)
+
+        # Only now that the batch is committed does the job count it; after
+        # a rollback the job still describes the last committed batch.
+        for field, value in fields.items():
+            setattr(job, field, value)
+        if user_ids:
+            tasks_changed.send(sender=Task, user_ids=user_ids)
+        if self.progress:
+            self.progress(job)
+
+
+def run_import_job(job_id):
+    """
+    Run the import job `job_id` in a background thread's own connection
+    """
+    try:
+        TaskImporter(TaskImportJob.objects.get(pk=job_id)).run()
+    except Exception:
+        logger.exception('Task import job %s failed', job_id)
+    finally:
+        connection.close()
+
+
+def start_import_job(job):
+    """Start `job` in a daemon thread once the current transaction commits"""
+    def start():
+        threading.Thread(target=run_import_job, args=(job.pk,), daemon=True).start()
+    transaction.on_commit(start)
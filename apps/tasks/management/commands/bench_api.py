@@ -0,0 +1,285 @@
+"""
+Benchmark the whole API against generated data, with a regression check
+against a stored baseline
+"""
+
+import json
+import platform
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from rest_framework.settings import api_settings
+
+from apps.authentication.serializers import TokenSerializer
+from apps.tasks.harness import FIXTURE_PASSWORD, WORDS, generate_dataset, test_database, unthrottled
+
+
+FILTERS = [
+    'completed=false',
+    'completed=true',
+    'priority=HIGH',
+    'priority=LOW&completed=false',
+    'overdue=true',
+    'ordering=due_date',
+]
+
+SCENARIOS = ['register', 'login', 'list', 'filter', 'search', 'toggle', 'stats']
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate users and tasks, run the register, login, list, filter, search, '
+        'toggle and stats scenarios, and report latency percentiles and throughput'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Generated users (default: 50)')
+        parser.add_argument('--tasks', type=int, default=200, help='Tasks per generated user (default: 200)')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario and round (default: 200)')
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help=(
+                'Requests in flight; SQLite runs one write at a time, on an on-disk '
+                'test database above 1 (default: 1)'
+            ),
+        )
+        parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per scenario (default: 20)')
+        parser.add_argument(
+            '--rounds',
+            type=int,
+            default=3,
+            help='Runs of every scenario; the fastest one is reported (default: 3)',
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the data and the request mix (default: 0)')
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=SCENARIOS,
+            help='Run only this scenario; repeatable (default: all)',
+        )
+        parser.add_argument('--save-baseline', metavar='PATH', help='Write the results to PATH as JSON')
+        parser.add_argument('--baseline', metavar='PATH', help='Compare with a baseline written by --save-baseline')
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=20,
+            help='Percent of p95 latency increase or throughput drop that fails --baseline (default: 20)',
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            try:
+                baseline = json.loads(Path(options['baseline']).read_text())
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read baseline {options['baseline']}: {exc}")
+
+        names = options['scenario'] or SCENARIOS
+        # Reads are measured against the database, not the response caches.
+        with tempfile.TemporaryDirectory() as directory, test_database(
+            name=self.database_name(directory, options),
+        ), unthrottled(), override_settings(
+            TASK_RESPONSE_CACHE_TIMEOUT=0,
+            TASK_STATS_CACHE_TIMEOUT=0,
+        ):
+            start = time.perf_counter()
+            users = generate_dataset(options['users'], options['tasks'], seed=options['seed'])
+            self.stdout.write(
+                f"Generated {len(users)} users x {options['tasks']} tasks "
+                f'in {time.perf_counter() - start:.1f} s'
+            )
+            self.tokens = {user.pk: TokenSerializer.get_tokens_for_user(user)['access'] for user in users}
+            self.task_ids = {user.pk: list(user.tasks.values_list('id', flat=True)) for user in users}
+            self.users = users
+            self.registered = 0
+
+            results = {}
+            self.stdout.write(
+                f"{options['requests']} requests per scenario, best of {options['rounds']} rounds, "
+                f"concurrency {options['concurrency']}\n"
+                f"{'scenario':<10} {'req/s':>9} {'mean':>8} "
+                + ' '.join(f'{f"p{p}":>8}' for p in PERCENTILES)
+                + f" {'errors':>7}  (ms)"
+            )
+            # Alternate the scenarios so drift affects them alike.
+            for round_number in range(options['rounds']):
+                for name in names:
+                    result = self.run_scenario(name, round_number, options)
+                    if name not in results or result['throughput'] > results[name]['throughput']:
+                        results[name] = result
+            for name in names:
+                self.report(name, results[name])
+
+        run = {'parameters': self.parameters(options), 'scenarios': results}
+        if options['save_baseline']:
+            Path(options['save_baseline']).write_text(json.dumps(run, indent=2) + '\n')
+            self.stdout.write(f"Baseline written to {options['save_baseline']}")
+        if baseline is not None:
+            self.compare(baseline, run, options['threshold'])
+
+    def database_name(self, directory, options):
+        """
+        Test database file in `directory` for concurrent runs on SQLite, None
+        for the default test database
+
+        Concurrent writers on SQLite's shared-cache in-memory test database
+        fail at once with "database table is locked", which no busy timeout
+        retries.
+        """
+        if connection.vendor == 'sqlite' and options['concurrency'] > 1:
+            return str(Path(directory) / 'bench.sqlite3')
+        return None
+
+    def parameters(self, options):
+        """What makes two runs comparable"""
+        return {
+            'users': options['users'],
+            'tasks': options['tasks'],
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'seed': options['seed'],
+            'rounds': options['rounds'],
+            'password_hasher': settings.PASSWORD_HASHER,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+        }
+
+    def run_scenario(self, name, round_number, options):
+        """Run `warmup` then `requests` requests of scenario `name`"""
+        scenario = getattr(self, f'scenario_{name}')
+        # Every run draws the same users and tasks as the same round of another run.
+        rng = random.Random(f"{options['seed']}:{name}:{round_number}")
+        requests = [scenario(rng) for _ in range(options['warmup'] + options['requests'])]
+        warmup, measured = requests[:options['warmup']], requests[options['warmup']:]
+
+        def send(request):
+            method, path, data, token, expected = request
+            headers = {'Authorization': f'Bearer {token}'} if token else {}
+            # Server errors (e.g. SQLite lock timeouts) count as errors.
+            client = Client(raise_request_exception=False)
+            start = time.perf_counter()
+            if method == 'get':
+                response = client.get(path, headers=headers)
+            else:
+                response = client.post(path, data, content_type='application/json', headers=headers)
+            elapsed = time.perf_counter() - start
+            return elapsed, response.status_code == expected
+
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            list(pool.map(send, warmup))
+            start = time.perf_counter()
+            outcomes = list(pool.map(send, measured))
+            wall = time.perf_counter() - start
+
+        latencies = sorted(elapsed * 1000 for elapsed, _ in outcomes)
+        result = {
+            'requests': len(outcomes),
+            'errors': sum(not ok for _, ok in outcomes),
+            'throughput': round(len(outcomes) / wall, 1),
+            'mean_ms': round(sum(latencies) / len(latencies), 2),
+        }
+        for percentile in PERCENTILES:
+            result[f'p{percentile}_ms'] = round(self.percentile(latencies, percentile), 2)
+        return result
+
+    @staticmethod
+    def percentile(ordered, percentile):
+        """Nearest-rank percentile of the sorted `ordered`"""
+        rank = max(1, -(-len(ordered) * percentile // 100))
+        return ordered[rank - 1]
+
+    # A scenario returns `(method, path, data, token, expected status)`.
+
+    def scenario_register(self, rng):
+        self.registered += 1
+        email = f'registered{self.registered}@example.com'
+        data = {
+            'email': email,
+            'username': f'registered{self.registered}',
+            'password': FIXTURE_PASSWORD,
+            'password2': FIXTURE_PASSWORD,
+        }
+        return 'post', '/api/auth/register/', data, None, 201
+
+    def scenario_login(self, rng):
+        user = rng.choice(self.users)
+        data = {'email': user.email, 'password': FIXTURE_PASSWORD}
+        return 'post', '/api/auth/login/', data, None, 200
+
+    def scenario_list(self, rng):
+        user = rng.choice(self.users)
+        pages = max(1, -(-len(self.task_ids[user.pk]) // api_settings.PAGE_SIZE))
+        return 'get', f'/api/tasks/?page={rng.randint(1, min(pages, 3))}', None, self.tokens[user.pk], 200
+
+    def scenario_filter(self, rng):
+        user = rng.choice(self.users)
+        return 'get', f'/api/tasks/?{rng.choice(FILTERS)}', None, self.tokens[user.pk], 200
+
+    def scenario_search(self, rng):
+        user = rng.choice(self.users)
+        return 'get', f'/api/tasks/?search={rng.choice(WORDS)}', None, self.tokens[user.pk], 200
+
+    def scenario_toggle(self, rng):
+        user = rng.choice(self.users)
+        task_id = rng.choice(self.task_ids[user.pk])
+        return 'post', f'/api/tasks/{task_id}/toggle/', None, self.tokens[user.pk], 200
+
+    def scenario_stats(self, rng):
+        user = rng.choice(self.users)
+        return 'get', '/api/tasks/stats/', None, self.tokens[user.pk], 200
+
+    def report(self, name, result):
+        style = self.style.ERROR if result['errors'] else (lambda text: text)
+        self.stdout.write(style(
+            f"{name:<10} {result['throughput']:>9.1f} {result['mean_ms']:>8.2f} "
+            + ' '.join(f"{result[f'p{p}_ms']:>8.2f}" for p in PERCENTILES)
+            + f" {result['errors']:>7}"
+        ))
+
+    def compare(self, baseline, run, threshold):
+        """Fail when a scenario got slower than the baseline by over `threshold` percent"""
+        if baseline.get('parameters') != run['parameters']:
+            self.stdout.write(self.style.WARNING(
+                f"Baseline parameters differ: {baseline.get('parameters')}; the comparison may not be meaningful."
+            ))
+
+        regressions = []
+        self.stdout.write(f"\n{'scenario':<10} {'p95 (ms)':>22} {'req/s':>22}")
+        for name, result in run['scenarios'].items():
+            before = baseline['scenarios'].get(name)
+            if before is None:
+                self.stdout.write(f'{name:<10} not in the baseline')
+                continue
+            p95_change = result['p95_ms'] / before['p95_ms'] - 1 if before['p95_ms'] else 0
+            throughput_change = result['throughput'] / before['throughput'] - 1 if before['throughput'] else 0
+            regressed = (
+                p95_change * 100 > threshold
+                or -throughput_change * 100 > threshold
+                or result['errors'] > before['errors']
+            )
+            line = (
+                f"{name:<10} {before['p95_ms']:>7.2f} -> {result['p95_ms']:>7.2f} {p95_change:>+6.0%} "
+                f"{before['throughput']:>7.1f} -> {result['throughput']:>7.1f} {throughput_change:>+6.0%}"
+            )
+            if regressed:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(f'{line}  REGRESSED'))
+            else:
+                self.stdout.write(line)
+
+        if regressions:
+            raise CommandError(f"Regressed beyond {threshold:g}%: {', '.join(regressions)}")
+        self.stdout.write(self.style.SUCCESS(f'No scenario regressed beyond {threshold:g}%.'))
@@ -0,0 +1,168 @@
+"""
+Load benchmark of the async task views under ASGI against the synchronous
+views under WSGI
+"""
+
+import asyncio
+import json
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+
+from apps.authentication.serializers import TokenSerializer
+from apps.tasks.harness import create_fixture, test_database
+
+
+# (name, WSGI path, ASGI path); `{id}` is replaced by a task of the user
+ENDPOINTS = [
+    ('list', '/api/tasks/', '/api/async/tasks/'),
+    ('detail', '/api/tasks/{id}/', '/api/async/tasks/{id}/'),
+    ('stats', '/api/tasks/stats/', '/api/async/tasks/stats/'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Fire concurrent requests at the sync (WSGI) and async (ASGI) task endpoints '
+        'and report throughput and latency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint (default: 500)')
+        parser.add_argument('--concurrency', type=int, default=20, help='Requests in flight (default: 20)')
+        parser.add_argument('--tasks', type=int, default=200, help='Fixture tasks (in-process mode, default: 200)')
+        parser.add_argument(
+            '--wsgi-url',
+            help='Base URL of a running WSGI server, e.g. gunicorn config.wsgi --threads 20',
+        )
+        parser.add_argument(
+            '--asgi-url',
+            help='Base URL of a running ASGI server, e.g. uvicorn config.asgi:application',
+        )
+        parser.add_argument('--email', help='Login of an existing user (server mode)')
+        parser.add_argument('--password', help='Password of that user (server mode)')
+
+    def handle(self, *args, **options):
+        if options['wsgi_url'] or options['asgi_url']:
+            self.bench_servers(options)
+            return
+
+        # Reads are measured against the database, not the response cache.
+        with test_database(), override_settings(TASK_RESPONSE_CACHE_TIMEOUT=0):
+            (user,), _ = create_fixture(users=1, tasks_per_user=options['tasks'], admins=0)
+            token = TokenSerializer.get_tokens_for_user(user)['access']
+            task_id = user.tasks.values_list('id', flat=True).first()
+            self.stdout.write(
+                f"In process: {options['requests']} requests per endpoint, "
+                f"concurrency {options['concurrency']}"
+            )
+            for name, wsgi_path, asgi_path in ENDPOINTS:
+                wsgi = self.run_wsgi(wsgi_path.format(id=task_id), token, options)
+                asgi = asyncio.run(self.run_asgi(asgi_path.format(id=task_id), token, options))
+                self.report(name, wsgi, asgi)
+
+    def run_wsgi(self, path, token, options):
+        """Drive the WSGI handler from `concurrency` threads"""
+        headers = {'Authorization': f'Bearer {token}'}
+
+        def request(_):
+            start = time.perf_counter()
+            response = Client().get(path, headers=headers)
+            if response.status_code != 200:
+                raise CommandError(f'{path} returned {response.status_code}: {response.content[:200]}')
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            latencies = list(pool.map(request, range(options['requests'])))
+        return time.perf_counter() - start, latencies
+
+    async def run_asgi(self, path, token, options):
+        """Drive the ASGI handler with `concurrency` concurrent tasks"""
+        client = AsyncClient()
+        headers = {'Authorization': f'Bearer {token}'}
+        semaphore = asyncio.Semaphore(options['concurrency'])
+
+        async def request():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(path, headers=headers)
+                if response.status_code != 200:
+                    raise CommandError(f'{path} returned {response.status_code}: {response.content[:200]}')
+                return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(request() for _ in range(options['requests'])))
+        return time.perf_counter() - start, latencies
+
+    def bench_servers(self, options):
+        """Load running servers over HTTP from `concurrency` client threads"""
+        if not (options['email'] and options['password']):
+            raise CommandError('--email and --password are required with --wsgi-url/--asgi-url.')
+
+        results = {}
+        for kind, base_url, paths in [
+            ('wsgi', options['wsgi_url'], [wsgi for _, wsgi, _ in ENDPOINTS]),
+            ('asgi', options['asgi_url'], [asgi for _, _, asgi in ENDPOINTS]),
+        ]:
+            if not base_url:
+                continue
+            base_url = base_url.rstrip('/')
+            token = self.login(base_url, options['email'], options['password'])
+            task_id = self.fetch(base_url + paths[0], token)['results'][0]['id']
+            results[kind] = [
+                self.run_http(base_url + path.format(id=task_id), token, options)
+                for path in paths
+            ]
+
+        self.stdout.write(
+            f"Servers: {options['requests']} requests per endpoint, concurrency {options['concurrency']}"
+        )
+        for index, (name, _, _) in enumerate(ENDPOINTS):
+            self.report(
+                name,
+                results['wsgi'][index] if 'wsgi' in results else None,
+                results['asgi'][index] if 'asgi' in results else None,
+            )
+
+    def login(self, base_url, email, password):
+        request = urllib.request.Request(
+            f'{base_url}/api/auth/login/',
+            data=json.dumps({'email': email, 'password': password}).encode(),
+            headers={'Content-Type': 'application/json'},
+        )
+        with urllib.request.urlopen(request) as response:
+            return json.load(response)['data']['access']
+
+    def fetch(self, url, token):
+        request = urllib.request.Request(url, headers={'Authorization': f'Bearer {token}'})
+        with urllib.request.urlopen(request) as response:
+            return json.load(response)
+
+    def run_http(self, url, token, options):
+        def request(_):
+            start = time.perf_counter()
+            self.fetch(url, token)
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            latencies = list(pool.map(request, range(options['requests'])))
+        return time.perf_counter() - start, latencies
+
+    def report(self, name, wsgi, asgi):
+        for label, result in [('wsgi', wsgi), ('asgi', asgi)]:
+            if result is None:
+                continue
+            elapsed, latencies = result
+            latencies = sorted(latencies)
+            p95 = latencies[int(len(latencies) * 0.95) - 1]
+            self.stdout.write(
+                f'{name:<7} {label}  {len(latencies) / elapsed:8.1f} req/s   '
+                f'p50 {statistics.median(latencies) * 1000:7.1f} ms   p95 {p95 * 1000:7.1f} ms'
+            )
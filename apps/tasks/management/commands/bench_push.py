@@ -0,0 +1,215 @@
+"""
+Load benchmark of task change push: idle connections held by one
+process, event fan-out latency, and slow consumers
+"""
+
+import asyncio
+import gc
+import json
+import random
+import threading
+import time
+import tracemalloc
+from array import array
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.authentication.authentication import add_user_claims
+from apps.tasks.harness import generate_dataset, test_database
+from apps.tasks.push import PUSH_PATH, PushRouter, hub, publish
+
+
+async def not_push(scope, receive, send):
+    raise AssertionError(f"Unexpected request for {scope['path']}")
+
+
+class Results:
+    """Publish times and what the stand-in clients received"""
+
+    def __init__(self):
+        # Plain floats: nothing here for the garbage collector to scan
+        self.published = array('d')
+        self.latencies = array('d')
+        self.resyncs = 0
+        self.refused = []
+
+
+class Connection:
+    """
+    A stand-in client of one SSE stream: records the latency of every
+    event it receives, or stalls after the first chunk when `slow`
+    """
+
+    __slots__ = ('scope', 'gone', 'sent_request', 'slow', 'results', 'task')
+
+    def __init__(self, token, slow, results):
+        self.scope = {
+            'type': 'http',
+            'path': PUSH_PATH,
+            'method': 'GET',
+            'headers': [(b'authorization', f'Bearer {token}'.encode())],
+            'query_string': b'',
+        }
+        self.gone = asyncio.get_running_loop().create_future()
+        self.sent_request = False
+        self.slow = slow
+        self.results = results
+
+    async def receive(self):
+        if not self.sent_request:
+            self.sent_request = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.gone
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            if message['status'] != 200:
+                self.results.refused.append(message['status'])
+            return
+        body = message.get('body', b'')
+        if body.startswith(b'data: '):
+            now = time.perf_counter()
+            for chunk in body.split(b'\n\n'):
+                if not chunk:
+                    continue
+                event = json.loads(chunk[len(b'data: '):])
+                if event['action'] == 'resync':
+                    self.results.resyncs += 1
+                else:
+                    self.results.latencies.append((now - self.results.published[event['id']]) * 1000)
+        if self.slow and body:
+            # A client that stopped reading: the transport never drains.
+            await self.gone
+
+    def disconnect(self):
+        if not self.gone.done():
+            self.gone.set_result(None)
+
+
+class Command(BaseCommand):
+    help = (
+        'Hold many idle task push (SSE) connections in this process, publish task '
+        'events from another thread and report memory per connection, delivery '
+        'latency and how slow consumers were handled'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=10000, help='Open connections (default: 10000)')
+        parser.add_argument('--users', type=int, default=1000, help='Users the connections belong to (default: 1000)')
+        parser.add_argument('--events', type=int, default=2000, help='Events published (default: 2000)')
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=1000,
+            help='Events published per second; 0 publishes as fast as possible (default: 1000)',
+        )
+        parser.add_argument(
+            '--slow',
+            type=float,
+            default=0.01,
+            help='Share of connections that stop reading (default: 0.01)',
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the event targets (default: 0)')
+
+    def handle(self, *args, **options):
+        if options['connections'] < 1 or options['users'] < 1:
+            raise CommandError('--connections and --users must be positive.')
+        with test_database():
+            users = generate_dataset(options['users'], 0, seed=options['seed'])
+            tokens = [str(add_user_claims(AccessToken.for_user(user), user)) for user in users]
+            asyncio.run(self.run(users, tokens, options))
+
+    async def run(self, users, tokens, options):
+        application = PushRouter(not_push)
+        rng = random.Random(options['seed'])
+        count = options['connections']
+        slow = set(rng.sample(range(count), int(count * options['slow'])))
+
+        connections, results = [], Results()
+
+        async def open_connections(upto):
+            for index in range(len(connections), upto):
+                connection = Connection(tokens[index % len(tokens)], index in slow, results)
+                connection.task = asyncio.ensure_future(
+                    application(connection.scope, connection.receive, connection.send)
+                )
+                connections.append(connection)
+            while hub.count < upto:
+                if results.refused:
+                    raise CommandError(f'A connection was refused with {results.refused[0]}.')
+                await asyncio.sleep(0.01)
+            # Let every stream settle into waiting for events.
+            await asyncio.sleep(0.1)
+
+        # As config/asgi.py does once the process has started
+        gc.freeze()
+
+        # Memory is traced on a sample only; tracing slows everything down.
+        sample = min(count, 1000)
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        await open_connections(sample)
+        memory = (tracemalloc.get_traced_memory()[0] - before) / sample
+        tracemalloc.stop()
+        start = time.perf_counter()
+        await open_connections(count)
+        opened = time.perf_counter() - start
+        self.stdout.write(
+            f'{count} connections open ({count - sample} in {opened:.2f}s); '
+            f'{memory / 1024:.1f} KiB each, server side and the stand-in client'
+        )
+
+        # Connections per user, to know how many deliveries to expect
+        fan_out = Counter(users[index % len(users)].pk for index in range(count))
+        targets = [rng.choice(users).pk for _ in range(options['events'])]
+        results.published = array('d', [0.0] * len(targets))
+        publish_time = []
+
+        def publisher():
+            interval = 1 / options['rate'] if options['rate'] else 0
+            began = time.perf_counter()
+            for sequence, user_id in enumerate(targets):
+                if interval:
+                    delay = began + sequence * interval - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                results.published[sequence] = time.perf_counter()
+                publish({user_id}, 'updated', sequence)
+            publish_time.append(time.perf_counter() - began)
+
+        thread = threading.Thread(target=publisher)
+        thread.start()
+        while thread.is_alive():
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(0.5)
+
+        expected = sum(fan_out[user_id] for user_id in targets)
+        slow_users = [users[index % len(users)].pk for index in slow]
+        fast_expected = expected - sum(targets.count(user_id) for user_id in slow_users)
+        self.stdout.write(
+            f"{options['events']} events published in {publish_time[0]:.2f}s "
+            f'to {expected} connection deliveries ({fast_expected} to reading clients)'
+        )
+        latencies = sorted(results.latencies)
+        if latencies:
+            p50, p99 = (latencies[min(len(latencies) - 1, int(len(latencies) * q))] for q in (0.5, 0.99))
+            self.stdout.write(
+                f'delivered {len(latencies)}: latency p50 {p50:.2f} ms, p99 {p99:.2f} ms, max {latencies[-1]:.2f} ms'
+            )
+        subscribers = [subscriber for group in hub.subscribers.values() for subscriber in group]
+        buffered = sum(len(subscriber.events) for subscriber in subscribers)
+        behind = sum(subscriber.behind for subscriber in subscribers)
+        self.stdout.write(
+            f'{len(slow)} stalled connections: {buffered} events buffered in all, '
+            f'{behind} fell behind and wait with a resync; {results.resyncs} resyncs reached reading clients'
+        )
+
+        for connection in connections:
+            connection.disconnect()
+        await asyncio.gather(*(connection.task for connection in connections))
+        if hub.count:
+            raise CommandError(f'{hub.count} connections still subscribed after disconnecting.')
+        self.stdout.write(self.style.SUCCESS('All connections closed.'))
@@ -0,0 +1,65 @@
+"""
+Benchmark the compiled row serializers against the DRF serializers
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from apps.tasks.harness import create_fixture, test_database
+from apps.tasks.models import Task
+from apps.tasks.row_serializers import TaskListRowSerializer, TaskRowSerializer
+from apps.tasks.serializers import TaskListSerializer, TaskSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare output and speed of the row serializers with TaskListSerializer/TaskSerializer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=1000, help='Tasks to serialize (default: 1000)')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per serializer (default: 5)')
+
+    def handle(self, *args, **options):
+        with test_database():
+            create_fixture(users=1, tasks_per_user=options['tasks'], admins=0)
+            pairs = [
+                ('list', TaskListSerializer, TaskListRowSerializer),
+                ('detail', TaskSerializer, TaskRowSerializer),
+            ]
+            for name, drf_class, row_class in pairs:
+                self.compare(name, drf_class, row_class, options['repeat'])
+
+    def compare(self, name, drf_class, row_class, repeat):
+        renderer = JSONRenderer()
+        queryset = Task.objects.order_by('-created_at')
+        # Fetch once so only serialization and rendering are timed.
+        instances = list(drf_class.setup_queryset(queryset))
+        rows = list(row_class().setup_queryset(queryset))
+
+        def run_drf():
+            return renderer.render(drf_class(instances, many=True).data)
+
+        def run_rows():
+            return renderer.render(row_class(now=timezone.now()).many(rows))
+
+        if run_drf() != run_rows():
+            raise CommandError(f'{name}: row serializer output differs from {drf_class.__name__}')
+
+        drf_time = self.best_of(run_drf, repeat)
+        rows_time = self.best_of(run_rows, repeat)
+        self.stdout.write(
+            f'{name:<7} {drf_class.__name__:<20} {drf_time * 1000:8.1f} ms   '
+            f'{row_class.__name__:<22} {rows_time * 1000:8.1f} ms   '
+            f'x{drf_time / rows_time:.1f}   output identical'
+        )
+
+    @staticmethod
+    def best_of(func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
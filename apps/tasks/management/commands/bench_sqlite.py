@@ -0,0 +1,193 @@
+"""
+Concurrency benchmark of mixed task reads and writes on an on-disk SQLite
+database: Django's defaults, the production profile, and group commit
+
+Group commit pays for its thread handoff by sharing one commit among many
+writes, and by queueing writers instead of letting them race for the
+lock. Compare it with synchronous=FULL too, where each commit also waits
+for an fsync.
+"""
+
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+
+from apps.authentication.serializers import TokenSerializer
+from apps.tasks.harness import generate_dataset, test_database, unthrottled
+
+
+# name -> (SQLITE_PRAGMAS from the configured ones, CONN_MAX_AGE,
+# CONN_HEALTH_CHECKS, TASK_WRITE_QUEUE); None means the configured value
+PROFILES = {
+    # Rollback journal, full sync, a connection per request
+    'defaults': (lambda configured: {'journal_mode': 'DELETE', 'synchronous': 'FULL'}, 0, False, False),
+    'production': (None, None, None, False),
+    # Task writes committed in batches (see apps.tasks.write_queue)
+    'group-commit': (None, None, None, True),
+    # Every commit waits for an fsync of the WAL, which batching shares
+    'durable': (lambda configured: {**configured, 'synchronous': 'FULL'}, None, None, False),
+    'durable-group-commit': (lambda configured: {**configured, 'synchronous': 'FULL'}, None, None, True),
+}
+
+# Group-commit profile -> the same profile writing inline
+INLINE_PROFILES = {'group-commit': 'production', 'durable-group-commit': 'durable'}
+
+READS = {'list': 4, 'detail': 2, 'stats': 2}
+WRITES = {'toggle': 1, 'update': 1, 'create': 1}
+
+
+class Command(BaseCommand):
+    help = (
+        'Run concurrent task reads and writes against an on-disk SQLite database, '
+        'with Django defaults, the SQLITE_PRAGMAS / persistent connection profile, '
+        'that profile with synchronous=FULL, and both with group-committed task writes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Generated users (default: 20)')
+        parser.add_argument('--tasks', type=int, default=200, help='Tasks per generated user (default: 200)')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per profile (default: 2000)')
+        parser.add_argument('--concurrency', type=int, default=8, help='Client threads (default: 8)')
+        parser.add_argument(
+            '--write-ratio',
+            type=float,
+            default=0.2,
+            help='Share of toggles, updates and creates among the requests (default: 0.2)',
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the data and the request mix (default: 0)')
+        parser.add_argument('--profile', action='append', choices=list(PROFILES), help='Run only this profile')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError(f'This benchmark is for SQLite, not {connection.vendor}.')
+        if not 0 <= options['write_ratio'] <= 1:
+            raise CommandError('--write-ratio must be between 0 and 1.')
+
+        self.stdout.write(
+            f"{options['requests']} requests per profile, {options['concurrency']} threads, "
+            f"{options['write_ratio']:.0%} writes, {options['users']} users x {options['tasks']} tasks"
+        )
+        results = {}
+        for name in options['profile'] or PROFILES:
+            results[name] = self.run_profile(name, options)
+            self.report(name, *results[name])
+
+        if len(results) > 1:
+            baseline = next(iter(results.values()))[0]
+            for name, (throughput, _, _) in list(results.items())[1:]:
+                self.stdout.write(f'{name}: {throughput / baseline:.2f}x the throughput of {next(iter(results))}')
+            for name, inline in INLINE_PROFILES.items():
+                if name in results and inline in results:
+                    self.stdout.write(
+                        f'{name}: {results[name][0] / results[inline][0]:.2f}x the throughput of {inline}'
+                    )
+
+    def run_profile(self, name, options):
+        """Return `(requests per second, {operation: latencies}, errors)`"""
+        pragmas, max_age, health_checks, write_queue = PROFILES[name]
+        database = connection.settings_dict
+        saved = {key: database[key] for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')}
+        if max_age is not None:
+            database['CONN_MAX_AGE'] = max_age
+        if health_checks is not None:
+            database['CONN_HEALTH_CHECKS'] = health_checks
+
+        try:
+            with tempfile.TemporaryDirectory() as directory, override_settings(
+                SQLITE_PRAGMAS=pragmas(settings.SQLITE_PRAGMAS) if pragmas is not None else settings.SQLITE_PRAGMAS,
+                TASK_WRITE_QUEUE=write_queue,
+                TASK_RESPONSE_CACHE_TIMEOUT=0,
+                TASK_STATS_CACHE_TIMEOUT=0,
+            ), test_database(name=str(Path(directory) / 'bench.sqlite3')), unthrottled():
+                users = generate_dataset(options['users'], options['tasks'], seed=options['seed'])
+                requests = self.plan(users, options)
+                return self.run_threads(requests, options['concurrency'])
+        finally:
+            database.update(saved)
+
+    def plan(self, users, options):
+        """Draw the `(operation, method, path, data, token, expected status)` sequence"""
+        rng = random.Random(options['seed'])
+        tokens = {user.pk: TokenSerializer.get_tokens_for_user(user)['access'] for user in users}
+        task_ids = {user.pk: list(user.tasks.values_list('id', flat=True)) for user in users}
+        reads, writes = list(READS), list(WRITES)
+
+        requests = []
+        for index in range(options['requests']):
+            user = rng.choice(users)
+            token = tokens[user.pk]
+            task_id = rng.choice(task_ids[user.pk])
+            if rng.random() < options['write_ratio']:
+                operation = rng.choices(writes, weights=WRITES.values())[0]
+            else:
+                operation = rng.choices(reads, weights=READS.values())[0]
+            requests.append({
+                'list': ('list', 'get', '/api/tasks/', None, token, 200),
+                'detail': ('detail', 'get', f'/api/tasks/{task_id}/', None, token, 200),
+                'stats': ('stats', 'get', '/api/tasks/stats/', None, token, 200),
+                'toggle': ('toggle', 'post', f'/api/tasks/{task_id}/toggle/', None, token, 200),
+                'update': ('update', 'patch', f'/api/tasks/{task_id}/', {'title': f'Updated {index}'}, token, 200),
+                'create': ('create', 'post', '/api/tasks/', {'title': f'Created {index}'}, token, 201),
+            }[operation])
+        return requests
+
+    def run_threads(self, requests, concurrency):
+        latencies = {}
+        errors = {}
+        lock = threading.Lock()
+
+        def work(share):
+            # Server errors, e.g. "database is locked", count as errors.
+            client = Client(raise_request_exception=False)
+            local = []
+            try:
+                for operation, method, path, data, token, expected in share:
+                    headers = {'Authorization': f'Bearer {token}'}
+                    start = time.perf_counter()
+                    if data is None:
+                        response = getattr(client, method)(path, headers=headers)
+                    else:
+                        response = getattr(client, method)(
+                            path, data, content_type='application/json', headers=headers
+                        )
+                    local.append((operation, time.perf_counter() - start, response.status_code == expected))
+            finally:
+                # Persistent connections outlive requests; not this thread.
+                connections.close_all()
+            with lock:
+                for operation, elapsed, ok in local:
+                    latencies.setdefault(operation, []).append(elapsed * 1000)
+                    errors[operation] = errors.get(operation, 0) + (not ok)
+
+        threads = [
+            threading.Thread(target=work, args=(requests[index::concurrency],))
+            for index in range(concurrency)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return len(requests) / (time.perf_counter() - start), latencies, errors
+
+    def report(self, name, throughput, latencies, errors):
+        total_errors = sum(errors.values())
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{name}: {throughput:.1f} req/s, {total_errors} errors'
+        ))
+        self.stdout.write(f"  {'operation':<10} {'requests':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}  (ms)")
+        for operation in [*READS, *WRITES]:
+            values = sorted(latencies.get(operation, ()))
+            if not values:
+                continue
+            p50, p95, p99 = (values[min(len(values) - 1, int(len(values) * q))] for q in (0.5, 0.95, 0.99))
+            line = f'  {operation:<10} {len(values):>8} {p50:>8.2f} {p95:>8.2f} {p99:>8.2f} {errors[operation]:>7}'
+            self.stdout.write(self.style.ERROR(line) if errors[operation] else line)
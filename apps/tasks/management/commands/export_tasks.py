@@ -0,0 +1,57 @@
+"""
+Stream tasks to a file as NDJSON or CSV
+"""
+
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.tasks.export import EXPORT_FORMATS, iter_export
+from apps.tasks.filters import TaskFilter
+from apps.tasks.models import Task
+
+
+class Command(BaseCommand):
+    help = 'Export tasks as NDJSON or CSV with constant memory use'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='ndjson', dest='export_format')
+        parser.add_argument('--output', '-o', help='File to write (default: stdout)')
+        parser.add_argument('--user', help='Only export tasks of the user with this email')
+        parser.add_argument(
+            '--filter',
+            action='append',
+            default=[],
+            metavar='NAME=VALUE',
+            help='Task list filter, e.g. --filter completed=false --filter priority=HIGH (repeatable)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=settings.TASK_EXPORT_CHUNK_SIZE,
+            help='Rows fetched per database round trip',
+        )
+
+    def handle(self, *args, **options):
+        queryset = Task.objects.all()
+        if options['user']:
+            queryset = queryset.filter(user__email=options['user'])
+
+        data = {}
+        for item in options['filter']:
+            name, sep, value = item.partition('=')
+            if not sep:
+                raise CommandError(f'Invalid filter "{item}", expected NAME=VALUE.')
+            data[name] = value
+        filterset = TaskFilter(data=data, queryset=queryset)
+        if not filterset.is_valid():
+            raise CommandError(f'Invalid filters: {dict(filterset.errors)}')
+
+        output = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        try:
+            for chunk in iter_export(filterset.qs, options['export_format'], options['chunk_size']):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
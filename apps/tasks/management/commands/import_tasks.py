@@ -0,0 +1,107 @@
+"""
+Stream tasks from an NDJSON or CSV file into the database
+"""
+
+import os
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.tasks.importer import TaskImporter, infer_format
+from apps.tasks.models import TaskImportJob
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Import tasks from NDJSON or CSV in batched transactions; interrupted imports can be resumed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='File to import')
+        parser.add_argument(
+            '--format',
+            choices=[value for value, _ in TaskImportJob.FORMAT_CHOICES],
+            dest='import_format',
+            help='Input format (default: from the file extension)',
+        )
+        parser.add_argument(
+            '--user',
+            help='Email of the user owning rows without user_email (default: the first superuser)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.TASK_IMPORT_BATCH_SIZE,
+            help='Rows written per transaction',
+        )
+        parser.add_argument('--resume', type=int, metavar='JOB_ID', help='Continue an earlier import job')
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            job = self.resume_job(options['resume'])
+        else:
+            job = self.create_job(options)
+
+        self.stdout.write(f'Import job {job.pk}: {job.source} ({job.format})')
+        importer = TaskImporter(job, batch_size=options['batch_size'], progress=self.report)
+        try:
+            importer.run()
+        except Exception as exc:
+            raise CommandError(
+                f'Import job {job.pk} failed after row {job.rows_processed}: {exc}. '
+                f'Resume with --resume {job.pk}.'
+            )
+
+        for error in job.errors:
+            self.stdout.write(self.style.WARNING(f"row {error['row']}: {error['errors']}"))
+        if job.rows_failed > len(job.errors):
+            self.stdout.write(self.style.WARNING(f'... {job.rows_failed - len(job.errors)} more row error(s)'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Import job {job.pk} completed: {job.tasks_created} task(s) created, '
+            f'{job.rows_failed} row(s) failed.'
+        ))
+
+    def create_job(self, options):
+        path = options['path']
+        if not path:
+            raise CommandError('A file to import is required unless --resume is given.')
+        if not os.path.isfile(path):
+            raise CommandError(f'No such file: {path}')
+
+        import_format = options['import_format'] or infer_format(path)
+        if import_format is None:
+            raise CommandError('Cannot infer the format from the file name; pass --format.')
+
+        if options['user']:
+            try:
+                user = User.objects.get(email=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user with email {options['user']}")
+        else:
+            user = User.objects.filter(is_superuser=True).order_by('pk').first()
+            if user is None:
+                raise CommandError('Pass --user; there is no superuser to own the import job.')
+
+        return TaskImportJob.objects.create(
+            user=user,
+            source=os.path.abspath(path),
+            format=import_format,
+            assign_by_email=True,
+        )
+
+    def resume_job(self, job_id):
+        try:
+            job = TaskImportJob.objects.get(pk=job_id)
+        except TaskImportJob.DoesNotExist:
+            raise CommandError(f'No import job {job_id}')
+        if job.status == 'COMPLETED':
+            raise CommandError(f'Import job {job_id} already completed.')
+        self.stdout.write(f'Resuming after row {job.rows_processed}')
+        return job
+
+    def report(self, job):
+        self.stdout.write(
+            f'  {job.rows_processed} row(s) processed, {job.tasks_created} created, {job.rows_failed} failed'
+        )
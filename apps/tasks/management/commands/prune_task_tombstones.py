@@ -0,0 +1,41 @@
+"""
+Delete task tombstones older than the delta sync retention in batches
+
+Each batch moves the prune watermark in the same transaction, so sync
+tokens that may have missed a pruned deletion are rejected from then on.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.tasks.models import TaskTombstone
+from apps.tasks.sync import mark_pruned
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete task tombstones older than TASK_TOMBSTONE_RETENTION_DAYS, a batch '
+        'per transaction (run periodically, e.g. from cron)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows per transaction (default: 10000)')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=settings.TASK_TOMBSTONE_RETENTION_DAYS)
+        expired = TaskTombstone.objects.filter(deleted_at__lt=cutoff).order_by('deleted_at')
+        deleted = 0
+        while True:
+            batch = list(expired.values_list('id', 'deleted_at')[:options['batch_size']])
+            if not batch:
+                break
+            ids, times = zip(*batch)
+            with transaction.atomic():
+                count, _ = TaskTombstone.objects.filter(id__in=ids).delete()
+                mark_pruned(max(times))
+            deleted += count
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired task tombstones.'))
@@ -0,0 +1,23 @@
+"""
+Install and rebuild the task full-text search index
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from apps.tasks.search import install_search_index
+
+
+class Command(BaseCommand):
+    help = 'Create the full-text search index for tasks (if missing) and rebuild its contents'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Database alias to index (default: "default")',
+        )
+
+    def handle(self, *args, **options):
+        backend = install_search_index(options['database'], rebuild=True)
+        self.stdout.write(self.style.SUCCESS(f'Search index ready ({backend.name} backend).'))
@@ -0,0 +1,38 @@
+"""
+Rebuild or verify the denormalized per-user task counters
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.tasks.counters import rebuild_counters, verify_counters
+
+
+class Command(BaseCommand):
+    help = 'Rebuild TaskCounters from the task table, or verify them with --verify'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only compare stored counters with the task table; exit non-zero on mismatch',
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Restrict the rebuild to this user id (repeatable)',
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            mismatches = verify_counters()
+            for user_id, (stored, actual) in sorted(mismatches.items()):
+                self.stdout.write(f'user {user_id}: stored {stored} != actual {actual}')
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} user(s) have stale task counters.')
+            self.stdout.write(self.style.SUCCESS('Task counters are consistent.'))
+            return
+
+        rows = rebuild_counters(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt task counters for {rows} user(s).'))
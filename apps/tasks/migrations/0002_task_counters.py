@@ -0,0 +1,63 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_counters(apps, schema_editor):
+    Task = apps.get_model('tasks', 'Task')
+    TaskCounters = apps.get_model('tasks', 'TaskCounters')
+    rows = Task.objects.order_by().values('user_id').annotate(
+        total=models.Count('id'),
+        completed_count=models.Count('id', filter=models.Q(completed=True)),
+        overdue_eligible=models.Count('id', filter=models.Q(completed=False, due_date__isnull=False)),
+        low=models.Count('id', filter=models.Q(priority='LOW')),
+        medium=models.Count('id', filter=models.Q(priority='MEDIUM')),
+        high=models.Count('id', filter=models.Q(priority='HIGH')),
+    )
+    TaskCounters.objects.bulk_create(
+        [
+            TaskCounters(
+                user_id=row['user_id'],
+                total=row['total'],
+                completed=row['completed_count'],
+                overdue_eligible=row['overdue_eligible'],
+                low=row['low'],
+                medium=row['medium'],
+                high=row['high'],
+            )
+            for row in rows
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tasks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskCounters',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('overdue_eligible', models.IntegerField(default=0, help_text='Incomplete tasks that have a due date')),
+                ('low', models.IntegerField(default=0)),
+                ('medium', models.IntegerField(default=0)),
+                ('high', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(help_text='User these counters belong to', on_delete=django.db.models.deletion.CASCADE, related_name='task_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Task counters',
+                'verbose_name_plural': 'Task counters',
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
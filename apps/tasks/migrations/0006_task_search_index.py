@@ -0,0 +1,89 @@
+"""
+Full-text search index of tasks (see apps.tasks.search)
+
+Kept up to date by the database itself: an FTS5 external-content table
+and triggers on SQLite, a generated tsvector column on PostgreSQL. Other
+databases get no index and search with icontains.
+
+Only `title` and `description` of `tasks_task` are indexed, both from
+0001, so this depends on nothing newer than the search index itself.
+"""
+
+from django.db import migrations
+
+
+class RunSQLOn(migrations.RunSQL):
+    """`RunSQL` applied only to databases of `vendor`"""
+
+    def __init__(self, vendor, *args, **kwargs):
+        self.vendor = vendor
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, args, kwargs = super().deconstruct()
+        return name, [self.vendor, *args], kwargs
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+SQLITE_DELETE_OLD = (
+    "INSERT INTO tasks_task_fts(tasks_task_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description);"
+)
+SQLITE_INSERT_NEW = (
+    "INSERT INTO tasks_task_fts(rowid, title, description) "
+    "VALUES (new.id, new.title, new.description);"
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0002_task_counters'),
+    ]
+
+    operations = [
+        # IF NOT EXISTS: databases indexed before this migration keep theirs.
+        RunSQLOn(
+            'sqlite',
+            sql=[
+                "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_task_fts USING fts5("
+                "title, description, content='tasks_task', content_rowid='id', "
+                "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+                f"CREATE TRIGGER IF NOT EXISTS tasks_task_fts_ai AFTER INSERT ON tasks_task "
+                f"BEGIN {SQLITE_INSERT_NEW} END",
+                f"CREATE TRIGGER IF NOT EXISTS tasks_task_fts_ad AFTER DELETE ON tasks_task "
+                f"BEGIN {SQLITE_DELETE_OLD} END",
+                f"CREATE TRIGGER IF NOT EXISTS tasks_task_fts_au AFTER UPDATE OF title, description ON tasks_task "
+                f"BEGIN {SQLITE_DELETE_OLD} {SQLITE_INSERT_NEW} END",
+                "INSERT INTO tasks_task_fts(tasks_task_fts) VALUES ('rebuild')",
+            ],
+            reverse_sql=[
+                "DROP TRIGGER IF EXISTS tasks_task_fts_au",
+                "DROP TRIGGER IF EXISTS tasks_task_fts_ad",
+                "DROP TRIGGER IF EXISTS tasks_task_fts_ai",
+                "DROP TABLE IF EXISTS tasks_task_fts",
+            ],
+        ),
+        RunSQLOn(
+            'postgresql',
+            sql=[
+                "ALTER TABLE tasks_task ADD COLUMN IF NOT EXISTS search_vector tsvector "
+                "GENERATED ALWAYS AS ("
+                "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+                "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+                ") STORED",
+                "CREATE INDEX IF NOT EXISTS tasks_task_search_vector_idx ON tasks_task USING GIN (search_vector)",
+            ],
+            reverse_sql=[
+                "DROP INDEX IF EXISTS tasks_task_search_vector_idx",
+                "ALTER TABLE tasks_task DROP COLUMN IF EXISTS search_vector",
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0005_task_sync'),
+        ('tasks', '0006_task_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskTombstoneWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pruned_through', models.DateTimeField(help_text='Newest deletion time of a pruned tombstone')),
+            ],
+            options={
+                'verbose_name': 'Task tombstone watermark',
+                'verbose_name_plural': 'Task tombstone watermarks',
+            },
+        ),
+    ]
@@ -2,7 +2,7 @@
 Task Model
 """
 
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.utils import timezone
 
@@ -63,15 +63,70 @@ class Task(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Task'
         verbose_name_plural = 'Tasks'
+        # Shaped after the list, filter and statistics queries; keep them in
+        # step with `QUERY_PLAN_CHECKS` in the tests.
         indexes = [
+            # Own tasks newest first, page and cursor alike
+            models.Index(fields=['user', '-created_at', '-id'], name='task_user_created_idx'),
+            # Own tasks changed since a sync token (`/api/tasks/changes/`)
+            models.Index(fields=['user', 'updated_at', 'id'], name='task_user_updated_idx'),
+            # Own tasks ordered or filtered by due date
+            models.Index(fields=['user', 'due_date', 'id'], name='task_user_due_idx'),
+            # Counts filtered by completion status, from the index alone
             models.Index(fields=['user', 'completed']),
-            models.Index(fields=['created_at']),
+            # Overdue filter and count: only incomplete tasks with a due date
+            models.Index(
+                fields=['user', 'due_date'],
+                name='task_user_overdue_idx',
+                condition=models.Q(completed=False, due_date__isnull=False),
+            ),
+            # Admin views across all users
+            models.Index(fields=['-created_at', '-id'], name='task_created_idx'),
             models.Index(fields=['due_date']),
         ]
     
     def __str__(self):
         return f"{self.title} - {self.user.username}"
     
+    # Fields `TaskCounters` are derived from.
+    COUNTER_FIELDS = ('user_id', 'completed', 'priority', 'due_date')
+    
+    def counter_state(self):
+        """Return the values `TaskCounters` are derived from"""
+        return (self.user_id, self.completed, self.priority, self.due_date is not None)
+    
+    def stored_counter_state(self, using=None):
+        """
+        Return the counter state as stored in the database, None if the row
+        is gone, and lock the row until the transaction ends
+        
+        Counter deltas must start from the row as it is at write time: the
+        state it had when this instance was loaded may already have been
+        counted by a concurrent write.
+        """
+        row = (
+            Task.objects.db_manager(using).select_for_update()
+            .filter(pk=self.pk)
+            .values_list(*self.COUNTER_FIELDS)
+            .first()
+        )
+        return None if row is None else (*row[:3], row[3] is not None)
+    
+    def save(self, *args, **kwargs):
+        """Save task and keep the owner's `TaskCounters` in step"""
+        from .counters import apply_counter_deltas, state_deltas
+        
+        using = kwargs.get('using')
+        with transaction.atomic(using=using):
+            old_state = None if self._state.adding else self.stored_counter_state(using)
+            new_state = self.counter_state()
+            # Read by the post_save receivers as the state before this write
+            self._counter_state = old_state
+            super().save(*args, **kwargs)
+            if old_state != new_state:
+                apply_counter_deltas(state_deltas(old_state, new_state))
+        self._counter_state = new_state
+    
     @property
     def is_overdue(self):
         """Check if task is overdue"""
@@ -97,4 +152,150 @@ class Task(models.Model):
     def mark_as_incomplete(self):
         """Mark task as incomplete"""
         self.completed = False
-        self.save()
\ No newline at end of file
+        self.save()
+
+
+class TaskCounters(models.Model):
+    """
+    Denormalized per-user task counts
+
+    Maintained incrementally on every task write, so statistics never have
+    to scan the task table. Rebuild with `manage.py rebuild_task_counters`.
+    """
+    
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='task_counters',
+        help_text="User these counters belong to"
+    )
+    total = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    overdue_eligible = models.IntegerField(
+        default=0,
+        help_text="Incomplete tasks that have a due date"
+    )
+    low = models.IntegerField(default=0)
+    medium = models.IntegerField(default=0)
+    high = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    COUNT_FIELDS = ['total', 'completed', 'overdue_eligible', 'low', 'medium', 'high']
+    
+    class Meta:
+        verbose_name = 'Task counters'
+        verbose_name_plural = 'Task counters'
+    
+    def __str__(self):
+        return f"Task counters - {self.user_id}"
+    
+    def by_priority(self):
+        """Return task counts keyed by priority value"""
+        return {'LOW': self.low, 'MEDIUM': self.medium, 'HIGH': self.high}
+
+
+class TaskTombstone(models.Model):
+    """
+    Record of a deleted task, so that delta sync can tell clients to drop it
+
+    Kept for `TASK_TOMBSTONE_RETENTION_DAYS`. Prune with
+    `manage.py prune_task_tombstones`, which moves `TaskTombstoneWatermark`.
+    """
+    
+    task_id = models.BigIntegerField(help_text="Id of the deleted task")
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='task_tombstones',
+        help_text="Owner of the deleted task"
+    )
+    deleted_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        verbose_name = 'Task tombstone'
+        verbose_name_plural = 'Task tombstones'
+        indexes = [
+            # Own deletions since a sync token
+            models.Index(fields=['user', 'deleted_at', 'task_id'], name='tombstone_user_deleted_idx'),
+            # Pruning past the retention window
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Deleted task {self.task_id}"
+
+
+class TaskTombstoneWatermark(models.Model):
+    """
+    How far task tombstones have been pruned (a single row)
+
+    Sync tokens that do not reach past it may have missed a pruned
+    deletion and must sync from scratch; no row means nothing was pruned.
+    """
+    
+    pruned_through = models.DateTimeField(
+        help_text="Newest deletion time of a pruned tombstone"
+    )
+    
+    class Meta:
+        verbose_name = 'Task tombstone watermark'
+        verbose_name_plural = 'Task tombstone watermarks'
+    
+    def __str__(self):
+        return f"Tombstones pruned through {self.pruned_through}"
+
+
+class TaskImportJob(models.Model):
+    """
+    Progress of a streaming task import
+
+    `rows_processed` only advances in the same transaction as the batch it
+    covers, so a failed or interrupted job resumes exactly after the last
+    committed batch.
+    """
+    
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+    ]
+    FORMAT_CHOICES = [
+        ('ndjson', 'NDJSON'),
+        ('csv', 'CSV'),
+    ]
+    # Row errors kept on the job; the rest are only counted.
+    MAX_STORED_ERRORS = 100
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='task_import_jobs',
+        help_text="User who started the import; owner of rows without user_email"
+    )
+    source = models.CharField(
+        max_length=500,
+        help_text="Path of the file being imported"
+    )
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    assign_by_email = models.BooleanField(
+        default=False,
+        help_text="Assign rows to the user named in their user_email column"
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    rows_processed = models.PositiveIntegerField(default=0)
+    tasks_created = models.PositiveIntegerField(default=0)
+    rows_failed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Task import job'
+        verbose_name_plural = 'Task import jobs'
+    
+    def __str__(self):
+        return f"Import {self.pk} ({self.status})"
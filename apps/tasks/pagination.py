@@ -0,0 +1,169 @@
+"""
+Task Pagination
+"""
+
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import namedtuple
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+KeysetCursor = namedtuple('KeysetCursor', ['value', 'pk', 'reverse'])
+
+
+class TaskKeysetPagination(CursorPagination):
+    """
+    Keyset (seek) pagination for tasks
+
+    Pages are addressed by the ``(ordering field, id)`` pair of the last row
+    seen instead of an offset, so no ``COUNT(*)`` is issued, deep pages cost
+    the same as the first one and rows inserted concurrently never shift or
+    duplicate items between pages. Cursors are opaque to clients.
+    """
+
+    ordering = '-created_at'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    # Fields a keyset can be built on; `id` is always the tie-breaker.
+    keyset_fields = ('created_at', 'updated_at', 'due_date', 'priority')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_keyset_ordering(request, queryset, view)
+        self.field_name = self.ordering.lstrip('-')
+        self.descending = self.ordering.startswith('-')
+        self.model_field = queryset.model._meta.get_field(self.field_name)
+        self.nullable = self.model_field.null
+
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor.reverse if self.cursor else False
+
+        queryset = queryset.order_by(*self.get_order_by(reverse))
+        if self.cursor is not None:
+            queryset = queryset.filter(self.get_seek_filter(self.cursor))
+
+        # Fetch one extra row to find out whether another page follows.
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None and bool(self.page)
+
+        return self.page
+
+    def get_keyset_ordering(self, request, queryset, view):
+        """
+        Return the single ordering term the keyset is built on
+
+        Orderings on fields outside `keyset_fields` fall back to the
+        default ordering.
+        """
+        ordering = self.get_ordering(request, queryset, view)
+        term = ordering[0] if ordering else self.ordering
+        if term.lstrip('-') not in self.keyset_fields:
+            return self.ordering
+        return term
+
+    def get_order_by(self, reverse=False):
+        """Return the `order_by` terms for walking the keyset"""
+        descending = self.descending != reverse
+        if self.nullable:
+            # Nulls always sort after values when walking forwards.
+            nulls = {'nulls_first': True} if reverse else {'nulls_last': True}
+            expression = F(self.field_name)
+            expression = expression.desc(**nulls) if descending else expression.asc(**nulls)
+        else:
+            expression = f"{'-' if descending else ''}{self.field_name}"
+        return [expression, '-id' if descending else 'id']
+
+    def get_seek_filter(self, cursor):
+        """
+        Return a filter selecting the rows that follow `cursor` in the
+        direction it walks
+        """
+        descending = self.descending != cursor.reverse
+        lookup = 'lt' if descending else 'gt'
+        field = self.field_name
+
+        if cursor.value is None:
+            tail = Q(**{f'{field}__isnull': True, f'id__{lookup}': cursor.pk})
+            if cursor.reverse:
+                return Q(**{f'{field}__isnull': False}) | tail
+            return tail
+
+        seek = (
+            Q(**{f'{field}__{lookup}': cursor.value}) |
+            Q(**{field: cursor.value, f'id__{lookup}': cursor.pk})
+        )
+        if self.nullable and not cursor.reverse:
+            seek |= Q(**{f'{field}__isnull': True})
+        return seek
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.page:
+            return self.encode_cursor(self._get_cursor_from_instance(self.page[-1], reverse=False))
+        return self.encode_cursor(self.cursor._replace(reverse=False))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(self._get_cursor_from_instance(self.page[0], reverse=True))
+
+    def decode_cursor(self, request):
+        """
+        Given a request with a cursor, return a `KeysetCursor` instance.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            if payload['o'] != self.ordering:
+                raise ValueError('Cursor was issued for a different ordering')
+            value, pk = payload['p']
+            if value is not None:
+                value = self.model_field.to_python(value)
+            return KeysetCursor(value=value, pk=int(pk), reverse=bool(payload.get('r')))
+        except (TypeError, ValueError, KeyError, UnicodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, cursor):
+        """
+        Given a `KeysetCursor` instance, return an url with encoded cursor.
+        """
+        value = cursor.value
+        if value is not None:
+            value = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+        payload = {'o': self.ordering, 'p': [value, cursor.pk]}
+        if cursor.reverse:
+            payload['r'] = 1
+        encoded = urlsafe_b64encode(
+            json.dumps(payload, separators=(',', ':')).encode('ascii')
+        ).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def _get_cursor_from_instance(self, instance, reverse):
+        if isinstance(instance, dict):
+            value, pk = instance[self.field_name], instance['id']
+        else:
+            value, pk = getattr(instance, self.field_name), instance.pk
+        return KeysetCursor(value=value, pk=pk, reverse=reverse)
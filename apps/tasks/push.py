@@ -0,0 +1,514 @@
+"""
+Task Change Push
+
+Under ASGI, clients wait for changes to their tasks instead of polling
+the list: `/api/push/tasks/` streams them as Server-Sent Events (GET) or
+over a WebSocket (same path); `config.asgi` routes the path here. The
+access token goes in the `Authorization` header or, for the browser's
+`EventSource` and `WebSocket`, the `access_token` query parameter. A
+connection ends when its token expires.
+
+Every committed change to a user's tasks becomes the event
+`{"action": ..., "id": ...}`:
+- `created`, `updated`, `toggled` (completion changed) or `deleted`,
+  with the task id, for single-task writes;
+- `changed`, without an id, for bulk writes, imports and admin actions.
+Events tell the client what to fetch; `/api/tasks/changes/` remains the
+source of truth, and a client syncs with it when it (re)connects.
+
+Each process fans events out to its own connections from `hub`.
+`TASK_PUSH_BROKER` selects how events reach every process: `local` (this
+process only, enough for one worker), `redis` (Redis pub/sub at
+`TASK_PUSH_REDIS_URL`; needs `pip install redis`) or the dotted path of a
+broker class.
+
+Connections are served here rather than by Django views, so an idle one
+costs a coroutine and a small buffer: no thread, request or database
+connection. A connection buffers at most `TASK_PUSH_QUEUE_SIZE` events.
+One that falls further behind (slow network, stalled client) has its
+buffer replaced by a single `resync` event, and should then run a delta
+sync. Publishers never wait for connections.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+
+from apps.authentication.authentication import ClaimsJWTAuthentication, aget_user_state, count_auth_failure
+from apps.core.metrics import registry as metrics_registry
+
+
+logger = logging.getLogger(__name__)
+
+PUSH_PATH = '/api/push/tasks/'
+RESYNC = {'action': 'resync', 'id': None}
+
+# WebSocket close codes: token missing, invalid or expired; process full
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_TRY_AGAIN_LATER = 1013
+
+push_connections = metrics_registry.gauge(
+    'task_push_connections',
+    'Open task push connections, by transport (sse or websocket)',
+    ['transport'],
+)
+push_events = metrics_registry.counter(
+    'task_push_events_total',
+    'Task events written to push connections',
+)
+push_overflows = metrics_registry.counter(
+    'task_push_overflows_total',
+    'Events dropped from push connections that fell behind; each such connection gets a resync',
+)
+
+
+class Subscriber:
+    """A connection's bounded buffer of events, owned by its event loop"""
+
+    __slots__ = ('user_id', 'loop', 'expires_at', 'limit', 'events', 'waiter', 'behind', 'closed')
+
+    def __init__(self, user_id, loop, expires_at):
+        self.user_id = user_id
+        self.loop = loop
+        self.expires_at = expires_at
+        self.limit = settings.TASK_PUSH_QUEUE_SIZE
+        self.events = deque()
+        self.waiter = None
+        self.behind = False
+        self.closed = False
+
+    def put(self, event):
+        """Buffer `event`; called on `self.loop`"""
+        if self.behind:
+            # The pending resync covers it.
+            return
+        if len(self.events) >= self.limit:
+            if settings.METRICS:
+                push_overflows.inc(amount=len(self.events))
+            self.events.clear()
+            self.events.append(RESYNC)
+            self.behind = True
+        else:
+            self.events.append(event)
+        self.wake()
+
+    def close(self):
+        self.closed = True
+        self.wake()
+
+    def wake(self):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def get(self):
+        """
+        Return the buffered events; waits for one, or returns none when the
+        hub's heartbeat wakes the connection
+        """
+        if not self.events and not self.closed:
+            self.waiter = self.loop.create_future()
+            try:
+                await self.waiter
+            finally:
+                self.waiter = None
+        events = list(self.events)
+        self.events.clear()
+        self.behind = False
+        return events
+
+    @property
+    def expired(self):
+        return time.time() >= self.expires_at
+
+
+class PushHub:
+    """The subscribers of this process by user, and the broker feeding them"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+        self.count = 0
+        # event loop -> its heartbeat task
+        self.heartbeats = {}
+        self.broker = None
+        self.pid = None
+
+    def get_broker(self):
+        # A forked worker needs its own broker connection and listener.
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.broker = load_broker(self.dispatch)
+                    self.subscribers = {}
+                    self.count = 0
+                    self.heartbeats = {}
+                    self.pid = os.getpid()
+        return self.broker
+
+    def subscribe(self, user_id, expires_at):
+        """
+        Return a new `Subscriber` of `user_id` until `expires_at`, None when
+        the process is full
+        """
+        broker = self.get_broker()
+        loop = asyncio.get_running_loop()
+        subscriber = Subscriber(user_id, loop, expires_at)
+        with self.lock:
+            if self.count >= settings.TASK_PUSH_MAX_CONNECTIONS:
+                return None
+            self.subscribers.setdefault(user_id, set()).add(subscriber)
+            self.count += 1
+        heartbeat = self.heartbeats.get(loop)
+        if heartbeat is None or heartbeat.done():
+            self.heartbeats[loop] = loop.create_task(self.heartbeat(loop))
+        broker.listen()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            subscribers = self.subscribers.get(subscriber.user_id)
+            if subscribers is None or subscriber not in subscribers:
+                return
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self.subscribers[subscriber.user_id]
+            self.count -= 1
+
+    async def heartbeat(self, loop):
+        """
+        Wake every connection of `loop` each `TASK_PUSH_HEARTBEAT` seconds,
+        to keep idle streams alive and end those whose token expired
+
+        One task per loop, instead of a timer per connection: timers
+        cancelled on every event would pile up for the garbage collector.
+        """
+        while True:
+            await asyncio.sleep(settings.TASK_PUSH_HEARTBEAT)
+            with self.lock:
+                subscribers = [
+                    subscriber
+                    for group in self.subscribers.values()
+                    for subscriber in group
+                    if subscriber.loop is loop
+                ]
+            if not subscribers:
+                self.heartbeats.pop(loop, None)
+                return
+            # In slices, so events are not held up behind every ping.
+            for start in range(0, len(subscribers), 1000):
+                for subscriber in subscribers[start:start + 1000]:
+                    subscriber.wake()
+                await asyncio.sleep(0)
+
+    def dispatch(self, user_ids, event):
+        """
+        Hand `event` to the subscribers of `user_ids` (None: everyone);
+        safe from any thread
+        """
+        with self.lock:
+            if user_ids is None:
+                targets = [subscriber for group in self.subscribers.values() for subscriber in group]
+            else:
+                targets = [
+                    subscriber
+                    for user_id in user_ids
+                    for subscriber in self.subscribers.get(user_id, ())
+                ]
+        if not targets:
+            return
+
+        # One wake-up per event loop, not per subscriber.
+        by_loop = {}
+        for subscriber in targets:
+            by_loop.setdefault(subscriber.loop, []).append(subscriber)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        for loop, subscribers in by_loop.items():
+            if loop is running:
+                deliver(subscribers, event)
+            else:
+                try:
+                    loop.call_soon_threadsafe(deliver, subscribers, event)
+                except RuntimeError:
+                    # The loop has closed; its connections are gone.
+                    pass
+
+
+def deliver(subscribers, event):
+    for subscriber in subscribers:
+        subscriber.put(event)
+
+
+hub = PushHub()
+
+
+class LocalBroker:
+    """Events reach the connections of the publishing process only"""
+
+    def __init__(self, dispatch):
+        self.dispatch = dispatch
+
+    def publish(self, user_ids, event):
+        self.dispatch(user_ids, event)
+
+    def listen(self):
+        """Start receiving events for this process's connections"""
+
+
+class RedisBroker:
+    """
+    Events go through the Redis pub/sub channel `TASK_PUSH_REDIS_CHANNEL`,
+    which a thread per process relays to its connections
+
+    After losing Redis, the thread reconnects and sends every connection
+    a resync, since events published meanwhile are lost.
+    """
+
+    reconnect_delay = 1
+
+    def __init__(self, dispatch):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured('TASK_PUSH_BROKER "redis" needs the redis package (pip install redis).')
+        self.dispatch = dispatch
+        self.client = redis.Redis.from_url(settings.TASK_PUSH_REDIS_URL)
+        self.channel = settings.TASK_PUSH_REDIS_CHANNEL
+        self.lock = threading.Lock()
+        self.listener = None
+
+    def publish(self, user_ids, event):
+        self.client.publish(self.channel, json.dumps({'user_ids': sorted(user_ids), 'event': event}))
+
+    def listen(self):
+        if self.listener is not None:
+            return
+        with self.lock:
+            if self.listener is None:
+                self.listener = threading.Thread(target=self.run, name='task-push-redis', daemon=True)
+                self.listener.start()
+
+    def run(self):
+        lost = False
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                if lost:
+                    self.dispatch(None, RESYNC)
+                    lost = False
+                for message in pubsub.listen():
+                    payload = json.loads(message['data'])
+                    self.dispatch(payload['user_ids'], payload['event'])
+            except Exception:
+                logger.exception('Task push lost Redis; reconnecting')
+                lost = True
+                time.sleep(self.reconnect_delay)
+
+
+def load_broker(dispatch):
+    """Return the broker selected by `TASK_PUSH_BROKER`"""
+    name = settings.TASK_PUSH_BROKER
+    path = settings.TASK_PUSH_BROKER_CLASSES.get(name, name)
+    try:
+        broker_class = import_string(path)
+    except ImportError:
+        raise ImproperlyConfigured(f'Unknown TASK_PUSH_BROKER "{name}".')
+    return broker_class(dispatch)
+
+
+def publish(user_ids, action, task_id=None):
+    """Send a task event to the connections of `user_ids` in every process"""
+    try:
+        hub.get_broker().publish(user_ids, {'action': action, 'id': task_id})
+    except Exception:
+        # The change is committed; connections catch up on their next sync.
+        logger.exception('Publishing task event %s failed', action)
+
+
+def get_header(scope, name):
+    for key, value in scope.get('headers', ()):
+        if key == name:
+            return value
+    return None
+
+
+async def authenticate(scope):
+    """
+    Return `(user id, expires at)` for the access token of `scope`, or None
+
+    Same checks as `ClaimsJWTAuthentication.aauthenticate`; the database
+    is only read when the user's cached state is stale.
+    """
+    authentication = ClaimsJWTAuthentication()
+    try:
+        header = get_header(scope, b'authorization')
+        if header is not None:
+            raw_token = authentication.get_raw_token(header)
+        else:
+            query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+            raw_token = query.get('access_token', [None])[0]
+        if raw_token is None:
+            return None
+        validated_token = authentication.get_validated_token(raw_token)
+        user_id = authentication.get_user_id(validated_token)
+        state = await aget_user_state(user_id) if authentication.needs_state(validated_token) else None
+        # Rejects inactive users; only the id is kept for the connection.
+        user = authentication.build_user(validated_token, state)
+        return user.id, validated_token['exp']
+    except AuthenticationFailed as exc:
+        count_auth_failure('access', exc)
+        return None
+
+
+def encode_sse(events):
+    """One SSE body chunk for `events`; a comment keeps idle streams alive"""
+    if not events:
+        return b': ping\n\n'
+    return b''.join(b'data: ' + json.dumps(event).encode() + b'\n\n' for event in events)
+
+
+async def watch(receive, disconnect, subscriber):
+    """Close `subscriber` once the client sends `disconnect`"""
+    while (await receive())['type'] != disconnect:
+        pass
+    subscriber.close()
+
+
+def cors_headers(scope):
+    """CORS headers for cross-origin `EventSource`s of allowed origins"""
+    origin = get_header(scope, b'origin')
+    if origin is None or origin.decode('latin-1') not in settings.CORS_ALLOWED_ORIGINS:
+        return []
+    return [
+        (b'access-control-allow-origin', origin),
+        (b'access-control-allow-credentials', b'true'),
+        (b'vary', b'Origin'),
+    ]
+
+
+class PushRouter:
+    """
+    ASGI application serving task push at `PUSH_PATH` and passing every
+    other connection to `application`
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == PUSH_PATH:
+            return await self.serve_sse(scope, receive, send)
+        if scope['type'] == 'websocket' and scope['path'] == PUSH_PATH:
+            return await self.serve_websocket(scope, receive, send)
+        return await self.application(scope, receive, send)
+
+    async def serve_sse(self, scope, receive, send):
+        if scope['method'] == 'OPTIONS':
+            return await self.respond(send, 204, None, cors_headers(scope) + [
+                (b'access-control-allow-methods', b'GET'),
+                (b'access-control-allow-headers', b'authorization'),
+            ])
+        if scope['method'] != 'GET':
+            return await self.respond(send, 405, {'detail': 'Method not allowed.'}, [(b'allow', b'GET, OPTIONS')])
+
+        authenticated = await authenticate(scope)
+        if authenticated is None:
+            return await self.respond(
+                send, 401, {'detail': 'Authentication credentials were not provided or are invalid.'},
+                cors_headers(scope) + [(b'www-authenticate', b'Bearer realm="api"')],
+            )
+        subscriber = hub.subscribe(*authenticated)
+        if subscriber is None:
+            return await self.respond(
+                send, 503, {'detail': 'Too many push connections; try again later.'},
+                cors_headers(scope) + [(b'retry-after', b'30')],
+            )
+
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': cors_headers(scope) + [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                # Stop nginx from buffering the stream
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        # Flushes the headers through proxies.
+        await send({'type': 'http.response.body', 'body': b': connected\n\n', 'more_body': True})
+
+        if await self.stream(subscriber, 'sse', receive, 'http.disconnect', send, encode_sse):
+            await send({'type': 'http.response.body', 'body': b''})
+
+    async def serve_websocket(self, scope, receive, send):
+        message = await receive()
+        if message['type'] != 'websocket.connect':
+            return
+
+        authenticated = await authenticate(scope)
+        if authenticated is None:
+            return await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+        subscriber = hub.subscribe(*authenticated)
+        if subscriber is None:
+            return await send({'type': 'websocket.close', 'code': CLOSE_TRY_AGAIN_LATER})
+        await send({'type': 'websocket.accept'})
+
+        async def send_events(events):
+            # The server pings idle WebSockets; only events are sent.
+            for event in events:
+                await send({'type': 'websocket.send', 'text': json.dumps(event)})
+
+        # Messages from the client carry nothing.
+        if await self.stream(subscriber, 'websocket', receive, 'websocket.disconnect', send_events):
+            await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+
+    async def stream(self, subscriber, transport, receive, disconnect, send, encode=None):
+        """
+        Write the events of `subscriber` until the client disconnects (a
+        `disconnect` message on `receive`) or the token expires. `encode`
+        turns them into one SSE body chunk; without it `send` takes the
+        events themselves. Returns whether the client is still connected.
+        """
+        watcher = asyncio.ensure_future(watch(receive, disconnect, subscriber))
+        if settings.METRICS:
+            push_connections.inc((('transport', transport),))
+        try:
+            while True:
+                events = await subscriber.get()
+                if subscriber.closed or subscriber.expired:
+                    break
+                if encode is not None:
+                    await send({'type': 'http.response.body', 'body': encode(events), 'more_body': True})
+                elif events:
+                    await send(events)
+                if events and settings.METRICS:
+                    push_events.inc(amount=len(events))
+        finally:
+            connected = not watcher.done()
+            watcher.cancel()
+            hub.unsubscribe(subscriber)
+            if settings.METRICS:
+                push_connections.dec((('transport', transport),))
+        return connected
+
+    async def respond(self, send, status, data, headers=()):
+        body = b'' if data is None else json.dumps(data).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [*headers, (b'content-type', b'application/json')],
+        })
+        await send({'type': 'http.response.body', 'body': body})
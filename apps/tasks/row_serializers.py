@@ -0,0 +1,191 @@
+"""
+Read-only Task Row Serializers
+
+Compiled counterparts of `TaskListSerializer` and `TaskSerializer` for the
+hot read paths. They build the response straight from `values()` rows,
+skipping model instantiation and per-field serializer dispatch, and derive
+`status`/`is_overdue` from one `now` captured per request. Output is
+identical to the DRF serializers, which the tests and
+`manage.py bench_serializers` check.
+"""
+
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+
+def compile_datetime_format():
+    """
+    Return a function rendering datetimes exactly like DRF's `DateTimeField`
+
+    The output format and timezone are resolved once instead of per value;
+    anything but the common aware-datetime/strftime case takes DRF's path.
+    """
+    field = serializers.DateTimeField()
+    output_format = api_settings.DATETIME_FORMAT
+    field_timezone = field.default_timezone()
+    if output_format is None or output_format.lower() == ISO_8601 or field_timezone is None:
+        return field.to_representation
+
+    def format_datetime(value):
+        if not value:
+            return None
+        if value.tzinfo is None:
+            return field.to_representation(value)
+        return value.astimezone(field_timezone).strftime(output_format)
+    return format_datetime
+
+
+class TaskRowSerializer:
+    """
+    Row serializer producing `TaskSerializer` output
+    """
+
+    values = (
+        'id',
+        'title',
+        'description',
+        'completed',
+        'priority',
+        'due_date',
+        'created_at',
+        'updated_at',
+        'user__id',
+        'user__email',
+        'user__username',
+        'user__first_name',
+        'user__last_name',
+        'user__role',
+        'user__is_active',
+        'user__date_joined',
+    )
+
+    def __init__(self, now=None):
+        self.now = now or timezone.now()
+        self.format_datetime = compile_datetime_format()
+
+    def setup_queryset(self, queryset):
+        """Return `queryset` as rows carrying exactly the rendered columns"""
+        return queryset.values(*self.values)
+
+    def get_status(self, row):
+        """Same rules as `Task.status`, evaluated against `self.now`"""
+        if row['completed']:
+            return 'Completed'
+        if self.is_overdue(row):
+            return 'Overdue'
+        return 'Pending'
+
+    def is_overdue(self, row):
+        """Same rules as `Task.is_overdue`, evaluated against `self.now`"""
+        due_date = row['due_date']
+        return bool(due_date and not row['completed'] and self.now > due_date)
+
+    def to_representation(self, row):
+        format_datetime = self.format_datetime
+        first_name, last_name = row['user__first_name'], row['user__last_name']
+        return {
+            'id': row['id'],
+            'title': row['title'],
+            'description': row['description'],
+            'completed': row['completed'],
+            'priority': row['priority'],
+            'due_date': format_datetime(row['due_date']),
+            'status': self.get_status(row),
+            'is_overdue': self.is_overdue(row),
+            'user': {
+                'id': row['user__id'],
+                'email': row['user__email'],
+                'username': row['user__username'],
+                'first_name': first_name,
+                'last_name': last_name,
+                'full_name': f"{first_name} {last_name}".strip() or row['user__username'],
+                'role': row['user__role'],
+                'is_active': row['user__is_active'],
+                'date_joined': format_datetime(row['user__date_joined']),
+            },
+            'created_at': format_datetime(row['created_at']),
+            'updated_at': format_datetime(row['updated_at']),
+        }
+
+    def many(self, rows):
+        to_representation = self.to_representation
+        return [to_representation(row) for row in rows]
+
+
+class TaskListRowSerializer(TaskRowSerializer):
+    """
+    Row serializer producing `TaskListSerializer` output
+    """
+
+    values = (
+        'id',
+        'title',
+        'completed',
+        'priority',
+        'due_date',
+        'created_at',
+        'updated_at',
+        'user__email',
+    )
+
+    def to_representation(self, row):
+        format_datetime = self.format_datetime
+        return {
+            'id': row['id'],
+            'title': row['title'],
+            'completed': row['completed'],
+            'priority': row['priority'],
+            'status': self.get_status(row),
+            'user_email': row['user__email'],
+            'due_date': format_datetime(row['due_date']),
+            'created_at': format_datetime(row['created_at']),
+            'updated_at': format_datetime(row['updated_at']),
+        }
+
+
+class TaskExportRowSerializer(TaskRowSerializer):
+    """
+    Flat row serializer for NDJSON/CSV exports (and imports)
+    """
+
+    values = (
+        'id',
+        'title',
+        'description',
+        'completed',
+        'priority',
+        'due_date',
+        'created_at',
+        'updated_at',
+        'user__email',
+    )
+    columns = (
+        'id',
+        'title',
+        'description',
+        'completed',
+        'priority',
+        'status',
+        'is_overdue',
+        'due_date',
+        'user_email',
+        'created_at',
+        'updated_at',
+    )
+
+    def to_representation(self, row):
+        format_datetime = self.format_datetime
+        return {
+            'id': row['id'],
+            'title': row['title'],
+            'description': row['description'],
+            'completed': row['completed'],
+            'priority': row['priority'],
+            'status': self.get_status(row),
+            'is_overdue': self.is_overdue(row),
+            'due_date': format_datetime(row['due_date']),
+            'user_email': row['user__email'],
+            'created_at': format_datetime(row['created_at']),
+            'updated_at': format_datetime(row['updated_at']),
+        }
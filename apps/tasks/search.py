@@ -0,0 +1,266 @@
+"""
+Task Search Backends
+
+Full-text search over task title and description. The index lives in the
+database and is kept in sync by the database itself (SQLite FTS5 triggers,
+a Postgres generated `tsvector` column), so every write path - including
+bulk operations and `QuerySet.update` - is covered. Migration
+`0006_task_search_index` creates it.
+
+The index matches whole words and word prefixes: `foll` finds "Follow",
+`ollow` does not (plain `icontains` matching would).
+
+SQLite drops the triggers when a migration rebuilds the task table. After
+every `migrate`, `restore_search_triggers` puts back any that are missing
+and rebuilds the index they left stale; `manage.py rebuild_search_index`
+does the same on demand.
+
+Select a backend with `TASK_SEARCH_BACKEND`:
+    'auto'       full-text index of the current database when installed,
+                 otherwise plain `icontains` matching
+    'sqlite_fts' / 'postgres' / 'basic'
+"""
+
+import operator
+import re
+from functools import reduce
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
+from rest_framework.settings import api_settings
+
+from .models import Task
+
+
+TASK_TABLE = Task._meta.db_table
+
+
+class BasicSearchBackend:
+    """
+    Case-insensitive substring matching, as DRF's `SearchFilter` does
+    """
+
+    name = 'basic'
+    vendor = None
+    fields = ('title', 'description')
+    # Expression ordering results by relevance, None when unranked.
+    rank_ordering = None
+
+    def is_installed(self, connection):
+        return True
+
+    def install(self, connection, rebuild=False):
+        pass
+
+    def filter(self, queryset, terms):
+        # Every term must be in one of the fields.
+        for term in terms:
+            queryset = queryset.filter(reduce(operator.or_, (
+                Q(**{f'{field}__icontains': term}) for field in self.fields
+            )))
+        return queryset
+
+
+class SQLiteFTSBackend(BasicSearchBackend):
+    """
+    SQLite FTS5 external-content table ranked with bm25
+    """
+
+    name = 'sqlite_fts'
+    vendor = 'sqlite'
+    fts_table = f'{TASK_TABLE}_fts'
+    # bm25() is negative; more relevant rows sort first.
+    rank_ordering = 'search_rank'
+
+    def triggers(self):
+        table, fts = TASK_TABLE, self.fts_table
+        delete_old = (
+            f"INSERT INTO {fts}({fts}, rowid, title, description) "
+            f"VALUES ('delete', old.id, old.title, old.description);"
+        )
+        insert_new = (
+            f"INSERT INTO {fts}(rowid, title, description) "
+            f"VALUES (new.id, new.title, new.description);"
+        )
+        return {
+            f'{fts}_ai': f"AFTER INSERT ON {table} BEGIN {insert_new} END",
+            f'{fts}_ad': f"AFTER DELETE ON {table} BEGIN {delete_old} END",
+            f'{fts}_au': f"AFTER UPDATE OF title, description ON {table} BEGIN {delete_old} {insert_new} END",
+        }
+
+    def has_index(self, connection):
+        """Whether the FTS table exists, triggers or not"""
+        return self.fts_table in connection.introspection.table_names()
+
+    def is_installed(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE name = %s OR (type = 'trigger' AND tbl_name = %s)",
+                [self.fts_table, TASK_TABLE],
+            )
+            names = {row[0] for row in cursor.fetchall()}
+        return {self.fts_table, *self.triggers()} <= names
+
+    def install(self, connection, rebuild=False):
+        """
+        Create the FTS table and sync triggers if missing
+
+        Table rebuilds done by SQLite migrations drop triggers, so a missing
+        trigger forces a full index rebuild.
+        """
+        rebuild = rebuild or not self.is_installed(connection)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.fts_table} USING fts5("
+                f"title, description, content='{TASK_TABLE}', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+            for name, body in self.triggers().items():
+                cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+            if rebuild:
+                cursor.execute(f"INSERT INTO {self.fts_table}({self.fts_table}) VALUES ('rebuild')")
+
+    def filter(self, queryset, terms):
+        # Every term is quoted and prefix-matched; terms are ANDed.
+        match = ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+        fts = self.fts_table
+        # The rank is only computed when results are ordered by it.
+        return queryset.alias(search_rank=RawSQL(
+            f'SELECT bm25({fts}) FROM {fts} WHERE {fts} MATCH %s AND {fts}.rowid = {TASK_TABLE}.id',
+            [match],
+            output_field=FloatField(),
+        )).filter(id__in=RawSQL(f'SELECT rowid FROM {fts} WHERE {fts} MATCH %s', [match]))
+
+
+class PostgresSearchBackend(BasicSearchBackend):
+    """
+    Postgres generated `tsvector` column with a GIN index, ranked with ts_rank
+    """
+
+    name = 'postgres'
+    vendor = 'postgresql'
+    column = 'search_vector'
+    index = f'{TASK_TABLE}_search_vector_idx'
+    rank_ordering = '-search_rank'
+
+    def is_installed(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM information_schema.columns WHERE table_name = %s AND column_name = %s",
+                [TASK_TABLE, self.column],
+            )
+            return cursor.fetchone() is not None
+
+    def install(self, connection, rebuild=False):
+        # The generated column is recomputed by Postgres on every write.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"ALTER TABLE {TASK_TABLE} ADD COLUMN IF NOT EXISTS {self.column} tsvector "
+                f"GENERATED ALWAYS AS ("
+                f"setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+                f"setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+                f") STORED"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.index} ON {TASK_TABLE} USING GIN ({self.column})"
+            )
+
+    def filter(self, queryset, terms):
+        words = [word for term in terms for word in re.findall(r'\w+', term)]
+        if not words:
+            return queryset
+        tsquery = ' & '.join(f'{word}:*' for word in words)
+        return queryset.alias(search_rank=RawSQL(
+            f"ts_rank({TASK_TABLE}.{self.column}, to_tsquery('simple', %s))",
+            [tsquery],
+            output_field=FloatField(),
+        )).filter(RawSQL(
+            f"{TASK_TABLE}.{self.column} @@ to_tsquery('simple', %s)",
+            [tsquery],
+            output_field=BooleanField(),
+        ))
+
+
+SEARCH_BACKENDS = {
+    backend.name: backend
+    for backend in (BasicSearchBackend(), SQLiteFTSBackend(), PostgresSearchBackend())
+}
+
+_installed = {}
+
+
+def get_index_backend(connection):
+    """Return the full-text backend matching `connection`'s database"""
+    for backend in SEARCH_BACKENDS.values():
+        if backend.vendor == connection.vendor:
+            return backend
+    return SEARCH_BACKENDS['basic']
+
+
+def get_search_backend(using='default'):
+    """
+    Return the search backend to use for database alias `using`
+    """
+    connection = connections[using]
+    name = settings.TASK_SEARCH_BACKEND
+    if name != 'auto':
+        return SEARCH_BACKENDS[name]
+
+    key = (using, connection.vendor)
+    if key not in _installed:
+        backend = get_index_backend(connection)
+        _installed[key] = backend if backend.is_installed(connection) else SEARCH_BACKENDS['basic']
+    return _installed[key]
+
+
+def install_search_index(using='default', rebuild=False):
+    """
+    Install the full-text index for the database `using` if it has one
+
+    Returns the backend that was installed.
+    """
+    connection = connections[using]
+    backend = get_index_backend(connection)
+    backend.install(connection, rebuild=rebuild)
+    _installed.pop((using, connection.vendor), None)
+    return backend
+
+
+def restore_search_triggers(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    `post_migrate` receiver re-creating the FTS sync triggers of `using`
+    that a SQLite table rebuild dropped, and rebuilding the index
+
+    Databases without the index (e.g. migrated back before it) are left
+    alone.
+    """
+    if not router.allow_migrate(using, sender.label):
+        return
+    connection = connections[using]
+    backend = get_index_backend(connection)
+    if backend.vendor != 'sqlite' or not backend.has_index(connection) or backend.is_installed(connection):
+        return
+    install_search_index(using)
+
+
+class TaskSearchFilter(SearchFilter):
+    """
+    `SearchFilter` backed by the configured full-text index
+
+    Results are ordered by relevance unless the client asked for an explicit
+    `ordering`; must therefore run after `OrderingFilter`.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        backend = get_search_backend(queryset.db)
+        queryset = backend.filter(queryset, terms)
+        if backend.rank_ordering is not None and api_settings.ORDERING_PARAM not in request.query_params:
+            queryset = queryset.order_by(backend.rank_ordering, '-created_at')
+        return queryset
@@ -2,11 +2,21 @@
 Task Serializers
 """
 
+from django.conf import settings
 from rest_framework import serializers
-from .models import Task
+from .models import Task, TaskImportJob
 from apps.authentication.serializers import UserSerializer
 
 
+def validate_task_title(value):
+    """Shared title rules: not blank, at most 255 characters, stripped"""
+    if not value or value.strip() == '':
+        raise serializers.ValidationError("Title cannot be empty.")
+    if len(value) > 255:
+        raise serializers.ValidationError("Title cannot exceed 255 characters.")
+    return value.strip()
+
+
 class TaskSerializer(serializers.ModelSerializer):
     """
     Full Task Serializer with all fields
@@ -33,6 +43,14 @@ class TaskSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'user', 'created_at', 'updated_at', 'status', 'is_overdue']
     
+    @staticmethod
+    def setup_queryset(queryset):
+        """Load the owner in the same query as the task"""
+        return queryset.select_related('user').defer(
+            'user__password',
+            'user__last_login',
+        )
+    
     def validate_title(self, value):
         """Validate title is not empty"""
         if not value or value.strip() == '':
@@ -72,16 +90,12 @@ class TaskCreateSerializer(serializers.ModelSerializer):
     
     def validate_title(self, value):
         """Validate title"""
-        if not value or value.strip() == '':
-            raise serializers.ValidationError("Title cannot be empty.")
-        if len(value) > 255:
-            raise serializers.ValidationError("Title cannot exceed 255 characters.")
-        return value.strip()
+        return validate_task_title(value)
     
     def create(self, validated_data):
         """Create task with user from request"""
         request = self.context.get('request')
-        validated_data['user'] = request.user
+        validated_data['user_id'] = request.user.id
         return super().create(validated_data)
 
 
@@ -110,14 +124,51 @@ class TaskUpdateSerializer(serializers.ModelSerializer):
     def validate_title(self, value):
         """Validate title"""
         if value is not None:
-            if not value or value.strip() == '':
-                raise serializers.ValidationError("Title cannot be empty.")
-            if len(value) > 255:
-                raise serializers.ValidationError("Title cannot exceed 255 characters.")
-            return value.strip()
+            return validate_task_title(value)
         return value
 
 
+class TaskBulkUpdateSerializer(TaskUpdateSerializer):
+    """
+    Serializer for one item of a bulk update, identified by its `id`
+    """
+    
+    id = serializers.IntegerField()
+    
+    class Meta(TaskUpdateSerializer.Meta):
+        fields = ['id'] + TaskUpdateSerializer.Meta.fields
+    
+    def validate(self, attrs):
+        """Require `id` even though items are validated partially"""
+        if 'id' not in attrs:
+            raise serializers.ValidationError({'id': 'This field is required.'})
+        return attrs
+
+
+class TaskBulkSerializer(serializers.Serializer):
+    """
+    Envelope for bulk create and update requests
+    """
+    
+    # Items are validated one by one so a bad item only fails itself.
+    tasks = serializers.ListField(
+        allow_empty=False,
+        max_length=settings.TASK_BULK_MAX_ITEMS,
+    )
+
+
+class TaskBulkDeleteSerializer(serializers.Serializer):
+    """
+    Envelope for bulk delete requests
+    """
+    
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=settings.TASK_BULK_MAX_ITEMS,
+    )
+
+
 class TaskListSerializer(serializers.ModelSerializer):
     """
     Lightweight serializer for listing tasks
@@ -139,6 +190,20 @@ class TaskListSerializer(serializers.ModelSerializer):
             'created_at',
             'updated_at',
         ]
+    
+    @staticmethod
+    def setup_queryset(queryset):
+        """Fetch only the columns this serializer renders"""
+        return queryset.select_related('user').only(
+            'id',
+            'title',
+            'completed',
+            'priority',
+            'due_date',
+            'created_at',
+            'updated_at',
+            'user__email',
+        )
 
 
 class TaskStatusUpdateSerializer(serializers.ModelSerializer):
@@ -166,4 +231,52 @@ class TaskStatsSerializer(serializers.Serializer):
     completed_tasks = serializers.IntegerField()
     pending_tasks = serializers.IntegerField()
     overdue_tasks = serializers.IntegerField()
-    completion_rate = serializers.FloatField()
\ No newline at end of file
+    completion_rate = serializers.FloatField()
+    by_priority = serializers.DictField(child=serializers.IntegerField())
+    by_status = serializers.DictField(child=serializers.IntegerField())
+
+
+class TaskImportSerializer(serializers.Serializer):
+    """
+    Upload starting a task import job
+    """
+    
+    file = serializers.FileField()
+    format = serializers.ChoiceField(
+        choices=TaskImportJob.FORMAT_CHOICES,
+        required=False,
+        help_text="Defaults to the file extension (.csv, .ndjson or .jsonl)"
+    )
+    
+    def validate(self, attrs):
+        """Infer the format from the file name when it is not given"""
+        from .importer import infer_format
+        if 'format' not in attrs:
+            import_format = infer_format(attrs['file'].name)
+            if import_format is None:
+                raise serializers.ValidationError({'format': 'Cannot infer the format from the file name.'})
+            attrs['format'] = import_format
+        return attrs
+
+
+class TaskImportJobSerializer(serializers.ModelSerializer):
+    """
+    Serializer for task import job progress
+    """
+    
+    class Meta:
+        model = TaskImportJob
+        fields = [
+            'id',
+            'format',
+            'status',
+            'rows_processed',
+            'tasks_created',
+            'rows_failed',
+            'errors',
+            'message',
+            'created_at',
+            'updated_at',
+            'finished_at',
+        ]
+        read_only_fields = fields
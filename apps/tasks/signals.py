@@ -0,0 +1,137 @@
+"""
+Task Signals
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from .models import Task, TaskTombstone
+
+
+# Sent whenever tasks owned by `user_ids` were written. Bulk code paths that
+# bypass `Model.save` (e.g. `QuerySet.update`) must send it themselves.
+# Single-task writes also pass `action` and `task_id`.
+tasks_changed = Signal()
+
+_bulk_write = ContextVar('tasks_bulk_write', default=False)
+
+
+@contextmanager
+def bulk_task_write():
+    """
+    Silence the per-row task receivers for the duration of a bulk write
+
+    The caller takes over their work: it applies counter deltas in aggregate
+    and sends `tasks_changed` once for the whole batch.
+    """
+    token = _bulk_write.set(True)
+    try:
+        yield
+    finally:
+        _bulk_write.reset(token)
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def task_written(sender, instance, signal, created=False, **kwargs):
+    """Broadcast single task writes as `tasks_changed`"""
+    if _bulk_write.get():
+        return
+    if signal is post_delete:
+        action = 'deleted'
+    elif created:
+        action = 'created'
+    else:
+        # `Task.save` holds the stored state from before this write.
+        previous = getattr(instance, '_counter_state', None)
+        toggled = previous is not None and previous[1] != instance.completed
+        action = 'toggled' if toggled else 'updated'
+    tasks_changed.send(sender=Task, user_ids={instance.user_id}, action=action, task_id=instance.pk)
+
+
+@receiver(pre_delete, sender=Task)
+def task_deleting(sender, instance, origin=None, using=None, **kwargs):
+    """Capture (and lock) the stored counter state while the row still exists"""
+    # Deleting the owner cascades to their counters as well.
+    if _bulk_write.get() or getattr(origin, 'model', type(origin)) is not Task:
+        return
+    instance._counter_state = instance.stored_counter_state(using)
+
+
+@receiver(post_delete, sender=Task)
+def task_deleted(sender, instance, origin=None, **kwargs):
+    """Remove a deleted task from its owner's counters"""
+    from .counters import apply_counter_deltas, state_deltas
+    
+    if _bulk_write.get() or getattr(origin, 'model', type(origin)) is not Task:
+        return
+    state = getattr(instance, '_counter_state', None)
+    if state is not None:
+        apply_counter_deltas(state_deltas(state, None))
+
+
+@receiver(post_delete, sender=Task)
+def record_tombstone(sender, instance, origin=None, **kwargs):
+    """Leave a tombstone for delta sync (`apps.tasks.sync`)"""
+    if _bulk_write.get() or getattr(origin, 'model', type(origin)) is not Task:
+        return
+    TaskTombstone.objects.create(task_id=instance.pk, user_id=instance.user_id)
+
+
+@receiver(tasks_changed)
+def invalidate_stats(sender, user_ids, **kwargs):
+    """
+    Drop cached statistics of the affected users
+
+    Deferred until commit: dropping earlier would let a concurrent read
+    cache the counters from before the write.
+    """
+    from .stats import invalidate_task_stats
+    user_ids = set(user_ids)
+    transaction.on_commit(lambda: invalidate_task_stats(user_ids))
+
+
+@receiver(tasks_changed)
+def bump_versions(sender, user_ids, **kwargs):
+    """
+    Invalidate cached task responses of the affected users
+
+    Deferred until commit: bumping earlier would let a concurrent read
+    cache pre-commit data under the new version.
+    """
+    from .caching import bump_task_versions
+    user_ids = set(user_ids)
+    transaction.on_commit(lambda: bump_task_versions(user_ids))
+
+
+@receiver(tasks_changed)
+def pin_to_primary(sender, user_ids, **kwargs):
+    """
+    Read the affected users' tasks from the primary until replicas have
+    caught up, including writes made outside their requests (imports,
+    admin)
+    """
+    from apps.core.replicas import pin_users
+    pin_users(user_ids)
+
+
+@receiver(tasks_changed)
+def push_changes(sender, user_ids, action='changed', task_id=None, **kwargs):
+    """Push the change to the affected users' open connections once committed"""
+    from .push import publish
+    user_ids = set(user_ids)
+    transaction.on_commit(lambda: publish(user_ids, action, task_id))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_written(sender, instance, created, update_fields=None, **kwargs):
+    """Task responses embed their owner, so profile changes invalidate them"""
+    from .caching import bump_task_versions
+    if created or (update_fields and update_fields <= {'last_login', 'password'}):
+        return
+    transaction.on_commit(lambda: bump_task_versions({instance.pk}))
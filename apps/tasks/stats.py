@@ -0,0 +1,124 @@
+"""
+Task Statistics
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.core.metrics import count_cache_lookup
+from apps.core.replicas import read_replica
+
+from .models import Task, TaskCounters
+
+
+STATS_CACHE_KEY = 'tasks:stats:{}'
+ALL_USERS = 'all'
+
+
+def compute_task_stats(user=None, now=None):
+    """
+    Compute statistics for `user` (all users when None) from `TaskCounters`
+
+    Only the overdue count depends on the clock; it is counted from the task
+    table, and skipped entirely when no incomplete task has a due date.
+    """
+    counters, overdue_tasks = stats_querysets(user, now)
+    totals = counters.aggregate(**COUNTER_SUMS)
+    overdue = overdue_tasks.count() if totals['overdue_eligible'] else 0
+    return stats_from_totals(totals, overdue)
+
+
+async def acompute_task_stats(user=None, now=None):
+    """Async version of `compute_task_stats`"""
+    counters, overdue_tasks = stats_querysets(user, now)
+    totals = await counters.aaggregate(**COUNTER_SUMS)
+    overdue = await overdue_tasks.acount() if totals['overdue_eligible'] else 0
+    return stats_from_totals(totals, overdue)
+
+
+COUNTER_SUMS = {field: Coalesce(Sum(field), 0) for field in TaskCounters.COUNT_FIELDS}
+
+
+def stats_querysets(user=None, now=None):
+    """Return the counters and overdue task querysets scoped to `user`"""
+    now = now or timezone.now()
+    counters = TaskCounters.objects.all()
+    tasks = Task.objects.filter(completed=False, due_date__lt=now)
+    if user is not None:
+        counters = counters.filter(user_id=user.pk)
+        tasks = tasks.filter(user_id=user.pk)
+    return counters, tasks
+
+
+def stats_from_totals(totals, overdue):
+    """Build the statistics payload from aggregated `TaskCounters` totals"""
+    return build_stats(
+        total=totals['total'],
+        completed=totals['completed'],
+        overdue=overdue,
+        by_priority=TaskCounters(**{
+            field: totals[field] for field in TaskCounters.COUNT_FIELDS
+        }).by_priority(),
+    )
+
+
+def build_stats(total, completed, overdue, by_priority):
+    """Derive the full statistics payload from raw counts"""
+    pending = total - completed
+    completion_rate = (completed / total * 100) if total > 0 else 0
+    return {
+        'total_tasks': total,
+        'completed_tasks': completed,
+        'pending_tasks': pending,
+        'overdue_tasks': overdue,
+        'completion_rate': round(completion_rate, 2),
+        'by_priority': by_priority,
+        'by_status': {
+            'Completed': completed,
+            'Pending': pending - overdue,
+            'Overdue': overdue,
+        },
+    }
+
+
+def get_task_stats(user):
+    """
+    Return statistics for `user` (all tasks for admins), served from cache
+
+    Entries are dropped on any task write of the user (see `signals`) and
+    expire after `TASK_STATS_CACHE_TIMEOUT` seconds so overdue counts follow
+    the clock. Statistics read from a replica, which may predate the last
+    drop, are not cached.
+    """
+    key = stats_cache_key(user)
+    stats = count_cache_lookup('task_stats', cache.get(key))
+    if stats is None:
+        stats = compute_task_stats(None if user.is_admin else user)
+        if not read_replica():
+            cache.set(key, stats, settings.TASK_STATS_CACHE_TIMEOUT)
+    return stats
+
+
+async def aget_task_stats(user):
+    """Async version of `get_task_stats`"""
+    key = stats_cache_key(user)
+    stats = count_cache_lookup('task_stats', await cache.aget(key))
+    if stats is None:
+        stats = await acompute_task_stats(None if user.is_admin else user)
+        if not read_replica():
+            await cache.aset(key, stats, settings.TASK_STATS_CACHE_TIMEOUT)
+    return stats
+
+
+def stats_cache_key(user):
+    return STATS_CACHE_KEY.format(ALL_USERS if user.is_admin else user.pk)
+
+
+def invalidate_task_stats(user_ids):
+    """Drop cached statistics of `user_ids` and the admin-wide summary"""
+    keys = [STATS_CACHE_KEY.format(user_id) for user_id in user_ids]
+    keys.append(STATS_CACHE_KEY.format(ALL_USERS))
+    cache.delete_many(keys)
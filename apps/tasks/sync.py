@@ -0,0 +1,156 @@
+"""
+Task Delta Sync
+
+`GET /api/tasks/changes/?since=<token>` returns the user's tasks changed
+after a sync token and the ids of their tasks deleted after it, oldest
+first, plus the token to send next time. The work is proportional to the
+number of changes, not to the number of tasks.
+
+Changes form one stream ordered by `(timestamp, kind, id)`: tasks by
+`updated_at` (kind 0), tombstones by `deleted_at` (kind 1). A token is
+the position of the last change returned, plus the origin of the sync:
+the settle horizon of its first, from-scratch request.
+
+A timestamp is taken before its transaction commits, so a change may
+become visible after later-stamped ones. Only changes older than
+`TASK_SYNC_SETTLE_SECONDS` are returned, so that none is committed
+behind a token already handed out; it must exceed the longest task write
+transaction and the clock skew between servers.
+
+Tombstones are kept for `TASK_TOMBSTONE_RETENTION_DAYS`, and
+`prune_task_tombstones` records the newest deletion it pruned in
+`TaskTombstoneWatermark`. A token that does not reach past that
+watermark may have missed a deletion and is rejected with 410; the
+client then syncs from scratch (no token). A token reaches as far as
+its position or its origin, whichever is later: tasks deleted before a
+sync began were never in the client's copy. So a client paging through
+old tasks, or one that stayed idle while nothing was pruned, carries on.
+"""
+
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .models import Task, TaskTombstone, TaskTombstoneWatermark
+
+
+TASK, TOMBSTONE = 0, 1
+WATERMARK_ID = 1
+
+# `origin` is None on positions not yet handed out in a token
+SyncPosition = namedtuple('SyncPosition', ['timestamp', 'kind', 'id', 'origin'], defaults=[None])
+
+
+class SyncTokenExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = _('Sync token is older than the deletion history; sync from scratch.')
+    default_code = 'sync_token_expired'
+
+
+def encode_token(position):
+    origin = position.origin or position.timestamp
+    payload = [position.timestamp.isoformat(), position.kind, position.id, origin.isoformat()]
+    return urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode('ascii')).decode('ascii')
+
+
+def decode_token(token):
+    """Return the `SyncPosition` of `token`; None (from scratch) when empty"""
+    if not token:
+        return None
+    try:
+        timestamp, kind, pk, origin = json.loads(urlsafe_b64decode(token.encode('ascii')))
+        timestamp, origin = parse_datetime(timestamp), parse_datetime(origin)
+        if timestamp is None or origin is None or kind not in (TASK, TOMBSTONE):
+            raise ValueError('Malformed sync token')
+        position = SyncPosition(timestamp, kind, int(pk), origin)
+    except (TypeError, ValueError, UnicodeError):
+        raise ValidationError({'since': [_('Invalid sync token.')]})
+    watermark = pruned_through()
+    # Inclusive: a tombstone pruned at the token's own timestamp may come after it.
+    if watermark is not None and max(position.timestamp, position.origin) <= watermark:
+        raise SyncTokenExpired()
+    return position
+
+
+def pruned_through():
+    """Return the newest deletion time of a pruned tombstone, None if none was"""
+    return (
+        TaskTombstoneWatermark.objects.filter(pk=WATERMARK_ID)
+        .values_list('pruned_through', flat=True)
+        .first()
+    )
+
+
+def mark_pruned(deleted_at):
+    """Record that tombstones deleted up to `deleted_at` were pruned"""
+    # One upsert, so concurrent prunes do not collide creating the row.
+    TaskTombstoneWatermark.objects.bulk_create(
+        [TaskTombstoneWatermark(pk=WATERMARK_ID, pruned_through=deleted_at)],
+        update_conflicts=True,
+        unique_fields=['id'],
+        update_fields=['pruned_through'],
+    )
+
+
+def after(position, field, id_field, kind):
+    """Filter rows of `kind` that come after `position` in the stream"""
+    if position is None:
+        return Q()
+    later = Q(**{f'{field}__gt': position.timestamp})
+    if kind > position.kind:
+        return later | Q(**{field: position.timestamp})
+    if kind == position.kind:
+        return later | Q(**{field: position.timestamp, f'{id_field}__gt': position.id})
+    return later
+
+
+def get_changes(user, position, limit, row_serializer):
+    """
+    Return `(task rows, deleted ids, next position, has more)` for the
+    changes to the tasks of `user` after `position`, at most `limit`
+
+    Task rows are `row_serializer` rows, ready for `row_serializer.many`.
+    """
+    horizon = timezone.now() - timedelta(seconds=settings.TASK_SYNC_SETTLE_SECONDS)
+
+    tasks = row_serializer.setup_queryset(
+        Task.objects.filter(
+            after(position, 'updated_at', 'id', TASK),
+            user_id=user.id,
+            updated_at__lte=horizon,
+        )
+        .order_by('updated_at', 'id')
+    )[:limit + 1]
+    tombstones = (
+        TaskTombstone.objects.filter(
+            after(position, 'deleted_at', 'task_id', TOMBSTONE),
+            user_id=user.id,
+            deleted_at__lte=horizon,
+        )
+        .order_by('deleted_at', 'task_id')
+        .values_list('deleted_at', 'task_id')[:limit + 1]
+    )
+
+    # Merge both streams in `(timestamp, kind, id)` order.
+    stream = sorted(
+        [(SyncPosition(row['updated_at'], TASK, row['id']), row) for row in tasks]
+        + [(SyncPosition(deleted_at, TOMBSTONE, pk), pk) for deleted_at, pk in tombstones],
+        key=lambda item: item[0],
+    )
+    page, has_more = stream[:limit], len(stream) > limit
+
+    changed = [item for item_position, item in page if item_position.kind == TASK]
+    deleted = [item for item_position, item in page if item_position.kind == TOMBSTONE]
+    next_position = position
+    if page:
+        next_position = page[-1][0]._replace(origin=position.origin if position else horizon)
+    return changed, deleted, next_position, has_more
@@ -1,3 +1,1429 @@
-from django.test import TestCase
+"""
+Task API Tests
+"""
 
-# Create your tests here.
+import asyncio
+import csv
+import io
+import contextvars
+import json
+import re
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.management.sql import emit_post_migrate_signal
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.test import RequestFactory, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.authentication.authentication import _user_states, add_user_claims
+from apps.core import replicas
+from apps.core.openapi import generate_schema
+from apps.core.throttling import _local_store
+
+from . import push
+from .admin import TaskAdmin
+from .bulk import bulk_update_tasks
+from .counters import rebuild_counters, set_completed, verify_counters
+from .harness import generate_dataset
+from .importer import TaskImporter
+from .management.commands.bench_api import Command as BenchAPICommand
+from .models import Task, TaskCounters, TaskImportJob, TaskTombstone
+from .row_serializers import TaskListRowSerializer, TaskRowSerializer
+from .search import get_search_backend
+from .serializers import TaskListSerializer, TaskSerializer
+from .sync import TASK, SyncPosition, encode_token, pruned_through
+from .write_queue import PendingWrite, WriteQueue, run_write
+
+
+User = get_user_model()
+
+
+def bearer(user):
+    """Authorization header carrying a fresh access token of `user`"""
+    return f'Bearer {add_user_claims(AccessToken.for_user(user), user)}'
+
+
+class TaskTestCase(APITestCase):
+    """
+    Test case with empty caches and throttle buckets
+
+    Rolled back ids are handed out again, so state kept per user id in
+    caches or process memory must not outlive a test.
+    """
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        _user_states.clear()
+        _local_store.arrivals.clear()
+
+    def create_user(self, name, **extra_fields):
+        """Create a user without a usable password; nothing is hashed"""
+        return User.objects.create_user(email=f'{name}@example.com', username=name, **extra_fields)
+
+    def create_admin(self, name='admin'):
+        return User.objects.create_superuser(email=f'{name}@example.com', username=name)
+
+    def authenticate(self, user, client=None):
+        """Send the requests of `client` (the test client by default) as `user`"""
+        client = client or self.client
+        client.credentials(HTTP_AUTHORIZATION=bearer(user))
+        return client
+
+    def create_tasks(self, user, count, title='Task', **fields):
+        return [
+            Task.objects.create(user=user, title=f'{title} {index}', **fields)
+            for index in range(count)
+        ]
+
+
+class CursorPaginationTests(TaskTestCase):
+    """Keyset pagination of the task list (`pagination=cursor`)"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('alice')
+        self.authenticate(self.user)
+
+    def walk(self, url):
+        """Follow `next` links from `url`; returns the ids of every page"""
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([task['id'] for task in response.data['results']])
+            url = response.data['next']
+        return pages
+
+    def test_pages_cover_every_task_once_in_order(self):
+        tasks = self.create_tasks(self.user, 25)
+        pages = self.walk('/api/tasks/?pagination=cursor&page_size=10')
+
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        expected = [task.pk for task in sorted(tasks, key=lambda task: (task.created_at, task.pk), reverse=True)]
+        self.assertEqual([pk for page in pages for pk in page], expected)
+
+    def test_no_count_is_returned(self):
+        self.create_tasks(self.user, 3)
+        response = self.client.get('/api/tasks/?pagination=cursor')
+        self.assertNotIn('count', response.data)
+        self.assertIsNone(response.data['previous'])
+
+    def test_inserts_do_not_shift_pages(self):
+        self.create_tasks(self.user, 6)
+        first = self.client.get('/api/tasks/?pagination=cursor&page_size=3')
+        seen = [task['id'] for task in first.data['results']]
+        # A new task sorts first and would push an offset page back by one.
+        self.create_tasks(self.user, 1, title='New')
+        second = self.client.get(first.data['next'])
+        seen += [task['id'] for task in second.data['results']]
+
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), 6)
+
+    def test_previous_link_returns_the_page_before(self):
+        self.create_tasks(self.user, 7)
+        first = self.client.get('/api/tasks/?pagination=cursor&page_size=3')
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+
+    def test_nullable_ordering_walks_through_missing_due_dates(self):
+        now = timezone.now()
+        for days in (3, 1, 2):
+            self.create_tasks(self.user, 1, due_date=now + timedelta(days=days))
+        self.create_tasks(self.user, 3)
+        pages = self.walk('/api/tasks/?pagination=cursor&page_size=2&ordering=due_date')
+
+        ids = [pk for page in pages for pk in page]
+        due_dates = list(Task.objects.in_bulk(ids).values())
+        ordered = sorted(due_dates, key=lambda task: (task.due_date is None, task.due_date or now, task.pk))
+        self.assertEqual(ids, [task.pk for task in ordered])
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get('/api/tasks/?pagination=cursor&cursor=garbage')
+        self.assertEqual(response.status_code, 404)
+
+    def test_other_users_tasks_are_not_paged(self):
+        self.create_tasks(self.create_user('bob'), 4)
+        own = self.create_tasks(self.user, 2)
+        pages = self.walk('/api/tasks/?pagination=cursor')
+        self.assertCountEqual(pages[0], [task.pk for task in own])
+
+
+class TaskStatsTests(TaskTestCase):
+    """Task statistics, served from the counters and cached per user"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('alice')
+        self.authenticate(self.user)
+
+    def get_stats(self, client=None):
+        response = (client or self.client).get('/api/tasks/stats/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['data']
+
+    def test_counts_by_status_and_priority(self):
+        now = timezone.now()
+        self.create_tasks(self.user, 2, priority='HIGH', completed=True)
+        self.create_tasks(self.user, 1, priority='LOW', due_date=now - timedelta(days=1))
+        self.create_tasks(self.user, 1, due_date=now + timedelta(days=1))
+        self.create_tasks(self.create_user('bob'), 3)
+
+        stats = self.get_stats()
+        self.assertEqual(stats['total_tasks'], 4)
+        self.assertEqual(stats['completed_tasks'], 2)
+        self.assertEqual(stats['pending_tasks'], 2)
+        self.assertEqual(stats['overdue_tasks'], 1)
+        self.assertEqual(stats['completion_rate'], 50.0)
+        self.assertEqual(stats['by_priority'], {'LOW': 1, 'MEDIUM': 1, 'HIGH': 2})
+        self.assertEqual(stats['by_status'], {'Completed': 2, 'Pending': 1, 'Overdue': 1})
+
+    def test_admins_get_every_users_tasks(self):
+        self.create_tasks(self.user, 2)
+        self.create_tasks(self.create_user('bob'), 3)
+        admin_client = self.authenticate(self.create_admin(), self.client_class())
+        self.assertEqual(self.get_stats(admin_client)['total_tasks'], 5)
+
+    def test_no_tasks(self):
+        stats = self.get_stats()
+        self.assertEqual(stats['total_tasks'], 0)
+        self.assertEqual(stats['completion_rate'], 0)
+
+    def test_cache_is_dropped_once_the_write_commits(self):
+        self.assertEqual(self.get_stats()['total_tasks'], 0)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.create_tasks(self.user, 1)
+            # Until the write commits, readers keep getting the cached stats
+            # rather than caching the uncommitted ones.
+            self.assertEqual(self.get_stats()['total_tasks'], 0)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.get_stats()['total_tasks'], 1)
+
+
+    def test_admin_actions_drop_the_owners_cache(self):
+        self.create_tasks(self.user, 2)
+        self.assertEqual(self.get_stats()['completed_tasks'], 0)
+        task_admin = TaskAdmin(Task, admin.site)
+        request = RequestFactory().post('/admin/tasks/task/')
+        with mock.patch.object(task_admin, 'message_user'), self.captureOnCommitCallbacks(execute=True):
+            task_admin.mark_as_completed(request, Task.objects.all())
+        self.assertEqual(self.get_stats()['completed_tasks'], 2)
+
+
+class TaskCountersTests(TaskTestCase):
+    """`TaskCounters` stay equal to what the task table holds"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('alice')
+
+    def assertCountersMatch(self):
+        self.assertEqual(verify_counters(), {})
+
+    def counters(self, user=None):
+        return TaskCounters.objects.get(user=user or self.user)
+
+    def test_single_task_writes(self):
+        task, other = self.create_tasks(self.user, 2, priority='HIGH', due_date=timezone.now())
+        self.assertEqual((self.counters().total, self.counters().high, self.counters().overdue_eligible), (2, 2, 2))
+
+        task.completed = True
+        task.priority = 'LOW'
+        task.save()
+        counters = self.counters()
+        self.assertEqual((counters.completed, counters.overdue_eligible, counters.low), (1, 1, 1))
+
+        other.delete()
+        self.assertEqual(self.counters().total, 1)
+        self.assertCountersMatch()
+
+    def test_stale_instances_do_not_count_a_change_twice(self):
+        (task,) = self.create_tasks(self.user, 1, due_date=timezone.now())
+        first, second = Task.objects.get(pk=task.pk), Task.objects.get(pk=task.pk)
+        first.completed = second.completed = True
+        first.save()
+        second.save()
+
+        counters = self.counters()
+        self.assertEqual((counters.completed, counters.overdue_eligible), (1, 0))
+        self.assertCountersMatch()
+
+    def test_deleting_a_stale_instance(self):
+        (task,) = self.create_tasks(self.user, 1)
+        stale = Task.objects.get(pk=task.pk)
+        task.completed = True
+        task.save()
+        stale.delete()
+
+        self.assertEqual(self.counters().completed, 0)
+        self.assertCountersMatch()
+
+    def test_owner_change_moves_the_task(self):
+        (task,) = self.create_tasks(self.user, 1)
+        bob = self.create_user('bob')
+        task.user = bob
+        task.save()
+        self.assertEqual((self.counters().total, self.counters(bob).total), (0, 1))
+
+    def test_set_completed_counts_only_tasks_that_flip(self):
+        self.create_tasks(self.user, 2, due_date=timezone.now())
+        self.create_tasks(self.user, 1, completed=True)
+
+        self.assertEqual(set_completed(Task.objects.all(), True), 2)
+        self.assertEqual(set_completed(Task.objects.all(), True), 0)
+        self.assertEqual(self.counters().completed, 3)
+        self.assertCountersMatch()
+
+    def test_bulk_update(self):
+        done, todo = self.create_tasks(self.user, 2)
+        done.completed = True
+        done.save()
+        bulk_update_tasks(Task.objects.all(), [
+            (0, {'id': done.pk, 'completed': True, 'priority': 'HIGH'}),
+            (1, {'id': todo.pk, 'completed': True}),
+        ])
+        counters = self.counters()
+        self.assertEqual((counters.completed, counters.high, counters.medium), (2, 1, 1))
+        self.assertCountersMatch()
+
+    def test_rebuild_repairs_drift(self):
+        self.create_tasks(self.user, 3)
+        TaskCounters.objects.filter(user=self.user).update(total=10)
+        self.assertNotEqual(verify_counters(), {})
+        rebuild_counters()
+        self.assertCountersMatch()
+
+
+class BulkTaskTests(TaskTestCase):
+    """`/api/tasks/bulk/`: per-item results, one transaction per batch"""
+
+    url = '/api/tasks/bulk/'
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('alice')
+        self.authenticate(self.user)
+
+    def results(self, response):
+        return [(result['index'], result['status']) for result in response.data['data']['results']]
+
+    def test_create(self):
+        response = self.client.post(self.url, {'tasks': [
+            {'title': 'One'},
+            {'title': 'Two', 'priority': 'HIGH'},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.results(response), [(0, 'created'), (1, 'created')])
+        self.assertEqual(Task.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(verify_counters(), {})
+
+    def test_invalid_items_only_fail_themselves(self):
+        response = self.client.post(self.url, {'tasks': [
+            {'title': 'Good'},
+            {'title': ''},
+            'not an object',
+            {'title': 'Bad priority', 'priority': 'URGENT'},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(self.results(response), [(0, 'created'), (1, 'error'), (2, 'error'), (3, 'error')])
+        self.assertEqual(list(Task.objects.values_list('title', flat=True)), ['Good'])
+
+    def test_every_item_invalid(self):
+        response = self.client.post(self.url, {'tasks': [{'title': ''}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Task.objects.exists())
+
+    def test_empty_batch_is_rejected(self):
+        response = self.client.post(self.url, {'tasks': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_update_reaches_own_tasks_only(self):
+        (own,) = self.create_tasks(self.user, 1)
+        (foreign,) = self.create_tasks(self.create_user('bob'), 1)
+        response = self.client.patch(self.url, {'tasks': [
+            {'id': own.pk, 'completed': True},
+            {'id': foreign.pk, 'completed': True},
+            {'completed': True},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(self.results(response), [(0, 'updated'), (1, 'error'), (2, 'error')])
+        own.refresh_from_db()
+        foreign.refresh_from_db()
+        self.assertTrue(own.completed)
+        self.assertFalse(foreign.completed)
+        self.assertEqual(verify_counters(), {})
+
+    def test_delete_leaves_tombstones(self):
+        tasks = self.create_tasks(self.user, 2)
+        response = self.client.delete(self.url, {'ids': [tasks[0].pk, tasks[0].pk + 1000]}, format='json')
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(self.results(response), [(0, 'deleted'), (1, 'error')])
+        self.assertEqual(list(Task.objects.values_list('pk', flat=True)), [tasks[1].pk])
+        self.assertEqual(list(TaskTombstone.objects.values_list('task_id', flat=True)), [tasks[0].pk])
+        self.assertEqual(verify_counters(), {})
+
+
+class TaskExportTests(TaskTestCase):
+    """`/api/tasks/export/<format>/`: streamed, filtered like the list"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('alice')
+        self.authenticate(self.user)
+        self.create_tasks(self.user, 2)
+        self.create_tasks(self.user, 1, title='Done', completed=True)
+        self.create_tasks(self.create_user('bob'), 1, title='Foreign')
+
+    def export(self, export_format, **params):
+        response = self.client.get(f'/api/tasks/export/{export_format}/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson(self):
+        rows = [json.loads(line) for line in self.export('ndjson').splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Task 0', 'Task 1', 'Done 0'])
+        self.assertEqual([row['completed'] for row in rows], [False, False, True])
+
+    def test_csv(self):
+        rows = list(csv.DictReader(io.StringIO(self.export('csv'))))
+        self.assertEqual([row['title'] for row in rows], ['Task 0', 'Task 1', 'Done 0'])
+        self.assertEqual([row['completed'] for row in rows], ['false', 'false', 'true'])
+
+    def test_list_filters_apply(self):
+        rows = [json.loads(line) for line in self.export('ndjson', completed='true').splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Done 0'])
+
+    def test_no_tasks_leaves_only_the_csv_header(self):
+        self.assertEqual(len(self.export('csv', priority='HIGH').splitlines()), 1)
+        self.assertEqual(self.export('ndjson', priority='HIGH'), '')
+
+    def test_admins_export_every_users_tasks(self):
+        self.authenticate(self.create_admin())
+        self.assertEqual(len(self.export('ndjson').splitlines()), 4)
+
+    def test_unknown_format_is_not_found(self):
+        response = self.client.get('/api/tasks/export/xml/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_schema_generation_documents_the_export(self):
+        with self.assertNoLogs('drf_yasg.inspectors', 'WARNING'):
+            schema = json.loads(generate_schema())
+        operation = schema['paths']['/tasks/export/{export_format}/']['get']
+        self.assertEqual(operation['responses']['200']['schema'], {'type': 'file'})
+
+
+class TaskImportTests(TaskTestCase):
+    """Streaming imports: batched, validated, resumable"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('alice')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def create_job(self, content, import_format='ndjson', **fields):
+        source = self.directory / f'import.{import_format}'
+        source.write_text(content, encoding='utf-8')
+        return TaskImportJob.objects.create(user=self.user, source=str(source), format=import_format, **fields)
+
+    def ndjson(self, *items):
+        return ''.join(f'{json.dumps(item)}\n' for item in items)
+
+    def test_ndjson(self):
+        job = self.create_job(self.ndjson({'title': 'One'}, {'title': 'Two', 'priority': 'HIGH'}))
+        TaskImporter(job, batch_size=1).run()
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_processed, job.tasks_created, job.rows_failed), ('COMPLETED', 2, 2, 0))
+        self.assertEqual(list(Task.objects.order_by('id').values_list('title', 'priority', 'user')), [
+            ('One', 'MEDIUM', self.user.pk),
+            ('Two', 'HIGH', self.user.pk),
+        ])
+        self.assertEqual(verify_counters(), {})
+
+    def test_csv_round_trips_the_export(self):
+        self.create_tasks(self.user, 1, title='Exported', completed=True, priority='LOW')
+        self.authenticate(self.user)
+        response = self.client.get('/api/tasks/export/csv/')
+        job = self.create_job(b''.join(response.streaming_content).decode(), 'csv')
+        TaskImporter(job).run()
+
+        self.assertEqual(
+            list(Task.objects.order_by('id').values_list('title', 'completed', 'priority')),
+            [('Exported 0', True, 'LOW')] * 2,
+        )
+
+    def test_invalid_rows_are_reported(self):
+        job = self.create_job('{"title": "Good"}\nnot json\n{"title": ""}\n')
+        TaskImporter(job).run()
+
+        job.refresh_from_db()
+        self.assertEqual((job.rows_processed, job.tasks_created, job.rows_failed), (3, 1, 2))
+        self.assertEqual([error['row'] for error in job.errors], [2, 3])
+
+    def test_rows_are_assigned_by_email(self):
+        bob = self.create_user('bob')
+        job = self.create_job(
+            self.ndjson({'title': 'Own'}, {'title': 'Bob', 'user_email': bob.email}, {'title': 'Nobody', 'user_email': 'x@example.com'}),
+            assign_by_email=True,
+        )
+        TaskImporter(job).run()
+
+        self.assertEqual(dict(Task.objects.values_list('title', 'user')), {'Own': self.user.pk, 'Bob': bob.pk})
+        self.assertEqual(TaskImportJob.objects.get(pk=job.pk).errors, [
+            {'row': 3, 'errors': {'user_email': ['No user with this email.']}},
+        ])
+
+    def test_failed_batch_leaves_the_job_at_the_last_commit(self):
+        job = self.create_job(self.ndjson(*({'title': f'Row {index}'} for index in range(4))))
+        importer = TaskImporter(job, batch_size=2)
+        with mock.patch('apps.tasks.importer.create_tasks', side_effect=[{self.user.pk}, Exception('Lost')]):
+            with self.assertRaises(Exception):
+                importer.run()
+
+        stored = TaskImportJob.objects.get(pk=job.pk)
+        for current in (job, stored):
+            self.assertEqual((current.rows_processed, current.tasks_created), (2, 2))
+        self.assertEqual((stored.status, stored.message), ('FAILED', 'Lost'))
+
+    def test_resumes_after_the_last_committed_batch(self):
+        job = self.create_job(self.ndjson(*({'title': f'Row {index}'} for index in range(4))), rows_processed=2, tasks_created=2)
+        TaskImporter(job, batch_size=2).run()
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_processed, job.tasks_created), ('COMPLETED', 4, 4))
+        self.assertEqual(list(Task.objects.order_by('id').values_list('title', flat=True)), ['Row 2', 'Row 3'])
+
+    def test_upload_starts_a_job_after_commit(self):
+        self.authenticate(self.user)
+        upload = SimpleUploadedFile('tasks.jsonl', self.ndjson({'title': 'Uploaded'}).encode())
+        with override_settings(MEDIA_ROOT=self.directory), \
+                mock.patch('apps.tasks.importer.run_import_job') as run_import_job, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/tasks/import/', {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, 202)
+        job = TaskImportJob.objects.get(pk=response.data['data']['id'])
+        self.assertEqual((job.format, job.status, job.assign_by_email), ('ndjson', 'PENDING', False))
+        self.assertTrue(Path(job.source).is_relative_to(self.directory))
+        run_import_job.assert_called_once_with(job.pk)
+
+    def test_unknown_extension_needs_a_format(self):
+        self.authenticate(self.user)
+        upload = SimpleUploadedFile('tasks.txt', b'{"title": "x"}\n')
+        response = self.client.post('/api/tasks/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(TaskImportJob.objects.exists())
+
+
+# One time bucket, so ETags only change with the data.
+@override_settings(TASK_ETAG_BUCKET_SECONDS=0)
+class ConditionalTaskResponseTests(TaskTestCase):
+    """ETags, `304 Not Modified` and the response cache of task reads"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('alice')
+        (self.task,) = self.create_tasks(self.user, 1)
+        self.authenticate(self.user)
+
+    def etag(self, url='/api/tasks/', client=None):
+        response = (client or self.client).get(url)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_if_none_match_is_answered_without_queries(self):
+        for url in ('/api/tasks/', f'/api/tasks/{self.task.pk}/'):
+            response = self.client.get(url)
+            self.assertIn('private', response['Cache-Control'])
+            with self.assertNumQueries(0):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+            self.assertFalse(response.content)
+
+    def test_repeated_reads_come_from_the_response_cache(self):
+        first = self.client.get('/api/tasks/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/tasks/')
+        self.assertEqual(second.json(), first.json())
+
+    def test_writes_change_the_etag_once_committed(self):
+        etag = self.etag()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.patch(f'/api/tasks/{self.task.pk}/', {'title': 'Renamed'}, format='json')
+            self.assertEqual(self.etag(), etag)
+        for callback in callbacks:
+            callback()
+
+        response = self.client.get('/api/tasks/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['title'], 'Renamed')
+
+    def test_other_users_writes_only_change_the_admin_etag(self):
+        admin_client = self.authenticate(self.create_admin(), self.client_class())
+        etag, admin_etag = self.etag(), self.etag(client=admin_client)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_tasks(self.create_user('bob'), 1)
+
+        self.assertEqual(self.etag(), etag)
+        self.assertNotEqual(self.etag(client=admin_client), admin_etag)
+
+    def test_urls_have_their_own_etags(self):
+        self.assertNotEqual(self.etag('/api/tasks/'), self.etag('/api/tasks/?completed=false'))
+
+    def test_errors_are_not_cached(self):
+        (foreign,) = self.create_tasks(self.create_user('bob'), 1)
+        response = self.client.get(f'/api/tasks/{foreign.pk}/')
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response)
+
+
+class AsyncTaskViewTests(TaskTestCase):
+    """`/api/async/tasks/` answers exactly like `/api/tasks/`"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('alice')
+        now = timezone.now()
+        self.tasks = self.create_tasks(self.user, 12, due_date=now + timedelta(days=1))
+        self.create_tasks(self.create_user('bob'), 1)
+        self.authenticate(self.user)
+
+    def assertSameResponse(self, path):
+        synchronous = self.client.get(f'/api/tasks/{path}')
+        asynchronous = self.client.get(f'/api/async/tasks/{path}')
+        self.assertEqual(asynchronous.status_code, synchronous.status_code)
+        # Pagination links point back at the endpoint that served them.
+        body = asynchronous.content.decode().replace('/api/async/tasks/', '/api/tasks/')
+        self.assertEqual(json.loads(body), synchronous.json())
+        return asynchronous
+
+    def test_list(self):
+        for path in ('', '?page=2', '?completed=false&ordering=due_date', '?pagination=cursor', '?search=task'):
+            with self.subTest(path=path):
+                self.assertSameResponse(path)
+
+    def test_detail(self):
+        self.assertSameResponse(f'{self.tasks[0].pk}/')
+
+    def test_stats(self):
+        self.assertSameResponse('stats/')
+
+    def test_writes_need_no_csrf_token(self):
+        client = self.authenticate(self.user, APIClient(enforce_csrf_checks=True))
+        task = self.tasks[0]
+        for path in (f'/api/tasks/{task.pk}/toggle/', f'/api/async/tasks/{task.pk}/toggle/'):
+            with self.subTest(path=path):
+                response = client.post(path)
+                self.assertEqual(response.status_code, 200)
+
+    def test_not_found(self):
+        foreign = Task.objects.exclude(user=self.user).get()
+        self.assertEqual(self.assertSameResponse(f'{foreign.pk}/').status_code, 404)
+        self.assertEqual(self.assertSameResponse('?page=9').status_code, 404)
+
+    def test_anonymous_requests_are_rejected(self):
+        self.client.credentials()
+        response = self.client.get('/api/async/tasks/')
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('WWW-Authenticate', response)
+
+    def test_if_none_match(self):
+        response = self.client.get('/api/async/tasks/')
+        response = self.client.get('/api/async/tasks/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_toggle(self):
+        task = self.tasks[0]
+        response = self.client.post(f'/api/async/tasks/{task.pk}/toggle/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['data']['completed'])
+        task.refresh_from_db()
+        self.assertTrue(task.completed)
+        self.assertEqual(verify_counters(), {})
+
+
+@override_settings(REST_FRAMEWORK={
+    **settings.REST_FRAMEWORK,
+    'DEFAULT_THROTTLE_RATES': {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], 'task_write': '2/min'},
+})
+class TaskWriteThrottleTests(TaskTestCase):
+    """Task writes are throttled per user; reads are not"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('alice')
+        self.authenticate(self.user)
+
+    def create(self, client=None):
+        return (client or self.client).post('/api/tasks/', {'title': 'Throttled'}, format='json')
+
+    def test_writes_per_user(self):
+        self.assertEqual([self.create().status_code for _ in range(3)], [201, 201, 429])
+        self.assertIn('Retry-After', self.create())
+        other = self.authenticate(self.create_user('bob'), self.client_class())
+        self.assertEqual(self.create(other).status_code, 201)
+
+    def test_reads_are_not_throttled(self):
+        for _ in range(3):
+            self.create()
+        self.assertEqual(self.client.get('/api/tasks/').status_code, 200)
+        self.assertEqual(self.client.get('/api/async/tasks/stats/').status_code, 200)
+        task = Task.objects.first()
+        self.assertEqual(self.client.post(f'/api/async/tasks/{task.pk}/toggle/').status_code, 429)
+
+
+request_label = contextvars.ContextVar('request_label', default=None)
+
+
+@override_settings(TASK_WRITE_QUEUE=True, TASK_WRITE_QUEUE_WINDOW=50)
+class WriteQueueTests(TransactionTestCase):
+    """Group commit of single-task writes (`TASK_WRITE_QUEUE`)"""
+
+    client_class = APIClient
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        _user_states.clear()
+        _local_store.arrivals.clear()
+        self.user = User.objects.create_user(email='alice@example.com', username='alice')
+
+    def create_task(self, title):
+        return lambda: Task.objects.create(user=self.user, title=title)
+
+    def test_writes_run_on_the_committer_thread(self):
+        def create():
+            return threading.current_thread().name, Task.objects.create(user=self.user, title='Queued')
+
+        thread_name, task = run_write(create)
+        self.assertEqual(thread_name, 'task-write-queue')
+        self.assertTrue(Task.objects.filter(pk=task.pk).exists())
+        self.assertEqual(verify_counters(), {})
+
+    def test_api_writes_are_committed_before_responding(self):
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.user))
+        response = self.client.post('/api/tasks/', {'title': 'Queued'}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Task.objects.get().title, 'Queued')
+
+    def test_queued_writes_are_batched(self):
+        write_queue = WriteQueue()
+        for title in ('One', 'Two', 'Three'):
+            write_queue.queue.put(PendingWrite(self.create_task(title)))
+        with override_settings(TASK_WRITE_QUEUE_MAX_BATCH=2):
+            self.assertEqual(len(write_queue.take_batch()), 2)
+        self.assertEqual(len(write_queue.take_batch()), 1)
+
+    def test_failing_writes_only_fail_themselves(self):
+        def fail():
+            Task.objects.create(user=self.user, title='Rolled back')
+            raise ValueError('Invalid')
+
+        batch = [PendingWrite(self.create_task('One')), PendingWrite(fail), PendingWrite(self.create_task('Two'))]
+        WriteQueue().commit(batch)
+
+        self.assertEqual(batch[0].future.result().title, 'One')
+        with self.assertRaisesMessage(ValueError, 'Invalid'):
+            batch[1].future.result()
+        self.assertEqual(sorted(Task.objects.values_list('title', flat=True)), ['One', 'Two'])
+        self.assertEqual(verify_counters(), {})
+
+    def test_writes_see_the_submitters_context(self):
+        token = request_label.set('alice')
+        try:
+            self.assertEqual(run_write(request_label.get), 'alice')
+        finally:
+            request_label.reset(token)
+
+    def test_writes_inside_a_transaction_run_inline(self):
+        with transaction.atomic():
+            self.assertIs(run_write(threading.current_thread), threading.current_thread())
+
+
+@override_settings(TASK_SYNC_SETTLE_SECONDS=0, TASK_TOMBSTONE_RETENTION_DAYS=30)
+class DeltaSyncTests(TaskTestCase):
+    """`/api/tasks/changes/`: changes after a sync token, 410 past pruned deletions"""
+
+    url = '/api/tasks/changes/'
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('alice')
+        self.authenticate(self.user)
+
+    def changes(self, since=None, **params):
+        if since:
+            params['since'] = since
+        return self.client.get(self.url, params)
+
+    def sync(self, since=None, limit=100):
+        """Page until `has_more` is false; return changed ids, deleted ids and the last token"""
+        changed, deleted = [], []
+        while True:
+            response = self.changes(since, limit=limit)
+            self.assertEqual(response.status_code, 200, response.data)
+            changed += [task['id'] for task in response.data['changed']]
+            deleted += response.data['deleted']
+            since = response.data['next']
+            if not response.data['has_more']:
+                return changed, deleted, since
+
+    def old_token(self, days):
+        """Token of a sync that began and ended `days` ago"""
+        then = timezone.now() - timedelta(days=days)
+        return encode_token(SyncPosition(then, TASK, 0, then))
+
+    def prune(self, days):
+        """Prune a tombstone of another user's task deleted `days` ago"""
+        TaskTombstone.objects.create(
+            user=self.create_user('bob'), task_id=10 ** 6,
+            deleted_at=timezone.now() - timedelta(days=days),
+        )
+        call_command('prune_task_tombstones', stdout=io.StringIO())
+        self.assertFalse(TaskTombstone.objects.exists())
+
+    def test_changes_after_a_token(self):
+        kept, removed = self.create_tasks(self.user, 2)
+        self.create_tasks(self.create_user('bob'), 1)
+        changed, deleted, token = self.sync()
+        self.assertEqual(sorted(changed), sorted([kept.pk, removed.pk]))
+        self.assertEqual(deleted, [])
+
+        self.client.patch(f'/api/tasks/{kept.pk}/', {'completed': True}, format='json')
+        self.client.delete(f'/api/tasks/{removed.pk}/')
+        (added,) = self.create_tasks(self.user, 1)
+        changed, deleted, _ = self.sync(token)
+        self.assertEqual(changed, [kept.pk, added.pk])
+        self.assertEqual(deleted, [removed.pk])
+
+    def test_nothing_new_keeps_the_token(self):
+        self.create_tasks(self.user, 1)
+        _, _, token = self.sync()
+        response = self.changes(token)
+        self.assertEqual((response.data['changed'], response.data['next']), ([], token))
+
+    def test_old_tasks_page_fully(self):
+        self.prune(days=31)
+        tasks = self.create_tasks(self.user, 150)
+        Task.objects.update(updated_at=timezone.now() - timedelta(days=60))
+        changed, _, _ = self.sync(limit=100)
+        self.assertEqual(sorted(changed), sorted(task.pk for task in tasks))
+
+    def test_idle_client_with_nothing_pruned(self):
+        token = self.old_token(days=90)
+        task, removed = self.create_tasks(self.user, 2)
+        self.client.delete(f'/api/tasks/{removed.pk}/')
+        self.assertIsNone(pruned_through())
+        changed, deleted, _ = self.sync(token)
+        self.assertEqual((changed, deleted), ([task.pk], [removed.pk]))
+
+    def test_token_behind_a_pruned_deletion_is_gone(self):
+        token = self.old_token(days=40)
+        self.prune(days=35)
+        response = self.changes(token)
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.data['detail'].code, 'sync_token_expired')
+
+    def test_token_past_the_pruned_deletions_is_valid(self):
+        self.prune(days=35)
+        response = self.changes(self.old_token(days=34))
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_token(self):
+        response = self.changes('not-a-token')
+        self.assertEqual(response.status_code, 400)
+
+
+class ASGIConnection:
+    """Stand-in ASGI client: messages to the app go in `inbox`, its replies come out of `outbox`"""
+
+    def __init__(self, path=push.PUSH_PATH, method='GET', scope_type='http', headers=(), query_string=b''):
+        self.scope = {
+            'type': scope_type, 'path': path, 'method': method,
+            'headers': list(headers), 'query_string': query_string,
+        }
+        self.inbox = asyncio.Queue()
+        self.outbox = asyncio.Queue()
+
+    async def receive(self):
+        return await self.inbox.get()
+
+    async def send(self, message):
+        await self.outbox.put(message)
+
+    def start(self, application):
+        return asyncio.ensure_future(application(self.scope, self.receive, self.send))
+
+    async def sent(self):
+        return await asyncio.wait_for(self.outbox.get(), timeout=5)
+
+
+async def not_push(scope, receive, send):
+    raise AssertionError(f"Unexpected request for {scope['path']}")
+
+
+@override_settings(TASK_PUSH_BROKER='local', TASK_PUSH_QUEUE_SIZE=64, TASK_PUSH_MAX_CONNECTIONS=100)
+class TaskPushTests(TaskTestCase):
+    """`/api/push/tasks/`: committed task changes streamed over SSE and WebSocket"""
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(push, 'hub', push.PushHub())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = push.PushRouter(not_push)
+        self.user = self.create_user('alice')
+        self.other = self.create_user('bob')
+
+    def auth_headers(self, user):
+        return [(b'authorization', bearer(user).encode())]
+
+    async def open_sse(self, user):
+        connection = ASGIConnection(headers=self.auth_headers(user))
+        task = connection.start(self.router)
+        start = await connection.sent()
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), start['headers'])
+        self.assertEqual((await connection.sent())['body'], b': connected\n\n')
+        return connection, task
+
+    def events(self, message):
+        return [json.loads(line[len(b'data: '):]) for line in message['body'].split(b'\n\n') if line]
+
+    async def test_sse_streams_own_task_events(self):
+        connection, task = await self.open_sse(self.user)
+        push.publish({self.other.id}, 'created', 2)
+        push.publish({self.user.id}, 'created', 1)
+        push.publish({self.user.id, self.other.id}, 'changed')
+        # Events waiting together go out in one chunk.
+        self.assertEqual(self.events(await connection.sent()), [
+            {'action': 'created', 'id': 1},
+            {'action': 'changed', 'id': None},
+        ])
+
+        await connection.inbox.put({'type': 'http.disconnect'})
+        await asyncio.wait_for(task, timeout=5)
+        self.assertEqual(push.hub.count, 0)
+
+    async def test_sse_ends_when_the_token_expires(self):
+        connection, task = await self.open_sse(self.user)
+        (subscriber,) = push.hub.subscribers[self.user.id]
+        subscriber.expires_at = 0
+        subscriber.wake()
+        self.assertEqual(await connection.sent(), {'type': 'http.response.body', 'body': b''})
+        await asyncio.wait_for(task, timeout=5)
+
+    async def test_sse_needs_a_valid_token(self):
+        for headers in ([], [(b'authorization', b'Bearer not-a-token')]):
+            with self.subTest(headers=headers):
+                connection = ASGIConnection(headers=headers)
+                await connection.start(self.router)
+                start = await connection.sent()
+                self.assertEqual(start['status'], 401)
+                self.assertIn((b'www-authenticate', b'Bearer realm="api"'), start['headers'])
+
+    @override_settings(TASK_PUSH_MAX_CONNECTIONS=0)
+    async def test_full_process_refuses_connections(self):
+        connection = ASGIConnection(headers=self.auth_headers(self.user))
+        await connection.start(self.router)
+        start = await connection.sent()
+        self.assertEqual(start['status'], 503)
+        self.assertIn((b'retry-after', b'30'), start['headers'])
+
+    async def test_websocket(self):
+        token = str(add_user_claims(AccessToken.for_user(self.user), self.user))
+        connection = ASGIConnection(scope_type='websocket', query_string=f'access_token={token}'.encode())
+        task = connection.start(self.router)
+        await connection.inbox.put({'type': 'websocket.connect'})
+        self.assertEqual(await connection.sent(), {'type': 'websocket.accept'})
+
+        push.publish({self.user.id}, 'deleted', 3)
+        message = await connection.sent()
+        self.assertEqual(json.loads(message['text']), {'action': 'deleted', 'id': 3})
+
+        await connection.inbox.put({'type': 'websocket.disconnect'})
+        await asyncio.wait_for(task, timeout=5)
+
+    async def test_websocket_without_token_is_closed(self):
+        connection = ASGIConnection(scope_type='websocket')
+        task = connection.start(self.router)
+        await connection.inbox.put({'type': 'websocket.connect'})
+        self.assertEqual(await connection.sent(), {'type': 'websocket.close', 'code': push.CLOSE_UNAUTHORIZED})
+        await task
+
+    async def test_other_paths_reach_the_application(self):
+        application = mock.AsyncMock()
+        connection = ASGIConnection(path='/api/tasks/')
+        await connection.start(push.PushRouter(application))
+        application.assert_awaited_once()
+
+    @override_settings(TASK_PUSH_QUEUE_SIZE=2)
+    async def test_slow_connection_gets_a_resync(self):
+        subscriber = push.Subscriber(self.user.id, asyncio.get_running_loop(), expires_at=time.time() + 60)
+        for task_id in range(4):
+            subscriber.put({'action': 'updated', 'id': task_id})
+        self.assertEqual(await subscriber.get(), [push.RESYNC])
+        subscriber.put({'action': 'updated', 'id': 5})
+        self.assertEqual(await subscriber.get(), [{'action': 'updated', 'id': 5}])
+
+    def test_committed_changes_are_published(self):
+        self.authenticate(self.user)
+        with mock.patch.object(push, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/tasks/', {'title': 'Pushed'}, format='json')
+            task_id = Task.objects.get(title='Pushed').pk
+            self.assertEqual(response.status_code, 201)
+            publish.assert_called_once_with({self.user.id}, 'created', task_id)
+
+            publish.reset_mock()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(f'/api/tasks/{task_id}/', {'completed': True}, format='json')
+            publish.assert_called_once_with({self.user.id}, 'toggled', task_id)
+
+    def test_rolled_back_changes_are_not_published(self):
+        with mock.patch.object(push, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertRaises(RuntimeError), transaction.atomic():
+                    self.create_tasks(self.user, 1)
+                    raise RuntimeError
+        publish.assert_not_called()
+
+    @override_settings(TASK_PUSH_BROKER='carrier-pigeon')
+    def test_unknown_broker(self):
+        with self.assertRaises(ImproperlyConfigured):
+            push.load_broker(push.hub.dispatch)
+
+
+@override_settings(DATABASE_REPLICA_HEARTBEAT_INTERVAL=0, TASK_ETAG_BUCKET_SECONDS=0)
+class ReplicaResponseCacheTests(TransactionTestCase):
+    """
+    Task responses read from a replica are neither cached nor tagged
+
+    The primary stands in for the replica (reads inside a transaction all
+    go to the primary, hence `TransactionTestCase`); a row changed without
+    bumping the version plays the lagging replica catching up afterwards.
+    """
+
+    client_class = APIClient
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        _user_states.clear()
+        _local_store.arrivals.clear()
+        # Per test, not per class: the flush after each test skips the
+        # tables of databases listed as replicas.
+        overridden = override_settings(DATABASE_REPLICA_ALIASES=['default'])
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        for patcher in (
+            mock.patch.object(replicas, 'health', replicas.ReplicaHealth()),
+            mock.patch.object(replicas, 'replica_lag', return_value=0.0),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        admin = User.objects.create_superuser(email='admin@example.com', username='admin')
+        self.task = Task.objects.create(user=admin, title='Stale')
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(admin))
+
+    def assertReplicaReadNotKept(self, path):
+        from_replica = self.client.get(path)
+        self.assertEqual(from_replica.status_code, 200)
+        self.assertNotIn('ETag', from_replica)
+
+        Task.objects.filter(pk=self.task.pk).update(title='Caught up')
+        with self.settings(DATABASE_REPLICA_ALIASES=[]):
+            from_primary = self.client.get(path)
+        self.assertIn('ETag', from_primary)
+        self.assertIn(b'Caught up', from_primary.content)
+
+    def test_list(self):
+        self.assertReplicaReadNotKept('/api/tasks/')
+
+    def test_async_list(self):
+        self.assertReplicaReadNotKept('/api/async/tasks/')
+
+
+class TaskSearchTests(TaskTestCase):
+    """`search` on the task list, through the full-text index"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('alice')
+        self.authenticate(self.user)
+        self.follow = Task.objects.create(user=self.user, title='Follow up invoice', description='')
+        self.review = Task.objects.create(user=self.user, title='Review', description='Invoice for the client')
+        self.other = Task.objects.create(user=self.user, title='Deploy release', description='')
+
+    def search(self, query):
+        response = self.client.get('/api/tasks/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [task['id'] for task in response.data['results']]
+
+    def test_uses_the_index_migrations_created(self):
+        self.assertEqual(get_search_backend().name, 'sqlite_fts')
+
+    def test_matches_words_and_prefixes_in_title_and_description(self):
+        self.assertCountEqual(self.search('invoice'), [self.follow.pk, self.review.pk])
+        self.assertEqual(self.search('foll'), [self.follow.pk])
+        self.assertEqual(self.search('INVOICE client'), [self.review.pk])
+
+    def test_does_not_match_inside_words(self):
+        self.assertEqual(self.search('ollow'), [])
+
+    def test_ranked_by_relevance_unless_ordered(self):
+        self.assertEqual(self.search('invoice'), [self.follow.pk, self.review.pk])
+        response = self.client.get('/api/tasks/', {'search': 'invoice', 'ordering': '-created_at'})
+        self.assertEqual([task['id'] for task in response.data['results']], [self.review.pk, self.follow.pk])
+
+    def test_index_follows_every_write_path(self):
+        Task.objects.filter(pk=self.other.pk).update(title='Invoice run')
+        self.review.delete()
+        self.assertCountEqual(self.search('invoice'), [self.follow.pk, self.other.pk])
+
+    def test_other_users_tasks_are_not_found(self):
+        Task.objects.create(user=self.create_user('bob'), title='Invoice')
+        self.assertCountEqual(self.search('invoice'), [self.follow.pk, self.review.pk])
+
+    def test_quotes_in_terms(self):
+        self.assertEqual(self.search('"invoice'), [self.follow.pk, self.review.pk])
+
+    def test_migrate_restores_dropped_triggers(self):
+        # What SQLite does to them when a migration rebuilds the task table
+        backend = get_search_backend()
+        with connection.cursor() as cursor:
+            for name in backend.triggers():
+                cursor.execute(f'DROP TRIGGER {name}')
+        Task.objects.filter(pk=self.other.pk).update(title='Invoice run')
+        self.assertFalse(backend.is_installed(connection))
+
+        emit_post_migrate_signal(verbosity=0, interactive=False, db='default')
+        self.assertTrue(backend.is_installed(connection))
+        self.assertCountEqual(self.search('invoice'), [self.follow.pk, self.review.pk, self.other.pk])
+
+    @override_settings(TASK_SEARCH_BACKEND='basic')
+    def test_basic_backend_matches_substrings(self):
+        self.assertEqual(self.search('ollow'), [self.follow.pk])
+        self.assertEqual(self.search('voice client'), [self.review.pk])
+
+
+# Maximum queries per warm request, independent of page or batch size.
+# Authentication reads the user from token claims, so no query loads the
+# user; writes count their savepoint (BEGIN/COMMIT outside tests) and the
+# locked re-read of the row that counter deltas start from. Reads are
+# measured with the response cache disabled; `*_not_modified` are
+# conditional GETs answered from the version stamp alone.
+QUERY_BUDGETS = {
+    'list': 2,
+    'list_cursor': 1,
+    'list_search': 2,
+    'list_admin': 2,
+    'list_not_modified': 0,
+    'detail': 1,
+    'detail_not_modified': 0,
+    'update': 5,
+    'toggle': 6,
+    'stats': 2,
+    'changes': 2,
+    'bulk_create': 4,
+}
+
+
+@override_settings(TASK_RESPONSE_CACHE_TIMEOUT=0)
+class QueryBudgetTests(TaskTestCase):
+    """Every task endpoint stays within its `QUERY_BUDGETS` entry"""
+
+    tasks_per_user = 30
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('alice')
+        now = timezone.now()
+        for user in (self.user, self.create_user('bob')):
+            for index in range(self.tasks_per_user):
+                Task.objects.create(
+                    user=user,
+                    title=f'Task {index}',
+                    completed=index % 3 == 0,
+                    priority=('LOW', 'MEDIUM', 'HIGH')[index % 3],
+                    due_date=now + timedelta(days=index - 10) if index % 2 else None,
+                )
+        self.task = Task.objects.filter(user=self.user).first()
+        self.authenticate(self.user)
+        self.admin_client = self.authenticate(self.create_admin(), self.client_class())
+
+    def assertWithinBudget(self, name, request):
+        # The first call pays one-off costs such as backend detection.
+        request()
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+        self.assertLess(response.status_code, 400, response.content[:200])
+        budget = QUERY_BUDGETS[name]
+        self.assertLessEqual(
+            len(queries), budget,
+            f'{name} ran {len(queries)} queries, over its budget of {budget}:\n'
+            + '\n'.join(query['sql'] for query in queries),
+        )
+
+    def test_list(self):
+        self.assertWithinBudget('list', lambda: self.client.get('/api/tasks/?page_size=50'))
+
+    def test_list_cursor(self):
+        self.assertWithinBudget('list_cursor', lambda: self.client.get('/api/tasks/?pagination=cursor&page_size=50'))
+
+    def test_list_search(self):
+        self.assertWithinBudget('list_search', lambda: self.client.get('/api/tasks/?search=task'))
+
+    def test_list_admin(self):
+        self.assertWithinBudget('list_admin', lambda: self.admin_client.get('/api/tasks/'))
+
+    def test_list_not_modified(self):
+        etag = self.client.get('/api/tasks/?page_size=50')['ETag']
+        self.assertWithinBudget(
+            'list_not_modified',
+            lambda: self.client.get('/api/tasks/?page_size=50', HTTP_IF_NONE_MATCH=etag),
+        )
+
+    def test_detail(self):
+        self.assertWithinBudget('detail', lambda: self.client.get(f'/api/tasks/{self.task.pk}/'))
+
+    def test_detail_not_modified(self):
+        url = f'/api/tasks/{self.task.pk}/'
+        etag = self.client.get(url)['ETag']
+        self.assertWithinBudget('detail_not_modified', lambda: self.client.get(url, HTTP_IF_NONE_MATCH=etag))
+
+    def test_update(self):
+        self.assertWithinBudget(
+            'update',
+            lambda: self.client.patch(f'/api/tasks/{self.task.pk}/', {'title': 'Renamed'}, format='json'),
+        )
+
+    def test_toggle(self):
+        self.assertWithinBudget('toggle', lambda: self.client.post(f'/api/tasks/{self.task.pk}/toggle/'))
+
+    def test_stats(self):
+        self.assertWithinBudget('stats', lambda: self.client.get('/api/tasks/stats/'))
+
+    def test_changes(self):
+        self.assertWithinBudget('changes', lambda: self.client.get('/api/tasks/changes/'))
+
+    def test_bulk_create(self):
+        self.assertWithinBudget('bulk_create', lambda: self.client.post(
+            '/api/tasks/bulk/',
+            {'tasks': [{'title': f'Bulk {index}'} for index in range(100)]},
+            format='json',
+        ))
+
+
+# `ordered`: the rows must come in index order, never from a sort of every
+# matching row. `full_scans`: tables the endpoint reads in full by design.
+# A path of None is filled in by `QueryPlanTests.setUp`.
+PlanCheck = namedtuple('PlanCheck', ['path', 'admin', 'ordered', 'full_scans'], defaults=[False, True, ()])
+
+QUERY_PLAN_CHECKS = {
+    'list': PlanCheck('/api/tasks/?page_size=50'),
+    'list_cursor': PlanCheck('/api/tasks/?pagination=cursor&page_size=10'),
+    'list_cursor_next': PlanCheck(None),
+    'list_completed': PlanCheck('/api/tasks/?completed=false'),
+    'list_priority': PlanCheck('/api/tasks/?priority=HIGH'),
+    'list_created_range': PlanCheck('/api/tasks/?created_after=2000-01-01T00:00:00Z'),
+    'list_due_ordering': PlanCheck('/api/tasks/?pagination=cursor&ordering=due_date'),
+    # Matches are few; sorting them is cheaper than walking every task.
+    'list_due_range': PlanCheck('/api/tasks/?due_before=2100-01-01T00:00:00Z', ordered=False),
+    'list_overdue': PlanCheck('/api/tasks/?overdue=true', ordered=False),
+    'list_search': PlanCheck('/api/tasks/?search=task', ordered=False),
+    'list_admin': PlanCheck('/api/tasks/', admin=True),
+    'detail': PlanCheck(None),
+    'stats': PlanCheck('/api/tasks/stats/'),
+    'changes': PlanCheck('/api/tasks/changes/'),
+    'changes_since': PlanCheck(None),
+    'stats_admin': PlanCheck('/api/tasks/stats/', admin=True, full_scans=(TaskCounters._meta.db_table,)),
+}
+
+# `SCAN table` without `USING ... INDEX` reads every row of the table.
+TABLE_SCAN = re.compile(r'^SCAN (\w+)$')
+SORT = 'USE TEMP B-TREE FOR ORDER BY'
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plans are only checked on SQLite')
+@override_settings(TASK_RESPONSE_CACHE_TIMEOUT=0, TASK_STATS_CACHE_TIMEOUT=0)
+class QueryPlanTests(TaskTestCase):
+    """
+    Every query of the task endpoints reads from an index: none scans a
+    whole table, and lists come in index order instead of being sorted
+    """
+
+    tasks_per_user = 30
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('alice')
+        now = timezone.now()
+        for user in (self.user, self.create_user('bob')):
+            for index in range(self.tasks_per_user):
+                Task.objects.create(
+                    user=user,
+                    title=f'Task {index}',
+                    description=('', 'Follow up with the team', 'Review notes')[index % 3],
+                    completed=index % 3 == 0,
+                    priority=('LOW', 'MEDIUM', 'HIGH')[index % 3],
+                    due_date=now + timedelta(days=index - 10) if index % 2 else None,
+                )
+        self.authenticate(self.user)
+        self.admin_client = self.authenticate(self.create_admin(), self.client_class())
+
+        since = encode_token(SyncPosition(now - timedelta(hours=1), TASK, 0))
+        self.paths = {
+            'list_cursor_next': self.client.get(QUERY_PLAN_CHECKS['list_cursor'].path).data['next'],
+            'detail': f'/api/tasks/{Task.objects.filter(user=self.user).first().pk}/',
+            'changes_since': f'/api/tasks/changes/?since={since}',
+        }
+
+    def explain(self, sql):
+        """Return the lines of the query plan of `sql`, as rendered by sqlite3"""
+        with connection.cursor() as cursor:
+            # Captured SQL has its parameters inlined already.
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[3] for row in cursor.fetchall()]
+
+    def test_endpoint_queries_use_indexes(self):
+        for name, check in QUERY_PLAN_CHECKS.items():
+            with self.subTest(name):
+                client = self.admin_client if check.admin else self.client
+                path = self.paths.get(name, check.path)
+                # The first call pays one-off queries such as backend detection.
+                client.get(path)
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(path)
+                self.assertLess(response.status_code, 400, response.content[:200])
+
+                for query in queries.captured_queries:
+                    if not query['sql'].startswith('SELECT'):
+                        continue
+                    plan = self.explain(query['sql'])
+                    report = '\n'.join([query['sql'], *plan])
+                    for line in plan:
+                        scan = TABLE_SCAN.match(line)
+                        if scan:
+                            self.assertIn(scan.group(1), check.full_scans, f'Full scan of {scan.group(1)}:\n{report}')
+                        if check.ordered:
+                            self.assertNotEqual(line, SORT, f'Sorted instead of read in index order:\n{report}')
+
+
+class BenchmarkTests(TaskTestCase):
+    """The benchmark's data generator and baseline comparison"""
+
+    def dataset(self, seed):
+        users = generate_dataset(users=3, tasks_per_user=20, seed=seed)
+        # Due dates are relative to now; compare whether there is one.
+        return users, [
+            (title, completed, priority, due_date is None)
+            for title, completed, priority, due_date in Task.objects.order_by('id').values_list(
+                'title', 'completed', 'priority', 'due_date',
+            )
+        ]
+
+    def test_generated_data(self):
+        users, tasks = self.dataset(seed=1)
+        self.assertEqual([user.email for user in users], [f'bench{index}@example.com' for index in range(3)])
+        self.assertEqual(len(tasks), 60)
+        self.assertEqual({priority for _, _, priority, _ in tasks}, {'LOW', 'MEDIUM', 'HIGH'})
+        self.assertEqual(verify_counters(), {})
+        created = Task.objects.values_list('created_at', flat=True)
+        self.assertGreater(max(created) - min(created), timedelta(days=1))
+
+    def test_same_seed_same_data(self):
+        _, first = self.dataset(seed=1)
+        Task.objects.all().delete()
+        User.objects.all().delete()
+        self.assertEqual(self.dataset(seed=1)[1], first)
+
+    def test_percentile_is_nearest_rank(self):
+        latencies = list(range(1, 101))
+        self.assertEqual(BenchAPICommand.percentile(latencies, 95), 95)
+        self.assertEqual(BenchAPICommand.percentile([7], 99), 7)
+
+    @skipUnless(connection.vendor == 'sqlite', 'Only SQLite moves concurrent runs to disk')
+    def test_concurrent_runs_use_an_on_disk_database(self):
+        command = BenchAPICommand()
+        self.assertIsNone(command.database_name('/tmp/bench', {'concurrency': 1}))
+        self.assertEqual(command.database_name('/tmp/bench', {'concurrency': 4}), '/tmp/bench/bench.sqlite3')
+
+    def compare(self, **after):
+        scenario = {'p95_ms': 10.0, 'throughput': 100.0, 'errors': 0}
+        baseline = {'parameters': {}, 'scenarios': {'list': scenario}}
+        run = {'parameters': {}, 'scenarios': {'list': {**scenario, **after}}}
+        command = BenchAPICommand(stdout=io.StringIO())
+        command.compare(baseline, run, threshold=20)
+
+    def test_baseline_comparison(self):
+        self.compare(p95_ms=11.9, throughput=81)
+        for after in ({'p95_ms': 12.5}, {'throughput': 79}, {'errors': 1}):
+            with self.subTest(**after), self.assertRaises(CommandError):
+                self.compare(**after)
+
+
+class RowSerializerTests(TaskTestCase):
+    """The compiled row serializers render exactly what the DRF ones do"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('alice', first_name='Alice')
+        now = timezone.now()
+        self.create_tasks(self.user, 1, description='Overdue', due_date=now - timedelta(days=2))
+        self.create_tasks(self.user, 1, completed=True, priority='HIGH', due_date=now - timedelta(days=2))
+        self.create_tasks(self.user, 1, priority='LOW', due_date=now + timedelta(days=2))
+        self.create_tasks(self.user, 1, title='Ünïcode "quoted"')
+
+    def assertSameOutput(self, drf_class, row_class):
+        queryset = Task.objects.order_by('-created_at')
+        now = timezone.now()
+        drf = JSONRenderer().render(drf_class(drf_class.setup_queryset(queryset), many=True).data)
+        rows = JSONRenderer().render(row_class(now=now).many(row_class().setup_queryset(queryset)))
+        self.assertEqual(rows, drf)
+
+    def test_list_rows(self):
+        self.assertSameOutput(TaskListSerializer, TaskListRowSerializer)
+
+    def test_detail_rows(self):
+        self.assertSameOutput(TaskSerializer, TaskRowSerializer)
+
+    def test_endpoints_render_the_drf_output(self):
+        self.authenticate(self.user)
+        task = Task.objects.filter(due_date__isnull=False).first()
+        detail = self.client.get(f'/api/tasks/{task.pk}/')
+        self.assertEqual(detail.json(), json.loads(JSONRenderer().render(TaskSerializer(task).data)))
+
+        listed = self.client.get('/api/tasks/')
+        expected = TaskListSerializer(Task.objects.order_by('-created_at'), many=True).data
+        self.assertEqual(listed.json()['results'], json.loads(JSONRenderer().render(expected)))
@@ -0,0 +1,20 @@
+"""
+Task Throttles
+"""
+
+from rest_framework import permissions
+
+from apps.core.throttling import UserTokenBucketThrottle
+
+
+class TaskWriteThrottle(UserTokenBucketThrottle):
+    """
+    Task writes per user (`task_write` scope); reads are not throttled
+    """
+
+    scope = 'task_write'
+
+    def allow_request(self, request, view):
+        if request.method in permissions.SAFE_METHODS:
+            return True
+        return super().allow_request(request, view)
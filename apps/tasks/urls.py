@@ -8,6 +8,11 @@ from .views import (
     TaskDetailView,
     TaskStatusToggleView,
     TaskStatsView,
+    TaskChangesView,
+    TaskBulkView,
+    TaskExportView,
+    TaskImportView,
+    TaskImportJobView,
 )
 
 app_name = 'tasks'
@@ -20,4 +25,9 @@ urlpatterns = [
     # Additional task operations
     path('<int:id>/toggle/', TaskStatusToggleView.as_view(), name='task_toggle'),
     path('stats/', TaskStatsView.as_view(), name='task_stats'),
+    path('changes/', TaskChangesView.as_view(), name='task_changes'),
+    path('bulk/', TaskBulkView.as_view(), name='task_bulk'),
+    path('export/<str:export_format>/', TaskExportView.as_view(), name='task_export'),
+    path('import/', TaskImportView.as_view(), name='task_import'),
+    path('import/<int:id>/', TaskImportJobView.as_view(), name='task_import_job'),
 ]
\ No newline at end of file
@@ -3,42 +3,89 @@ Task Views - CRUD Operations
 """
 
 from rest_framework import status, generics, permissions
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
-from django.utils import timezone
-from django.db.models import Q, Count
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework.filters import OrderingFilter
 
-from .models import Task
+from .models import Task, TaskImportJob
 from .serializers import (
     TaskSerializer,
     TaskCreateSerializer,
     TaskUpdateSerializer,
     TaskListSerializer,
-    TaskStatusUpdateSerializer,
     TaskStatsSerializer,
+    TaskBulkSerializer,
+    TaskBulkUpdateSerializer,
+    TaskBulkDeleteSerializer,
+    TaskImportSerializer,
+    TaskImportJobSerializer,
 )
+from .caching import ConditionalTaskResponseMixin
+from .bulk import (
+    validate_items,
+    error_results,
+    bulk_create_tasks,
+    bulk_update_tasks,
+    bulk_delete_tasks,
+)
+from .export import EXPORT_FORMATS, iter_export
 from .filters import TaskFilter
+from .importer import start_import_job
+from .pagination import TaskKeysetPagination
+from .row_serializers import TaskRowSerializer, TaskListRowSerializer
+from .search import TaskSearchFilter
+from .stats import get_task_stats
+from .sync import decode_token, encode_token, get_changes
+from .throttling import TaskWriteThrottle
+from .write_queue import run_write
 from apps.authentication.permissions import IsOwnerOrAdmin
+from apps.core.instrumentation import timed
+from apps.core.replicas import read_from_primary
 
 
-class TaskListCreateView(generics.ListCreateAPIView):
+class TaskListCreateView(ConditionalTaskResponseMixin, generics.ListCreateAPIView):
     """
     Task List and Create Endpoint
     
     GET: Retrieve a list of all tasks for authenticated user
     POST: Create a new task
+    
+    Pass `pagination=cursor` to page with opaque keyset cursors instead of
+    page numbers. `search` uses the full-text index and orders by relevance
+    unless `ordering` is given. Responses carry an ETag and honour
+    `If-None-Match`.
     """
     
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    throttle_classes = [TaskWriteThrottle]
+    filter_backends = [DjangoFilterBackend, OrderingFilter, TaskSearchFilter]
     filterset_class = TaskFilter
     search_fields = ['title', 'description']
     ordering_fields = ['created_at', 'updated_at', 'due_date', 'priority']
     ordering = ['-created_at']
     
+    @property
+    def paginator(self):
+        """
+        Use keyset pagination when the client opts in with `pagination=cursor`
+        """
+        if not hasattr(self, '_paginator'):
+            query_params = getattr(getattr(self, 'request', None), 'query_params', {})
+            if query_params.get('pagination') == 'cursor':
+                self._paginator = TaskKeysetPagination()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
+    
     def get_queryset(self):
         """
         Return tasks for current user only
@@ -46,8 +93,10 @@ class TaskListCreateView(generics.ListCreateAPIView):
         """
         user = self.request.user
         if user.is_admin:
-            return Task.objects.all()
-        return Task.objects.filter(user=user)
+            queryset = Task.objects.all()
+        else:
+            queryset = Task.objects.filter(user_id=user.id)
+        return TaskListSerializer.setup_queryset(queryset)
     
     def get_serializer_class(self):
         """
@@ -57,10 +106,29 @@ class TaskListCreateView(generics.ListCreateAPIView):
             return TaskCreateSerializer
         return TaskListSerializer
     
+    def list(self, request, *args, **kwargs):
+        """
+        List tasks through the compiled row serializer, which renders the
+        same output as `TaskListSerializer` from `values()` rows
+        """
+        def render():
+            serializer = TaskListRowSerializer()
+            queryset = serializer.setup_queryset(self.filter_queryset(self.get_queryset()))
+            
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                with timed('serialize'):
+                    data = serializer.many(page)
+                return self.get_paginated_response(data)
+            rows = list(queryset)
+            with timed('serialize'):
+                return Response(serializer.many(rows))
+        return self.conditional_response(render)
+    
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        task = serializer.save()
+        task = run_write(serializer.save)
         
         # Return full task details
         response_serializer = TaskSerializer(task)
@@ -73,16 +141,19 @@ class TaskListCreateView(generics.ListCreateAPIView):
         )
 
 
-class TaskDetailView(generics.RetrieveUpdateDestroyAPIView):
+class TaskDetailView(ConditionalTaskResponseMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Task Detail, Update, and Delete Endpoint
     
     GET: Retrieve details of a specific task
     PUT/PATCH: Update a specific task
     DELETE: Delete a specific task
+    
+    GET responses carry an ETag and honour `If-None-Match`.
     """
     
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrAdmin]
+    throttle_classes = [TaskWriteThrottle]
     lookup_field = 'id'
     
     def get_queryset(self):
@@ -92,8 +163,10 @@ class TaskDetailView(generics.RetrieveUpdateDestroyAPIView):
         """
         user = self.request.user
         if user.is_admin:
-            return Task.objects.all()
-        return Task.objects.filter(user=user)
+            queryset = Task.objects.all()
+        else:
+            queryset = Task.objects.filter(user_id=user.id)
+        return TaskSerializer.setup_queryset(queryset)
     
     def get_serializer_class(self):
         """
@@ -103,11 +176,26 @@ class TaskDetailView(generics.RetrieveUpdateDestroyAPIView):
             return TaskUpdateSerializer
         return TaskSerializer
     
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Render the task through the compiled row serializer
+        
+        The queryset is already limited to what `IsOwnerOrAdmin` would
+        allow, so no instance is needed for object permission checks.
+        """
+        def render():
+            serializer = TaskRowSerializer()
+            queryset = serializer.setup_queryset(self.get_queryset())
+            row = get_object_or_404(queryset, **{self.lookup_field: kwargs[self.lookup_field]})
+            with timed('serialize'):
+                return Response(serializer.to_representation(row))
+        return self.conditional_response(render)
+    
     def put(self, request, *args, **kwargs):
         instance = self.get_object()
         serializer = self.get_serializer(instance, data=request.data)
         serializer.is_valid(raise_exception=True)
-        task = serializer.save()
+        task = run_write(serializer.save)
         
         response_serializer = TaskSerializer(task)
         return Response(
@@ -122,7 +210,7 @@ class TaskDetailView(generics.RetrieveUpdateDestroyAPIView):
         instance = self.get_object()
         serializer = self.get_serializer(instance, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        task = serializer.save()
+        task = run_write(serializer.save)
         
         response_serializer = TaskSerializer(task)
         return Response(
@@ -150,19 +238,23 @@ class TaskStatusToggleView(APIView):
     """
     
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrAdmin]
+    throttle_classes = [TaskWriteThrottle]
     
     def post(self, request, id):
         user = request.user
         
         # Get task (user-specific or all for admin)
+        queryset = TaskSerializer.setup_queryset(Task.objects.all())
         if user.is_admin:
-            task = get_object_or_404(Task, id=id)
+            task = get_object_or_404(queryset, id=id)
         else:
-            task = get_object_or_404(Task, id=id, user=user)
+            task = get_object_or_404(queryset, id=id, user_id=user.id)
         
         # Toggle completion status
-        task.completed = not task.completed
-        task.save()
+        def toggle():
+            task.completed = not task.completed
+            task.save()
+        run_write(toggle)
         
         serializer = TaskSerializer(task)
         return Response(
@@ -179,37 +271,15 @@ class TaskStatsView(APIView):
     Task Statistics Endpoint
     
     GET: Get statistics about user's tasks
+    
+    Read from the per-user `TaskCounters` and cached until the user's
+    tasks change.
     """
     
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
-        user = request.user
-        
-        # Get user's tasks (or all tasks for admin)
-        if user.is_admin:
-            tasks = Task.objects.all()
-        else:
-            tasks = Task.objects.filter(user=user)
-        
-        # Calculate statistics
-        total_tasks = tasks.count()
-        completed_tasks = tasks.filter(completed=True).count()
-        pending_tasks = tasks.filter(completed=False).count()
-        overdue_tasks = tasks.filter(
-            due_date__lt=timezone.now(),
-            completed=False
-        ).count()
-        
-        completion_rate = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
-        
-        stats = {
-            'total_tasks': total_tasks,
-            'completed_tasks': completed_tasks,
-            'pending_tasks': pending_tasks,
-            'overdue_tasks': overdue_tasks,
-            'completion_rate': round(completion_rate, 2)
-        }
+        stats = get_task_stats(request.user)
         
         serializer = TaskStatsSerializer(stats)
         return Response(
@@ -218,4 +288,249 @@ class TaskStatsView(APIView):
                 'data': serializer.data
             },
             status=status.HTTP_200_OK
-        )
\ No newline at end of file
+        )
+
+
+class TaskChangesView(APIView):
+    """
+    Task Delta Sync Endpoint
+    
+    GET: Own tasks created or updated, and ids of own tasks deleted, since
+    the sync token `since` (from scratch without one), oldest first, at
+    most `limit` changes. Send `next` back as `since` to continue; while
+    `has_more` is true, more changes are waiting.
+    
+    A token that may have missed a pruned deletion gets 410
+    (`sync_token_expired`): sync from scratch.
+    """
+    
+    permission_classes = [permissions.IsAuthenticated]
+    default_limit = 100
+    max_limit = 500
+    
+    def get(self, request):
+        position = decode_token(request.query_params.get('since'))
+        limit = self.get_limit(request)
+        
+        # A lagging replica would hand out tokens past changes it lacks.
+        read_from_primary()
+        serializer = TaskListRowSerializer()
+        changed, deleted, next_position, has_more = get_changes(request.user, position, limit, serializer)
+        
+        with timed('serialize'):
+            data = serializer.many(changed)
+        return Response(
+            {
+                'changed': data,
+                'deleted': deleted,
+                'next': encode_token(next_position) if next_position else request.query_params.get('since'),
+                'has_more': has_more,
+            },
+            status=status.HTTP_200_OK
+        )
+    
+    def get_limit(self, request):
+        limit = request.query_params.get('limit')
+        if limit is None:
+            return self.default_limit
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= self.max_limit:
+            raise ValidationError({'limit': [f'Must be an integer from 1 to {self.max_limit}.']})
+        return limit
+
+
+class TaskBulkView(APIView):
+    """
+    Bulk Task Endpoint
+    
+    POST: Create up to `TASK_BULK_MAX_ITEMS` tasks - {"tasks": [{...}, ...]}
+    PATCH: Update tasks by id - {"tasks": [{"id": 1, ...}, ...]}
+    DELETE: Delete tasks by id - {"ids": [1, 2, ...]}
+    
+    Every item is validated with the single-task rules and reported
+    separately; all valid items are written in one transaction.
+    """
+    
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [TaskWriteThrottle]
+    
+    def get_queryset(self):
+        """
+        Return tasks for current user only
+        Admins can access all tasks
+        """
+        user = self.request.user
+        if user.is_admin:
+            return Task.objects.all()
+        return Task.objects.filter(user_id=user.id)
+    
+    def post(self, request):
+        envelope = TaskBulkSerializer(data=request.data)
+        envelope.is_valid(raise_exception=True)
+        
+        valid, errors = validate_items(
+            TaskCreateSerializer,
+            envelope.validated_data['tasks'],
+            context={'request': request},
+        )
+        results = bulk_create_tasks(request.user, valid) + error_results(errors)
+        return self.bulk_response('created', results, status.HTTP_201_CREATED)
+    
+    def patch(self, request):
+        envelope = TaskBulkSerializer(data=request.data)
+        envelope.is_valid(raise_exception=True)
+        
+        valid, errors = validate_items(
+            TaskBulkUpdateSerializer,
+            envelope.validated_data['tasks'],
+            context={'request': request},
+            partial=True,
+        )
+        results = bulk_update_tasks(self.get_queryset(), valid) + error_results(errors)
+        return self.bulk_response('updated', results, status.HTTP_200_OK)
+    
+    def delete(self, request):
+        envelope = TaskBulkDeleteSerializer(data=request.data)
+        envelope.is_valid(raise_exception=True)
+        
+        results = bulk_delete_tasks(self.get_queryset(), envelope.validated_data['ids'])
+        return self.bulk_response('deleted', results, status.HTTP_200_OK)
+    
+    def bulk_response(self, action, results, success_status):
+        """
+        Build the response for per-item `results`
+        
+        All items succeeded: `success_status`; some failed: 207; all failed: 400.
+        """
+        results.sort(key=lambda result: result['index'])
+        failed = sum(1 for result in results if result['status'] == 'error')
+        succeeded = len(results) - failed
+        
+        if not failed:
+            response_status = success_status
+        elif succeeded:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        
+        return Response(
+            {
+                'message': f'{succeeded} task(s) {action}, {failed} failed',
+                'data': {
+                    'succeeded': succeeded,
+                    'failed': failed,
+                    'results': results,
+                }
+            },
+            status=response_status
+        )
+
+
+class TaskExportView(generics.GenericAPIView):
+    """
+    Task Export Endpoint
+    
+    GET: Stream tasks (all tasks for admins) as `ndjson` or `csv`, filtered
+    with the same parameters as the task list
+    """
+    
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = TaskFilter
+    
+    def get_queryset(self):
+        """
+        Return tasks for current user only
+        Admins can export all tasks
+        """
+        user = self.request.user
+        if user.is_admin:
+            return Task.objects.all()
+        return Task.objects.filter(user_id=user.id)
+    
+    @swagger_auto_schema(
+        operation_description=(
+            "Stream tasks as NDJSON (one JSON object per line) or CSV (with a "
+            "header row); accepts the task list filters"
+        ),
+        responses={
+            200: openapi.Response(
+                description="Tasks in the requested format",
+                schema=openapi.Schema(type=openapi.TYPE_FILE)
+            ),
+            404: "Unknown export format"
+        }
+    )
+    def get(self, request, export_format):
+        if export_format not in EXPORT_FORMATS:
+            raise NotFound(f'Unknown export format "{export_format}".')
+        
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(
+            iter_export(queryset, export_format),
+            content_type=EXPORT_FORMATS[export_format],
+        )
+        response['Content-Disposition'] = f'attachment; filename="tasks.{export_format}"'
+        return response
+
+
+class TaskImportView(APIView):
+    """
+    Task Import Endpoint
+    
+    POST: Upload an NDJSON or CSV `file` and import it in the background.
+    Admin uploads assign rows by their `user_email` column; everyone
+    else's rows are imported as their own tasks.
+    """
+    
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [TaskWriteThrottle]
+    parser_classes = [MultiPartParser, FormParser]
+    
+    def post(self, request):
+        serializer = TaskImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data['file']
+        
+        name = default_storage.save(f'imports/{upload.name}', upload)
+        with transaction.atomic():
+            job = TaskImportJob.objects.create(
+                user_id=request.user.id,
+                source=default_storage.path(name),
+                format=serializer.validated_data['format'],
+                assign_by_email=request.user.is_admin,
+            )
+            start_import_job(job)
+        
+        return Response(
+            {
+                'message': 'Task import started',
+                'data': TaskImportJobSerializer(job).data
+            },
+            status=status.HTTP_202_ACCEPTED
+        )
+
+
+class TaskImportJobView(generics.RetrieveAPIView):
+    """
+    Task Import Job Endpoint
+    
+    GET: Progress of an import job
+    """
+    
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = TaskImportJobSerializer
+    lookup_field = 'id'
+    
+    def get_queryset(self):
+        """
+        Return import jobs of current user only
+        Admins can access all jobs
+        """
+        user = self.request.user
+        if user.is_admin:
+            return TaskImportJob.objects.all()
+        return TaskImportJob.objects.filter(user_id=user.id)
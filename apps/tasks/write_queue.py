@@ -0,0 +1,149 @@
+"""
+Group Commit for Task Writes
+
+With `TASK_WRITE_QUEUE` on, single-task writes (create, update, toggle)
+are not committed by the request that makes them. The request validates
+its input as usual, then hands the database work to `run_write`, which
+queues it and waits. One committer thread per process takes whatever is
+queued, waiting up to `TASK_WRITE_QUEUE_WINDOW` milliseconds for more
+(at most `TASK_WRITE_QUEUE_MAX_BATCH` writes), and runs the batch in one
+transaction: one writer lock and one commit (an fsync on SQLite) per
+batch instead of per request.
+
+Every write runs in its own savepoint, so a failing write is rolled back
+alone and its exception is raised in its request; the others commit.
+Writes run in a copy of the submitting request's context, so request
+metrics still count their queries.
+
+Requests already inside a transaction, and every request while the
+setting is off, write inline as before.
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from apps.core.metrics import registry as metrics_registry
+
+
+logger = logging.getLogger(__name__)
+
+task_write_batch_size = metrics_registry.histogram(
+    'task_write_batch_size',
+    'Task writes committed per group-commit transaction',
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200),
+)
+
+
+class PendingWrite:
+    """A queued write: the function, the submitter's context and its future"""
+
+    __slots__ = ('function', 'context', 'future')
+
+    def __init__(self, function):
+        self.function = function
+        self.context = contextvars.copy_context()
+        self.future = Future()
+
+
+class WriteQueue:
+    """Queue of pending writes and the thread committing them in batches"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queue = queue.SimpleQueue()
+        self.pid = None
+
+    def submit(self, function):
+        """Queue `function` and return a `Future` of its result"""
+        self.ensure_committer()
+        write = PendingWrite(function)
+        self.queue.put(write)
+        return write.future
+
+    def ensure_committer(self):
+        # A forked worker does not inherit its parent's thread.
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.queue = queue.SimpleQueue()
+            thread = threading.Thread(target=self.run, name='task-write-queue', daemon=True)
+            thread.start()
+            self.pid = os.getpid()
+
+    def run(self):
+        while True:
+            batch = self.take_batch()
+            try:
+                self.commit(batch)
+            except Exception as exc:
+                # The transaction failed as a whole, e.g. the commit itself.
+                logger.exception('Task write batch of %s failed', len(batch))
+                for write in batch:
+                    if not write.future.done():
+                        write.future.set_exception(exc)
+
+    def take_batch(self):
+        """Block for one write, then gather more for up to the batch window"""
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + settings.TASK_WRITE_QUEUE_WINDOW / 1000
+        while len(batch) < settings.TASK_WRITE_QUEUE_MAX_BATCH:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def commit(self, batch):
+        """Run `batch` in one transaction, each write in a savepoint"""
+        # This thread serves no requests; drop a connection gone stale.
+        close_old_connections()
+        results = []
+        with transaction.atomic():
+            for write in batch:
+                try:
+                    with transaction.atomic():
+                        results.append((write, write.context.run(write.function), None))
+                except Exception as exc:
+                    results.append((write, None, exc))
+        if settings.METRICS:
+            task_write_batch_size.observe(len(batch))
+
+        # Only now is every result durable.
+        for write, result, error in results:
+            if error is None:
+                write.future.set_result(result)
+            else:
+                write.future.set_exception(error)
+
+
+write_queue = WriteQueue()
+
+
+def run_write(function):
+    """
+    Return `function()`, run through the write queue when it is on, which
+    blocks until the batch holding it has committed
+    """
+    if not settings.TASK_WRITE_QUEUE or connection.in_atomic_block:
+        return function()
+    return write_queue.submit(function).result()
+
+
+async def arun_write(function):
+    """`run_write` for async views; waits without holding a thread"""
+    if not settings.TASK_WRITE_QUEUE:
+        return await sync_to_async(function)()
+    return await asyncio.wrap_future(write_queue.submit(function))
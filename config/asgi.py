@@ -14,3 +14,19 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_asgi_application()
+
+# Task change push (Server-Sent Events and WebSocket), see apps.tasks.push
+from apps.tasks.push import PushRouter  # noqa: E402
+
+application = PushRouter(application)
+
+# Build the OpenAPI schema and docs pages before the first request
+from apps.core.openapi import warm_schema  # noqa: E402
+
+warm_schema()
+
+# Startup objects live as long as the process; keep the full collections,
+# which grow with the open push connections, from scanning them again.
+import gc  # noqa: E402
+
+gc.freeze()
@@ -1,7 +1,7 @@
 
 from pathlib import Path
 from datetime import timedelta
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -26,13 +26,17 @@ INSTALLED_APPS = [
     'django_filters',
     'corsheaders',
     'drf_yasg',
+    'rest_framework_simplejwt.token_blacklist',
     
     # Local apps
+    'apps.core',
     'apps.authentication',
     'apps.tasks',
 ]
 
 MIDDLEWARE = [
+    'apps.core.instrumentation.request_metrics_middleware',  # Outermost, to time everything
+    'apps.core.replicas.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS middleware
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -68,9 +72,67 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / config('DATABASE_NAME', default='db.sqlite3'),
+        # Keep a connection per worker thread for this many seconds (0 opens
+        # one per request). Set 0 under ASGI, where connections are not reused.
+        'CONN_MAX_AGE': config('DATABASE_CONN_MAX_AGE', default=600, cast=int),
+        # Check a reused connection before each request's first query
+        'CONN_HEALTH_CHECKS': config('DATABASE_CONN_HEALTH_CHECKS', default=True, cast=bool),
     }
 }
 
+# Read replicas (see apps.core.replicas): SQLite copies of the primary,
+# kept in step by e.g. Litestream or LiteFS, become aliases replica1,
+# replica2, ... For PostgreSQL standbys, add their DATABASES entries and
+# list their aliases in DATABASE_REPLICA_ALIASES.
+DATABASE_REPLICAS = config('DATABASE_REPLICAS', default='', cast=Csv())
+DATABASE_REPLICA_ALIASES = []
+for index, name in enumerate(DATABASE_REPLICAS, start=1):
+    DATABASES[f'replica{index}'] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / name,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICA_ALIASES.append(f'replica{index}')
+
+DATABASE_ROUTERS = ['apps.core.replicas.ReplicaRouter']
+
+# Seconds a user's reads stay on the primary after they changed something
+DATABASE_REPLICA_PIN_SECONDS = config('DATABASE_REPLICA_PIN_SECONDS', default=10, cast=int)
+
+# Cache holding those pins; must be shared when running several processes
+DATABASE_REPLICA_PIN_CACHE = config('DATABASE_REPLICA_PIN_CACHE', default='default')
+
+# Seconds of lag beyond which a replica is skipped
+DATABASE_REPLICA_MAX_LAG = config('DATABASE_REPLICA_MAX_LAG', default=5, cast=float)
+
+# Seconds between lag checks of a replica, per process
+DATABASE_REPLICA_CHECK_INTERVAL = config('DATABASE_REPLICA_CHECK_INTERVAL', default=5, cast=float)
+
+# Seconds between stamps of the heartbeat row replica lag is measured by
+# (except on PostgreSQL); 0 stops stamping
+DATABASE_REPLICA_HEARTBEAT_INTERVAL = config('DATABASE_REPLICA_HEARTBEAT_INTERVAL', default=1, cast=float)
+
+# PRAGMAs run on every new SQLite connection (see apps.core.sqlite); None
+# keeps SQLite's default. WAL lets readers run alongside the one writer,
+# and synchronous=NORMAL is safe with WAL (a power loss may lose the last
+# commits, never corrupt the file).
+SQLITE_PRAGMAS = {
+    # Milliseconds a connection waits for a lock before "database is locked"
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT', default=5000, cast=int),
+    'journal_mode': config('SQLITE_JOURNAL_MODE', default='WAL'),
+    'synchronous': config('SQLITE_SYNCHRONOUS', default='NORMAL'),
+    # Negative: KiB of page cache per connection
+    'cache_size': config('SQLITE_CACHE_SIZE', default=-20000, cast=int),
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=134217728, cast=int),
+    'temp_store': 'MEMORY',
+    # Bytes the WAL file is truncated to after a checkpoint
+    'journal_size_limit': config('SQLITE_JOURNAL_SIZE_LIMIT', default=67108864, cast=int),
+}
+
+# Seconds between background WAL checkpoints in each process; 0 leaves
+# them to SQLite's automatic checkpoints
+SQLITE_CHECKPOINT_INTERVAL = config('SQLITE_CHECKPOINT_INTERVAL', default=60, cast=float)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -87,6 +149,38 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing: scrypt, argon2 (needs argon2-cffi) or pbkdf2. New and
+# changed passwords use PASSWORD_HASHER; hashes made by the others (or with
+# another cost) still verify and are upgraded on the user's next login.
+PASSWORD_HASHER = config('PASSWORD_HASHER', default='scrypt')
+PASSWORD_HASHER_CLASSES = {
+    'scrypt': 'apps.authentication.hashers.ScryptPasswordHasher',
+    'argon2': 'apps.authentication.hashers.Argon2PasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHERS = [
+    PASSWORD_HASHER_CLASSES[PASSWORD_HASHER],
+    *(path for name, path in PASSWORD_HASHER_CLASSES.items() if name != PASSWORD_HASHER),
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+
+# scrypt cost: CPU/memory cost (power of 2), block size and parallelism
+PASSWORD_SCRYPT_WORK_FACTOR = config('PASSWORD_SCRYPT_WORK_FACTOR', default=2 ** 14, cast=int)
+PASSWORD_SCRYPT_BLOCK_SIZE = config('PASSWORD_SCRYPT_BLOCK_SIZE', default=8, cast=int)
+PASSWORD_SCRYPT_PARALLELISM = config('PASSWORD_SCRYPT_PARALLELISM', default=1, cast=int)
+
+# argon2 cost: passes, memory in KiB and lanes
+PASSWORD_ARGON2_TIME_COST = config('PASSWORD_ARGON2_TIME_COST', default=2, cast=int)
+PASSWORD_ARGON2_MEMORY_COST = config('PASSWORD_ARGON2_MEMORY_COST', default=102400, cast=int)
+PASSWORD_ARGON2_PARALLELISM = config('PASSWORD_ARGON2_PARALLELISM', default=8, cast=int)
+
+# Password hashes and checks running at once per process, each on its
+# request's thread (0: no limit)
+PASSWORD_HASH_WORKERS = config('PASSWORD_HASH_WORKERS', default=4, cast=int)
+
+# Hashes waiting or running before further logins are refused with 503
+PASSWORD_HASH_MAX_PENDING = config('PASSWORD_HASH_MAX_PENDING', default=64, cast=int)
+
 # Internationalization
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
@@ -97,6 +191,10 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Uploaded files (task imports)
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -106,7 +204,7 @@ AUTH_USER_MODEL = 'authentication.User'
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.authentication.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -123,10 +221,24 @@ REST_FRAMEWORK = {
         'rest_framework.renderers.BrowsableAPIRenderer',
     ],
     'EXCEPTION_HANDLER': 'rest_framework.views.exception_handler',
+    # Token buckets of N requests refilled at N per period (see apps.core.throttling);
+    # an empty rate disables the scope
+    'DEFAULT_THROTTLE_RATES': {
+        'login': config('THROTTLE_LOGIN_RATE', default='20/min') or None,
+        'login_account': config('THROTTLE_LOGIN_ACCOUNT_RATE', default='5/min') or None,
+        'register': config('THROTTLE_REGISTER_RATE', default='10/hour') or None,
+        'token_refresh': config('THROTTLE_TOKEN_REFRESH_RATE', default='30/min') or None,
+        'task_write': config('THROTTLE_TASK_WRITE_RATE', default='120/min') or None,
+    },
     'DATETIME_FORMAT': '%Y-%m-%d %H:%M:%S',
     'TEST_REQUEST_DEFAULT_FORMAT': 'json',
 }
 
+# Where throttle buckets live: local (per process) or cache (shared,
+# THROTTLE_CACHE_ALIAS, e.g. Redis when running several processes)
+THROTTLE_STORE = config('THROTTLE_STORE', default='local')
+THROTTLE_CACHE_ALIAS = config('THROTTLE_CACHE_ALIAS', default='default')
+
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
@@ -150,7 +262,103 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
     
     'JTI_CLAIM': 'jti',
+    
+    'TOKEN_REFRESH_SERIALIZER': 'apps.authentication.serializers.TokenRefreshSerializer',
+}
+
+# Seconds a process trusts its cached copy of a user's role and active flag
+# before re-reading them; 0 trusts the token claims until they expire
+JWT_USER_STATE_TTL = config('JWT_USER_STATE_TTL', default=30, cast=int)
+
+# Refresh tokens are checked against an in-memory filter of blacklisted
+# JTIs (see apps.authentication.blacklist) instead of a query per check
+JWT_BLACKLIST_FILTER = config('JWT_BLACKLIST_FILTER', default=True, cast=bool)
+
+# False positive rate of that filter; each one costs a query
+JWT_BLACKLIST_FILTER_ERROR_RATE = config('JWT_BLACKLIST_FILTER_ERROR_RATE', default=0.001, cast=float)
+
+# Seconds before tokens blacklisted by other processes are seen here
+JWT_BLACKLIST_SYNC_INTERVAL = config('JWT_BLACKLIST_SYNC_INTERVAL', default=1, cast=float)
+
+# Seconds between rebuilds of the filter, dropping expired tokens
+JWT_BLACKLIST_REBUILD_INTERVAL = config('JWT_BLACKLIST_REBUILD_INTERVAL', default=3600, cast=int)
+
+# Cache
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='taskmanager'),
+    },
+    # Task version stamps and cached task responses. Must be shared by all
+    # processes (e.g. Redis or Memcached) when running more than one.
+    'tasks': {
+        'BACKEND': config('TASK_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('TASK_CACHE_LOCATION', default='taskmanager-tasks'),
+    },
+}
+
+# Cache alias holding task version stamps and cached task responses
+TASK_CACHE_ALIAS = config('TASK_CACHE_ALIAS', default='tasks')
+
+# Seconds a rendered task list/detail response is kept (0 disables)
+TASK_RESPONSE_CACHE_TIMEOUT = config('TASK_RESPONSE_CACHE_TIMEOUT', default=300, cast=int)
+
+# Task ETags change at least this often (seconds) so clock-dependent
+# fields such as `status` are never served staler than this
+TASK_ETAG_BUCKET_SECONDS = config('TASK_ETAG_BUCKET_SECONDS', default=60, cast=int)
+
+# Seconds a user's task statistics may be served from cache
+TASK_STATS_CACHE_TIMEOUT = config('TASK_STATS_CACHE_TIMEOUT', default=60, cast=int)
+
+# Maximum number of items accepted by one /api/tasks/bulk/ request
+TASK_BULK_MAX_ITEMS = config('TASK_BULK_MAX_ITEMS', default=5000, cast=int)
+
+# Rows fetched (and flushed to the client) per chunk by task exports
+TASK_EXPORT_CHUNK_SIZE = config('TASK_EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
+# Rows validated and written per transaction by task imports
+TASK_IMPORT_BATCH_SIZE = config('TASK_IMPORT_BATCH_SIZE', default=1000, cast=int)
+
+# Batch concurrent single-task writes (create, update, toggle) into one
+# transaction per process (see apps.tasks.write_queue)
+TASK_WRITE_QUEUE = config('TASK_WRITE_QUEUE', default=False, cast=bool)
+
+# Milliseconds a batch waits for more writes after its first
+TASK_WRITE_QUEUE_WINDOW = config('TASK_WRITE_QUEUE_WINDOW', default=2, cast=float)
+
+# Writes per batch at most
+TASK_WRITE_QUEUE_MAX_BATCH = config('TASK_WRITE_QUEUE_MAX_BATCH', default=100, cast=int)
+
+# Seconds a task change must age before delta sync returns it; longer than
+# any task write transaction and the clock skew between servers
+TASK_SYNC_SETTLE_SECONDS = config('TASK_SYNC_SETTLE_SECONDS', default=5, cast=int)
+
+# Days deleted-task tombstones are kept for delta sync (prune with
+# `manage.py prune_task_tombstones`); sync tokens behind a pruned one are rejected
+TASK_TOMBSTONE_RETENTION_DAYS = config('TASK_TOMBSTONE_RETENTION_DAYS', default=30, cast=int)
+
+# Task change push under ASGI (see apps.tasks.push). The broker carries
+# events between processes: local (one process), redis (needs the redis
+# package) or the dotted path of a broker class.
+TASK_PUSH_BROKER = config('TASK_PUSH_BROKER', default='local')
+TASK_PUSH_BROKER_CLASSES = {
+    'local': 'apps.tasks.push.LocalBroker',
+    'redis': 'apps.tasks.push.RedisBroker',
 }
+TASK_PUSH_REDIS_URL = config('TASK_PUSH_REDIS_URL', default='redis://localhost:6379/0')
+TASK_PUSH_REDIS_CHANNEL = config('TASK_PUSH_REDIS_CHANNEL', default='task-push')
+
+# Events buffered per connection before it is sent a resync instead
+TASK_PUSH_QUEUE_SIZE = config('TASK_PUSH_QUEUE_SIZE', default=64, cast=int)
+
+# Seconds between keep-alive comments on idle Server-Sent Event streams
+TASK_PUSH_HEARTBEAT = config('TASK_PUSH_HEARTBEAT', default=25, cast=int)
+
+# Push connections per process; more are refused with 503 / close 1013
+TASK_PUSH_MAX_CONNECTIONS = config('TASK_PUSH_MAX_CONNECTIONS', default=50000, cast=int)
+
+# Task search backend: auto, sqlite_fts, postgres or basic (icontains)
+TASK_SEARCH_BACKEND = config('TASK_SEARCH_BACKEND', default='auto')
 
 # CORS Settings
 CORS_ALLOWED_ORIGINS = [
@@ -196,8 +404,47 @@ SWAGGER_SETTINGS = {
     'JSON_EDITOR': True,
     'SHOW_REQUEST_HEADERS': True,
     'DEFAULT_MODEL_RENDERING': 'example',
+    # The UI pages fetch the precomputed schema instead of regenerating it
+    'SPEC_URL': 'schema-json',
+}
+
+REDOC_SETTINGS = {
+    'SPEC_URL': 'schema-json',
 }
 
+# Code version keying the OpenAPI schema artifact, e.g. the release or git
+# SHA; empty derives it from the Python sources
+API_CODE_VERSION = config('API_CODE_VERSION', default='')
+
+# Directory holding the generated OpenAPI schema artifacts
+OPENAPI_SCHEMA_DIR = BASE_DIR / config('OPENAPI_SCHEMA_DIR', default='openapi')
+
+# Seconds clients and proxies may reuse the schema and docs pages
+OPENAPI_CACHE_MAX_AGE = config('OPENAPI_CACHE_MAX_AGE', default=3600, cast=int)
+
+# Per-request query count, database and serializer time (see apps.core.instrumentation)
+REQUEST_METRICS = config('REQUEST_METRICS', default=True, cast=bool)
+
+# Report them to clients in a Server-Timing header
+REQUEST_METRICS_SERVER_TIMING = config('REQUEST_METRICS_SERVER_TIMING', default=DEBUG, cast=bool)
+
+# Prometheus metrics at /metrics (see apps.core.metrics); request series
+# come from the REQUEST_METRICS middleware
+METRICS = config('METRICS', default=True, cast=bool)
+
+# Bearer token scrapers may send instead of an admin's access token
+METRICS_AUTH_TOKEN = config('METRICS_AUTH_TOKEN', default='')
+
+# Serve /metrics to anyone, e.g. when only a private network reaches it
+METRICS_PUBLIC = config('METRICS_PUBLIC', default=False, cast=bool)
+
+# Directory shared by all worker processes (e.g. gunicorn), emptied at
+# server start; empty for a single process
+METRICS_MULTIPROCESS_DIR = config('METRICS_MULTIPROCESS_DIR', default='')
+
+# Seconds between writes of a worker's metrics to METRICS_MULTIPROCESS_DIR
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=5, cast=float)
+
 # Logging Configuration
 LOGGING = {
     'version': 1,
@@ -229,5 +476,17 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        # WAL checkpoints; INFO logs every one
+        'apps.core.sqlite': {
+            'handlers': ['console', 'file'],
+            'level': config('SQLITE_LOG_LEVEL', default='WARNING'),
+            'propagate': False,
+        },
+        # Per-request metrics; INFO logs every request
+        'apps.core.instrumentation': {
+            'handlers': ['console', 'file'],
+            'level': config('REQUEST_METRICS_LOG_LEVEL', default='WARNING'),
+            'propagate': False,
+        },
     },
 }
\ No newline at end of file
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# Build the OpenAPI schema and docs pages before the first request
+from apps.core.openapi import warm_schema  # noqa: E402
+
+warm_schema()